@@ -13,22 +13,198 @@
 #	7) invert binary bits
 #	8) hex > binary > invert > hex
 #
-#	This script can be run in one of two formats:
+#	This script can be run in one of three formats:
 #	1) As a standalone, user-friendly, prompt-based program
 #	2) Individual functions can be called by another module that passes
 #	   in necessary parameters
+#	3) translate(data, from_fmt, to_fmt) can be called by another module
+#	   to convert data directly, without prompting, printing, or exiting.
+#	   set_cache(entries) keeps that many recent results, so converting the
+#	   same data again is a lookup (see cache_stats)
 #	The source file is assumed to be in the same directory as the script,
 #	and the destination file will be saved there as well. A destination
 #	of '--s' can be used to print to screen instead of writing to a file.
 #	A destination of '--tmp' can be used to cause individual methods to
 #	return data, though the main method never returns anything.
+#	A source or destination of '-' reads from standard input or writes to
+#	standard output, converting a block at a time as data arrives, so the
+#	translator can be used in the middle of a pipeline. Questions a piped
+#	conversion would ask are answered with --answer instead.
+#
+#	Options can follow the four parameters of a one-line conversion:
+#	--stream[=blockSize]  convert the source file to the destination file
+#	                      in blocks, so large files don't have to fit in memory
+#	--batch               convert many files at once: the source is a directory,
+#	                      a glob pattern, or '@' and a file listing one source
+#	                      per line, and the destination is the directory to save
+#	                      to ('' for each source's own directory)
+#	--jobs=N              number of processes converting a batch (default: one
+#	                      per CPU). Without --batch, the source file is streamed
+#	                      and its blocks are converted by N processes at once
+#	--overwrite=policy    what a batch does when a destination file already
+#	                      exists: skip (default), replace, or rename
+#	--answer=yes|no       answer given to any question a batch or piped
+#	                      conversion asks (default: no)
+#	--cachedir=dir        keep a copy of each file a batch converts in dir, and
+#	                      copy it from there instead of converting again when
+#	                      the same source is converted the same way
+#	--resume              stream the source, saving a checkpoint as it goes, and
+#	                      if an earlier run was stopped, carry on from its last
+#	                      checkpoint instead of starting over
+#	--offset=K --count=N  convert only N words of the source (all that are left if
+#	                      --count isn't given), starting at word K (0 for the
+#	                      first). Words are found with an index of the source
+#	                      saved beside it as <source>.idx, built the first time
+#	                      and again whenever the source changes, so a range
+#	                      converts in time that depends on its size, not the
+#	                      source's. --answer=no drops spaces from decimal ranges
+#	--metrics=file        add a line of JSON to file for each conversion, with
+#	                      the time spent reading, detecting, tokenizing,
+#	                      converting, formatting, and writing, and the sizes
+#	                      and word counts (see enable_metrics)
+#
+#	A destination ending with .bin is saved as packed binary: the bits themselves,
+#	with a small header recording how many there are and how they were spaced,
+#	about a ninth of the size of binary text. Binary sources can be packed
+#	whatever their name, and are unpacked as they're read.
+#
+#	Sources and destinations compressed with gzip, bzip2, or xz (.gz, .bz2, or
+#	.xz) are decompressed and compressed as they're converted, without writing
+#	the uncompressed data to disk. Sources are also recognised by their first
+#	bytes. xz needs the lzma module (on Python 2, backports.lzma).
+#
+#	The translator can also be run as a local conversion server, so other
+#	programs can convert without starting Python each time:
+#	  <program name> --serve[=port] [--jobs=N] [--queue=N] [--cache[=N]]
+#	POST the data to /translate?from=hex&to=bin (add &spaces=no to drop spaces
+#	from decimal conversions) and the converted data is sent back. GET /status
+#	shows how busy the server is. Conversions run in a pool of --jobs
+#	processes, and once --queue of them are waiting, further requests are
+#	turned away with 503 until the pool catches up. --cache keeps the last N
+#	results (default 1024), which are sent back without using the pool.
+#
+#	Many conversions can be run at once from a manifest, without starting Python
+#	or answering prompts for each one:
+#	  <program name> --manifest=file [--jobs=N]
+#	Each line of the manifest ('-' to read it from standard input) is a job, a JSON
+#	object with src, dst (files, not pipes), from, and to, and optionally options (e.g. {"stream": 65536},
+#	any of --stream, --answer, --resume, --offset, --count, and --metrics), priority
+#	(higher starts first), and id. Jobs run in --jobs processes (default one, this
+#	one), and a line of JSON with each job's status, error, seconds, and bytes read
+#	and written is written to standard output as soon as it finishes.
 ############################################################################
 
 import sys
 import os
 import re
 import binascii
+import string
 import time
+import itertools
+import fractions
+import mmap
+import glob
+import multiprocessing
+import hashlib
+import struct
+import collections
+import StringIO
+import shutil
+import gzip
+import bz2
+import zlib
+import threading
+import socket
+import json
+import urlparse
+import BaseHTTPServer
+import SocketServer
+try:
+	import numpy
+except ImportError: # NumPy is optional, the conversions fall back to pure Python without it
+	numpy = None
+try:
+	import lzma
+except ImportError: # xz files can only be read and written with lzma (or its backport to Python 2)
+	try:
+		from backports import lzma
+	except ImportError:
+		lzma = None
+
+# Error raised when data can't be converted. The message is what is shown to the user.
+class ConversionError(ValueError):
+	pass
+
+# Error raised when data isn't valid in the format it's being converted from
+class InvalidDataError(ConversionError):
+	pass
+
+# Error raised when there's no conversion between the formats asked for
+class UnsupportedConversionError(ConversionError):
+	pass
+
+# Names of the data formats as they're shown in messages
+FORMAT_NAMES = {'hex': 'hex', 'bin': 'binary', 'dec': 'decimal', 'ascii': 'ascii'}
+
+# Error shown when data in each format can't be converted
+INVALID_DATA_ERRORS = {
+	'hex': '\n***ERROR: \'%s\' may contain invalid hex data.\n          Only 0-9, a-f, and A-F allowed.',
+	'bin': '\n***ERROR: \'%s\' may contain invalid binary data.\n       Only 0 and 1 allowed.',
+	'dec': '\n***ERROR: \'%s\' may contain invalid decimal data.\n       Only 0-9 allowed.',
+	'ascii': '\n***ERROR: \'%s\' may contain invalid ascii data.',
+}
+
+# Options that can follow the parameters of a one-line conversion
+#	--stream[=blockSize] - convert file to file in blocks instead of reading the whole source
+#	--batch, --jobs=N, --overwrite=policy, --answer=yes|no, --cachedir=dir - convert many files in parallel
+#	--serve[=port], --jobs=N, --queue=N, --cache[=N] - run as a local conversion server
+#	--metrics=file - record where each conversion's time goes
+#	--resume - stream with checkpoints, carrying on from the last one if stopped
+#	--offset=K, --count=N - convert only N words of the source, starting at word K
+#	--manifest=file, --jobs=N - run every conversion job listed in a file
+CONVERT_OPTIONS = ('stream', 'batch', 'jobs', 'overwrite', 'answer', 'serve', 'queue', 'cache', 'cachedir', 'metrics', 'resume', 'offset', 'count', 'manifest')
+
+# Lookup tables for converting a byte (character) at a time, built once so that whole
+# strings can be converted with map and join instead of formatting each character
+#	CHAR_BINS - maps each character to its 8-bit binary, e.g. 'O' -> '01001111'
+#	CHAR_HEXES - maps each character to its 2-digit uppercase hex, e.g. 'O' -> '4F'
+#	CHAR_DECS - maps each character to its decimal value, e.g. 'O' -> '79'
+#	BIN_CHARS - maps each 8-bit binary string back to its character
+CHAR_BINS = dict((chr(i), '{0:08b}'.format(i)) for i in xrange(256))
+CHAR_HEXES = dict((chr(i), '%02X' % (i)) for i in xrange(256))
+CHAR_DECS = dict((chr(i), str(i)) for i in xrange(256))
+BIN_CHARS = dict((bin_word, char) for char, bin_word in CHAR_BINS.iteritems())
+#	DEC_CHARS - maps each decimal value from 0 to 255 back to its character
+#	INVERTED_HEX_DIGITS - translates each hexlified digit to the uppercase digit of its inverted bits
+#	INVERTED_BYTES - translates each character to the one with its bits inverted
+DEC_CHARS = dict((dec_word, char) for char, dec_word in CHAR_DECS.iteritems())
+INVERTED_HEX_DIGITS = string.maketrans('0123456789abcdef', 'FEDCBA9876543210')
+INVERTED_BYTES = string.maketrans(''.join(map(chr, xrange(256))), ''.join(chr(i ^ 0xFF) for i in xrange(256)))
+#	INVERTED_BITS - translates binary digits to their inverse, leaving spaces as they are
+#	REVERSED_BYTES - translates each character to the one with its bits in reverse order
+#	ROTATED_BYTES - the n-th table translates each character to the one with its bits
+#	                rotated left by n
+INVERTED_BITS = string.maketrans('01', '10')
+REVERSED_BYTES = string.maketrans(''.join(map(chr, xrange(256))), ''.join(chr(int('{0:08b}'.format(i)[::-1], 2)) for i in xrange(256)))
+ROTATED_BYTES = tuple(string.maketrans(''.join(map(chr, xrange(256))), ''.join(chr((i << n | i >> (8 - n)) & 0xFF) for i in xrange(256))) for n in xrange(8))
+
+# Translation tables for converting whole strings of bytes at once, one output column at
+# a time. Translating a string with the k-th table of a format gives the k-th character of
+# every byte's output (e.g. BIN_COLUMNS[0] gives each byte's highest bit), so the output
+# can be filled in column by column (see interleave) without touching bytes one by one.
+#	HEX_COLUMNS - the two uppercase hex digits of each byte
+#	BIN_COLUMNS - the eight bits of each byte, highest first
+HEX_COLUMNS = tuple(string.maketrans(''.join(map(chr, xrange(256))), ''.join(CHAR_HEXES[chr(i)][k] for i in xrange(256))) for k in xrange(2))
+BIN_COLUMNS = tuple(string.maketrans(''.join(map(chr, xrange(256))), ''.join(CHAR_BINS[chr(i)][k] for i in xrange(256))) for k in xrange(8))
+
+# Length of text at which conversions switch to NumPy array operations (when it's installed)
+NUMPY_MIN_SIZE = 1 << 16
+
+# Number of decimal digits at which words are converted to and from decimal by splitting
+# them in halves, since Python takes time that grows with the square of the length to do it
+# in one piece. BIG_DIV_BITS is the size, in bits, of divisions done in one piece.
+BIG_DEC_DIGITS = 2000
+BIG_DIV_BITS = 2000
 
 # Main method that allows repeated conversion based on user input
 # Parameters: (none)
@@ -36,24 +212,55 @@ import time
 def main():
 	quit = ''
 	while not re.search('q', quit.lower()):
-		os.system('cls')
+		# clearing the screen would write into a pipe
+		if '-' not in sys.argv[3:5] and not ''.join(sys.argv[1:2]).startswith('--manifest'):
+			os.system('cls')
 		convert()
 		quit = raw_input('\n\nPress ENTER to convert again or enter \'q\' to exit.')
 		while quit <> 'q' and quit <> '':
 			quit = raw_input('\n\n***Invalid entry. Press ENTER to convert again or enter \'q\' to exit. ')
 
+# Read the options given after a command's positional parameters. Options are written
+# as '--name' or '--name=value'.
+# Parameters:
+#	args - list of strings, is the command line arguments holding the options
+# Returns:
+#	options - dictionary, maps each option name to its value ('' if no value was given)
+def parse_options(args):
+	options = {}
+	for arg in args:
+		name, eq, value = arg[2:].partition('=')
+		if arg[:2] <> '--' or name not in CONVERT_OPTIONS:
+			print '\n***ERROR: Invalid option \'%s\'. Options are: --%s' % (arg, ', --'.join(CONVERT_OPTIONS))
+			sys.exit(1)
+		options[name] = value
+	return options
+
 # Conversion process that takes in parameters for conversion
 # Parameters: (none)
 # Returns: (none)
 def convert():		
 
+	# run as a conversion server until stopped
+	if len(sys.argv) >= 2 and sys.argv[1][:7] == '--serve':
+		if serve(parse_options(sys.argv[1:])):
+			sys.exit(1)
+		sys.exit()
+
+	# run a manifest of jobs, which is unattended, so it exits when it's done
+	if len(sys.argv) >= 2 and sys.argv[1][:10] == '--manifest':
+		if run_manifest(parse_options(sys.argv[1:])):
+			sys.exit(1)
+		sys.exit()
+
 	# convert with one line of parameters in command prompt
-	if len(sys.argv) == 5:
+	if len(sys.argv) >= 5:
 		from_what = sys.argv[1] # first parameter (after program name) is original data format
 		to_what = sys.argv[2] # second parameter is the format to convert to
 		src = sys.argv[3] # third parameter is where the data is coming from (source file)
 		dst = sys.argv[4] # fourth parameter is where the data is being written to
 		src_text = 0
+		options = parse_options(sys.argv[5:]) # any further parameters are options
 	# convert in user-friendly format with prompts
 	elif len(sys.argv) == 1:
 		os.system('cls')
@@ -110,10 +317,20 @@ def convert():
 				src_text = src_text.replace(' ', '')
 			
 		src = 0 # indicate that the source is user input rather than a file
+		options = {}
 	else:
-		print '\nInvalid input format. Enter either 4 or 0 parameters after program name.\n  <program name> convertFrom convertTo sourceFile destination.'
+		print '\nInvalid input format. Enter either 4 or 0 parameters after program name.\n  <program name> convertFrom convertTo sourceFile destination [--stream[=blockSize]]\n  <program name> convertFrom convertTo sources destinationDir --batch [--jobs=N] [--overwrite=skip|replace|rename] [--answer=yes|no] [--cachedir=dir]\n  <program name> convertFrom convertTo sourceFile destination --offset=K [--count=N]\n  <program name> --serve[=port] [--jobs=N] [--queue=N] [--cache[=N]]\n  <program name> --manifest=file [--jobs=N]'
 		sys.exit(1)
+
+	# convert a whole batch of files instead of one source. A batch runs unattended, so
+	# it exits when it's done rather than asking to convert again.
+	if 'batch' in options:
+		if batch_convert(from_what, to_what, src, dst, options):
+			sys.exit(1)
+		sys.exit()
 		
+	if src == '-' and (dst == '' or dst == '--s'): # piped input is piped back out
+		dst = '-'
 	if dst == '': # blank destination gets a default name that matches the source file
 		def_dst = ''
 		x = -1
@@ -125,91 +342,2264 @@ def convert():
 				def_dst = src[:-4] + str(x) + '.txt'
 		else:
 			dst = src[:-4] + '.txt'
-	elif dst <> '--s' and dst[-4:] <> '.txt': # add .txt extension if not given
-		dst += '.txt'
+	elif dst <> '--s' and dst <> '-' and strip_compression(dst)[-4:] <> '.txt': # add .txt extension if not given
+		# binary data can be saved packed instead (see PACKED_MAGIC)
+		if not (packs_to(dst) and writes_bits(from_what, to_what)):
+			# a compressed destination keeps its compression's extension last (see COMPRESSIONS)
+			dst = strip_compression(dst) + '.txt' + dst[len(strip_compression(dst)):]
 		
 	# check if destination file already exists, ask to overwrite if so
 	overwrite = '1'
-	if os.path.exists(dst):
+	if os.path.exists(dst) and src == '-': # standard input holds data, not answers
+		overwrite = options.get('answer') or 'no'
+	elif os.path.exists(dst) and dst <> '-':
 		overwrite = raw_input('\n' + dst + ' already exists. Overwrite? (yes/no)  ')
 	if not 'y' in overwrite and not 'Y' in overwrite and not '1' in overwrite:
 		print '\n***Conversion operation aborted.***'
 		return
-	
-	# check which function should be performed. Each function independently handles its own conversion
-	# and appropriately writing out data.
-	if from_what == 'hex' and to_what == 'bin': # convert hex to binary
+
+	convert_data(from_what, to_what, src, dst, src_text, options)
+
+	# a pipe runs unattended, so it exits when it's done rather than asking to convert again
+	if src == '-' or dst == '-':
+		sys.exit()
+
+# Convert data once its source and destination are settled, printing any error
+# Parameters:
+#	from_what - string, is the original data format
+#	to_what - string, is the format to convert to
+#	src - string, represents source file to be converted (0 if src_text is user input)
+#	dst - string, represents destination to write converted data to
+#	src_text - string, is the input data to convert (0 to read it from src)
+#	options - dictionary, is the options given with the conversion
+# Returns: (none)
+def convert_data(from_what, to_what, src, dst, src_text, options):
+	if options.get('metrics'):
+		enable_metrics(options['metrics'])
+	if METRICS_SINK is None:
+		convert_source(from_what, to_what, src, dst, src_text, options)
+		return
+	metrics_begin(from_what, to_what, src, dst)
+	if src_text:
+		METRICS['bytes_in'] += len(src_text)
+	try:
+		convert_source(from_what, to_what, src, dst, src_text, options)
+	finally:
+		metrics_end()
+
+# Convert data from a source to a destination (see convert_data)
+def convert_source(from_what, to_what, src, dst, src_text, options):
+	# pipes are always streamed
+	if src == '-' or dst == '-':
+		if not pipe_convert(from_what, to_what, src, dst, options):
+			sys.exit(1) # scripts reading a pipe's output need to know it failed
+		return
+
+	if packs_to(dst) and not writes_bits(from_what, to_what):
+		print '\n***ERROR: Only binary data can be written to a packed binary file (%s).' % (dst)
+		return
+	error = compression_error(src, True) or compression_error(dst)
+	if error:
+		print error
+		return
+	if 'resume' in options and compression_of(dst):
+		print '\n***ERROR: Can\'t resume writing %s. Compressed files can\'t be cut back to a checkpoint.' % (dst)
+		return
+
+	# convert only a range of words, found with the source's word index
+	if 'offset' in options or 'count' in options:
+		return range_convert(from_what, to_what, src, dst, options)
+
+	# stream file-to-file conversions in bounded blocks if asked to, converting blocks in
+	# parallel if given a number of jobs and checkpointing them if they're to be resumed.
+	# Packed binary is read and written whole, since it's a ninth of the size.
+	if ('stream' in options or 'jobs' in options or 'resume' in options) and src and dst <> '--s' \
+			and not packs_to(dst) and not (from_what == 'bin' and is_packed(src)):
 		try:
-			hex_to_bin(src, dst, src_text)
+			block_size = int(options.get('stream') or STREAM_BLOCK_SIZE)
 		except ValueError:
-			print '\n***ERROR: \'%s\' may contain invalid hex data.\n          Only 0-9, a-f, and A-F allowed.' % (src_text)
-	elif from_what == 'hex' and to_what == 'dec': # convert hex to decimal
+			print '\n***ERROR: Invalid block size \'%s\'. Enter the number of characters to read at a time.' % (options['stream'])
+			return
 		try:
-			hex_to_dec(src, dst, src_text)
+			jobs = int(options.get('jobs') or multiprocessing.cpu_count())
+			if jobs < 1:
+				raise ValueError
 		except ValueError:
-			print '\n***ERROR: \'%s\' may contain invalid hex data.\n          Only 0-9, a-f, and A-F allowed.' % (src_text)
-	elif from_what == 'hex' and to_what == 'ascii': # convert hex to ascii
+			print '\n***ERROR: Invalid number of jobs \'%s\'.' % (options['jobs'])
+			return
+		if 'jobs' not in options:
+			jobs = 1
 		try:
-			hex_to_ascii(src, dst, src_text)
+			if stream_convert(from_what, to_what, src, dst, block_size, None, jobs, 'resume' in options):
+				return
 		except (ValueError, TypeError):
-			print '\n***ERROR: \'%s\' may contain invalid hex data.\n          Only 0-9, a-f, and A-F allowed.' % (src_text)
-	elif from_what == 'hex' and to_what == 'inv': # convert hex to binary, invert binary, convert back to hex
+			print INVALID_DATA_ERRORS[from_what] % (src_text)
+			return
+
+	# check which function should be performed (see CONVERSIONS). Each function independently
+	# handles its own conversion and appropriately writing out data.
+	if (from_what, to_what) not in CONVERSIONS: # no valid conversion method was given, print error
+		print '\n***ERROR: Invalid conversion method entered.'
+		return
+	try:
+		CONVERSIONS[(from_what, to_what)](src, dst, src_text)
+	except (ValueError, TypeError):
+		print INVALID_DATA_ERRORS[from_what] % (src_text)
+
+# Convert from standard input and/or to standard output (given as '-') a block at a time,
+# writing each converted block out as soon as it's ready. Messages go to standard error
+# when converted data goes to standard output.
+# Parameters:
+#	from_what - string, is the original data format
+#	to_what - string, is the format to convert to
+#	src - string, represents source file to be converted, or '-' for standard input
+#	dst - string, represents destination file to write to, or '-' for standard output
+#	options - dictionary, is the options given with the conversion
+# Returns:
+#	bool, is whether the data converted (an error is printed if it didn't)
+def pipe_convert(from_what, to_what, src, dst, options):
+	log = sys.stdout
+	if dst == '-':
+		log = sys.stderr
+	if (from_what, to_what) not in CONVERSIONS:
+		print >>log, '\n***ERROR: Invalid conversion method entered.'
+		return False
+	try:
+		block_size = int(options.get('stream') or STREAM_BLOCK_SIZE)
+	except ValueError:
+		print >>log, '\n***ERROR: Invalid block size \'%s\'. Enter the number of characters to read at a time.' % (options['stream'])
+		return False
+	answer = options.get('answer') or 'no'
+
+	try:
+		# records are converted straight from a memory map of the file
+		if src <> '-' and from_what == 'hex' and to_what in ('bin', 'inv') and not re.search('.txt', src):
+			convert_record(src, dst, to_what)
+		# a file that needs to be converted whole is, and then written out
+		elif not stream_convert(from_what, to_what, src, dst, block_size, answer):
+			# the conversion's own function prints its error and gives back nothing
+			dst_text = CONVERSIONS[(from_what, to_what)](src, '--tmp', 0)
+			if dst_text is None:
+				return False
+			sys.stdout.write(dst_text)
+			sys.stdout.flush()
+	except ConversionError, e:
+		print >>log, e
+		return False
+	except (ValueError, TypeError):
+		print >>log, INVALID_DATA_ERRORS[from_what] % (src)
+		return False
+	return True
+
+# Cache of recent translate() results, most recently used last. Entries are keyed by
+# a hash of the data and the conversion, so large inputs aren't held as keys. The cache
+# is off until set_cache gives it room; the least recently used results are dropped
+# once it holds more than CACHE_LIMITS['entries'] results or CACHE_LIMITS['bytes']
+# characters of them.
+CACHE = collections.OrderedDict()
+CACHE_LIMITS = {'entries': 0, 'bytes': 64 << 20}
+CACHE_STATS = {'hits': 0, 'misses': 0, 'evictions': 0, 'bytes': 0}
+CACHE_LOCK = threading.Lock() # the server looks up results from many threads
+CACHE_DEFAULT_ENTRIES = 1024 # entries kept by --cache when no number is given
+
+# Set how many results translate() keeps, emptying the cache
+# Parameters:
+#	entries - int, is the most results kept (0 turns the cache off)
+#	max_bytes - int, is the most characters of results kept
+# Returns: (none)
+def set_cache(entries, max_bytes=64 << 20):
+	CACHE_LOCK.acquire()
+	try:
+		CACHE_LIMITS['entries'] = entries
+		CACHE_LIMITS['bytes'] = max_bytes
+		CACHE.clear()
+		CACHE_STATS.update(hits=0, misses=0, evictions=0, bytes=0)
+	finally:
+		CACHE_LOCK.release()
+
+# Describe how well the cache is doing
+# Parameters: (none)
+# Returns:
+#	dictionary, is the hits, misses, evictions, results held, and characters held
+def cache_stats():
+	CACHE_LOCK.acquire()
+	try:
+		stats = dict(CACHE_STATS)
+		stats['entries'] = len(CACHE)
+	finally:
+		CACHE_LOCK.release()
+	return stats
+
+# Make the cache key for a conversion
+# Parameters:
+#	data - string, is the data to convert
+#	from_fmt - string, is the format of data
+#	to_fmt - string, is the format to convert to
+#	keep_spaces - boolean, is whether spaces between decimal values are kept
+# Returns:
+#	tuple, is the type, hash, and length of data and the conversion. Unicode is hashed
+#	encoded, so the type keeps it apart from a string of the same bytes.
+def cache_key(data, from_fmt, to_fmt, keep_spaces):
+	data_type = type(data)
+	if isinstance(data, unicode):
+		data = data.encode('utf-8')
+	return data_type, hashlib.sha1(data).digest(), len(data), from_fmt, to_fmt, bool(keep_spaces)
+
+# Look up a result in the cache, counting the hit or miss
+# Parameters:
+#	key - tuple, is the key made by cache_key
+# Returns:
+#	string, is the cached result, or None if it isn't cached
+def cache_get(key):
+	CACHE_LOCK.acquire()
+	try:
+		result = CACHE.pop(key, None)
+		if result is None:
+			CACHE_STATS['misses'] += 1
+			return None
+		CACHE[key] = result # move it to the most recently used end
+		CACHE_STATS['hits'] += 1
+		return result
+	finally:
+		CACHE_LOCK.release()
+
+# Keep a result in the cache, dropping the least recently used results to make room
+# Parameters:
+#	key - tuple, is the key made by cache_key
+#	result - string, is the converted data
+# Returns: (none)
+def cache_put(key, result):
+	CACHE_LOCK.acquire()
+	try:
+		if not CACHE_LIMITS['entries'] or len(result) > CACHE_LIMITS['bytes'] or key in CACHE:
+			return
+		CACHE[key] = result
+		CACHE_STATS['bytes'] += len(result)
+		while len(CACHE) > CACHE_LIMITS['entries'] or CACHE_STATS['bytes'] > CACHE_LIMITS['bytes']:
+			CACHE_STATS['bytes'] -= len(CACHE.popitem(last=False)[1])
+			CACHE_STATS['evictions'] += 1
+	finally:
+		CACHE_LOCK.release()
+
+# Convert data from one format to another and return it. Nothing is printed, asked,
+# read, or written, so this can be called from other modules as often as needed.
+# Data is read the way the conversion functions read user-entered input, except:
+#	- spaces between decimal values are kept unless keep_spaces is False, instead of asking
+#	- binary to hex keeps the spaces between the converted words
+#	- binary to ascii returns every converted character
+# Results are kept in the cache when set_cache has turned it on, and recorded in the
+# metrics when enable_metrics has turned them on.
+# Parameters:
+#	data - string, is the data to convert (binary data may be packed, see pack_bin, and any
+#	       data may be compressed, see COMPRESSION_MAGIC)
+#	from_fmt - string, is the format of data ('hex', 'bin', 'dec', or 'ascii')
+#	to_fmt - string, is the format to convert to ('hex', 'bin', 'dec', 'ascii', or 'inv'
+#	         to invert hex or binary data)
+#	keep_spaces - boolean, False to join converted decimal values without spaces
+# Returns:
+#	string, is the converted data
+# Raises:
+#	UnsupportedConversionError - if there's no conversion between the formats
+#	InvalidDataError - if data isn't valid in from_fmt
+def translate(data, from_fmt, to_fmt, keep_spaces=True):
+	if METRICS_SINK is not None and METRICS is None:
+		metrics_begin(from_fmt, to_fmt)
+		METRICS['bytes_in'] += len(data)
 		try:
-			invert_hex(src, dst, src_text)
-		except ValueError:
-			print '\n***ERROR: \'%s\' may contain invalid hex data.\n          Only 0-9, a-f, and A-F allowed.' % (src_text)
-	elif from_what == 'bin' and to_what == 'hex': # convert binary to hex
+			result = translate(data, from_fmt, to_fmt, keep_spaces)
+			METRICS['bytes_out'] += len(result)
+			return result
+		finally:
+			metrics_end()
+	if not CACHE_LIMITS['entries']:
+		return translate_text(data, from_fmt, to_fmt, keep_spaces)
+	key = cache_key(data, from_fmt, to_fmt, keep_spaces)
+	result = cache_get(key)
+	if result is None:
+		result = translate_text(data, from_fmt, to_fmt, keep_spaces)
+		cache_put(key, result)
+	return result
+
+# Convert data from one format to another and return it, without the cache. See translate.
+def translate_text(data, from_fmt, to_fmt, keep_spaces=True):
+	if (from_fmt, to_fmt) not in TEXT_CONVERSIONS:
+		raise UnsupportedConversionError('\n***ERROR: Cannot convert %s to %s.' % (from_fmt, to_fmt))
+	try:
+		if isinstance(data, str) and sniff_compression(data):
+			data = ''.join(decompress_blocks([data]))
+		if from_fmt == 'bin' and data[:len(PACKED_MAGIC)] == PACKED_MAGIC:
+			data = unpack_bin(data)
+		if (from_fmt, to_fmt) in TRANSLATE_PREPARES:
+			data = TRANSLATE_PREPARES[(from_fmt, to_fmt)](data)
+		return convert_text(from_fmt, to_fmt, data, True, keep_spaces, True)
+	except ConversionError:
+		raise
+	except (ValueError, TypeError):
+		raise InvalidDataError(INVALID_DATA_ERRORS[from_fmt] % (data))
+
+# Pad binary text out to whole bytes with leading zeros, as invert_bin does
+# Parameters:
+#	data - string, is the binary text
+# Returns:
+#	string, is the padded text
+def pad_bits(data):
+	return '0' * (-(len(data) - data.count(' ')) % 8) + data
+
+# Check that decimal text to convert to ascii is delimited, as dec_to_ascii does
+# Parameters:
+#	data - string, is the decimal text
+# Returns:
+#	string, is the same text
+# Raises:
+#	InvalidDataError - if more than one value isn't delimited by spaces
+def check_dec_delimited(data):
+	if len(data) > 3 and not re.search('\s', data):
+		raise InvalidDataError('\n***ERROR: Invalid input format. Enter decimal values delimited by spaces.')
+	return data
+
+# What translate does to data before converting it, by the formats it converts from and to
+TRANSLATE_PREPARES = {
+	('hex', 'ascii'): lambda data: data.replace('0x', ''),
+	('bin', 'ascii'): lambda data: data.replace('0b', ''),
+	('bin', 'inv'): pad_bits,
+	('dec', 'ascii'): check_dec_delimited,
+}
+
+# Codecs that read and write each format as bytes, so that any chain of formats and
+# stages can be converted through bytes (see translate_chain). Each codec is a dictionary:
+#	decode - function, reads a block of cleaned text as bytes
+#	encode - function, writes bytes as text
+#	unit - int, characters per byte once whitespace and the prefix are removed, 0 if the
+#	       characters are the bytes themselves, or None if bytes are whitespace-delimited values
+#	prefix - string, is a marker that may come before values and is removed (e.g. '0x')
+#	sep - string, is written between converted blocks
+CODECS = {}
+
+# Stages that change bytes on their way between codecs, by name. Each is a function that
+# takes and returns the same number of bytes, and must work on any block of the data on its
+# own that's a whole number of its units (STAGE_UNITS, in bytes). Only the last block of
+# the data may be shorter.
+STAGES = {}
+STAGE_UNITS = {}
+
+# Families of stages that take an argument, by name. In a chain, a family's stage is named
+# with its argument after a colon (e.g. 'xor:5A'). Each family is a function that takes the
+# argument and returns the stage and its unit.
+STAGE_FAMILIES = {}
+
+# Add a format that chains of conversions can read and write
+# Parameters:
+#	name - string, is the format's name
+#	decode, encode, unit, prefix, sep - are as described for CODECS
+# Returns: (none)
+def register_codec(name, decode, encode, unit, prefix='', sep=' '):
+	CODECS[name] = {'decode': decode, 'encode': encode, 'unit': unit, 'prefix': prefix, 'sep': sep}
+
+# Add a stage that chains of conversions can pass bytes through
+# Parameters:
+#	name - string, is the stage's name
+#	stage - function, takes and returns bytes
+#	unit - int, is the number of bytes the stage works on together (e.g. 4 to swap the
+#	       bytes of 32-bit words), so blocks passed to it are a multiple of this
+# Returns: (none)
+def register_stage(name, stage, unit=1):
+	STAGES[name] = stage
+	STAGE_UNITS[name] = unit
+
+# Add a family of stages that take an argument (see STAGE_FAMILIES)
+# Parameters:
+#	name - string, is the family's name
+#	make_stage - function, takes the argument (a string) and returns the stage and its unit
+# Returns: (none)
+def register_stage_family(name, make_stage):
+	STAGE_FAMILIES[name] = make_stage
+
+# Find the stage a chain names (see translate_chain)
+# Parameters:
+#	name - string, is a registered stage or a family's name and argument (e.g. 'rol:3')
+# Returns:
+#	(stage, unit) - tuple, is the stage's function and unit, or None if it isn't a stage
+# Raises:
+#	UnsupportedConversionError - if a family's argument isn't valid
+def find_stage(name):
+	if name in STAGES:
+		return STAGES[name], STAGE_UNITS[name]
+	family, colon, arg = name.partition(':')
+	if not colon or family not in STAGE_FAMILIES:
+		return None
+	try:
+		return STAGE_FAMILIES[family](arg)
+	except (ValueError, TypeError):
+		raise UnsupportedConversionError('\n***ERROR: Invalid argument \'%s\' for the \'%s\' stage.' % (arg, family))
+
+# Codec functions for the formats. Decoders read a block of cleaned text as bytes and
+# encoders write bytes as text, the way the ascii conversions write each character.
+# Parameters:
+#	text - string, is the text to read (decoders)
+#	data - string, is the bytes to write (encoders)
+# Returns:
+#	string, is the bytes read (decoders) or the text written (encoders)
+def decode_hex(text):
+	if len(text) % 2 <> 0:
+		raise InvalidDataError('\n***ERROR: Input data must be an even number of characters. You may need to add leading zeros to the hex bytes.')
+	return binascii.unhexlify(text)
+
+def encode_hex(data):
+	return bytes_to_hex(data)
+
+def decode_bin(text):
+	if len(text) % 8 <> 0:
+		raise InvalidDataError('\n***ERROR: Input data does not divide evenly into bytes.')
+	if text.translate(None, '01'):
+		raise InvalidDataError(INVALID_DATA_ERRORS['bin'] % (text))
+	return bin_to_bytes(text)
+
+def encode_bin(data):
+	return bytes_to_bin(data)
+
+def decode_dec(text):
+	words = text.split()
+	try:
+		return ''.join(map(DEC_CHARS.__getitem__, words))
+	except KeyError:
+		# values written differently than str() writes them, e.g. with leading zeros
+		for word in words:
+			if int(word) > 255:
+				raise InvalidDataError('\n***ERROR: Cannot convert integers greater than 255 to ASCII.')
+		return ''.join([chr(int(word)) for word in words])
+
+def encode_dec(data):
+	return ' '.join(map(CHAR_DECS.__getitem__, data))
+
+# Bitwise stages. Each works on a whole block of bytes at once, with a translate table or
+# by slicing, rather than a byte or bit at a time.
+# Parameters:
+#	data - string, is the bytes to change
+# Returns:
+#	string, is the changed bytes
+
+# Invert each bit of the bytes
+def invert_bytes(data):
+	return data.translate(INVERTED_BYTES)
+
+# Reverse the order of the bits of each byte
+def reverse_bytes(data):
+	return data.translate(REVERSED_BYTES)
+
+# Make a stage that reverses the order of the bytes of each word of a number of bytes
+# (e.g. 4 swaps 32-bit words between big and little endian)
+# Parameters:
+#	width - int, is the number of bytes in a word
+# Returns:
+#	(stage, unit) - tuple, is the stage and its unit (the width)
+def make_swap_stage(width):
+	def swap_bytes(data):
+		if len(data) % width:
+			raise InvalidDataError('\n***ERROR: Input data does not divide evenly into %d-bit words.' % (width * 8))
+		return interleave([data[width - 1 - k::width] for k in xrange(width)], '')
+	return swap_bytes, width
+
+# Make a stage that XORs bytes with a key, repeated over the data
+# Parameters:
+#	key - string, is the key in hex (e.g. '5A' or 'DEADBEEF')
+# Returns:
+#	(stage, unit) - tuple, is the stage and its unit (the key's length in bytes)
+def make_xor_stage(key):
+	key = decode_hex(key.replace('0x', ''))
+	if not key:
+		raise ValueError
+	# one translate table for each byte of the key, applied to every byte it lines up with
+	tables = [string.maketrans(''.join(map(chr, xrange(256))), ''.join(chr(i ^ ord(k)) for i in xrange(256))) for k in key]
+	width = len(key)
+	def xor_bytes(data):
+		whole = len(data) - len(data) % width
+		text = interleave([data[k:whole:width].translate(tables[k]) for k in xrange(width)], '')
+		return text + ''.join(data[whole + k].translate(tables[k]) for k in xrange(len(data) - whole))
+	return xor_bytes, width
+
+# Make a stage that rotates the bits of each byte
+# Parameters:
+#	bits - string, is the number of places to rotate by (0 to 7)
+#	right - boolean, True to rotate right instead of left
+# Returns:
+#	(stage, unit) - tuple, is the stage and its unit (1)
+def make_rotate_stage(bits, right=False):
+	bits = int(bits)
+	if not 0 <= bits < 8:
+		raise ValueError
+	table = ROTATED_BYTES[(8 - bits) % 8 if right else bits]
+	return (lambda data: data.translate(table)), 1
+
+register_codec('hex', decode_hex, encode_hex, 2, '0x')
+register_codec('bin', decode_bin, encode_bin, 8, '0b')
+register_codec('dec', decode_dec, encode_dec, None)
+register_codec('ascii', str, str, 0, sep='')
+register_stage('inv', invert_bytes)
+register_stage('rev', reverse_bytes)
+for width in (2, 4, 8):
+	register_stage('swap%d' % (width * 8), *make_swap_stage(width))
+register_stage_family('xor', make_xor_stage)
+register_stage_family('rol', make_rotate_stage)
+register_stage_family('ror', lambda bits: make_rotate_stage(bits, True))
+
+# Chain size, in characters of the source, of each block converted by translate_chain
+CHAIN_BLOCK_SIZE = 1 << 16
+
+# Split text into blocks that a codec can read one at a time. Whitespace and the codec's
+# prefix are removed, and each block holds whole bytes of the data.
+# Parameters:
+#	data - string, is the text to split
+#	codec - dictionary, is the codec that will read the blocks (see CODECS)
+# Returns:
+#	string, yielded for each block
+def iter_codec_blocks(data, codec):
+	unit, prefix = codec['unit'], codec['prefix']
+	carry = '' # part of a byte (or value) left over from the last block
+	for start in xrange(0, len(data), CHAIN_BLOCK_SIZE):
+		block = carry + data[start:start + CHAIN_BLOCK_SIZE]
+		final = start + CHAIN_BLOCK_SIZE >= len(data)
+		carry = ''
+		if unit is None:
+			# cut after the last whitespace, so no value is split
+			if not final:
+				cut = max(block.rfind(c) for c in string.whitespace) + 1
+				block, carry = block[:cut], block[cut:]
+		elif unit:
+			# the start of a prefix at the end of the block waits for the rest of it
+			if not final and prefix and block[-1:] == prefix[0]:
+				block, held = block[:-1], block[-1:]
+			else:
+				held = ''
+			if prefix:
+				block = block.replace(prefix, '')
+			block = block.translate(None, string.whitespace)
+			if not final:
+				cut = len(block) - len(block) % unit
+				block, carry = block[:cut], block[cut:] + held
+		yield block
+
+# Convert data through a chain of formats and stages, e.g. translate_chain(data, 'hex',
+# 'inv', 'ascii') inverts hex data and writes it as ascii. The data is read as bytes by
+# the first format's codec, passed through each stage, and written by the last format's
+# codec (or the first's, if the chain ends with a stage). This is done a block at a time
+# in one pass, so no intermediate format is ever written out in full. Unlike translate,
+# every format is read and written a byte at a time, e.g. decimal values are 0 to 255.
+# The stages are:
+#	inv - invert each bit
+#	rev - reverse the order of the bits of each byte
+#	swap16, swap32, swap64 - reverse the order of the bytes of each 16, 32, or 64-bit word
+#	xor:key - XOR with a key given in hex, repeated over the data (e.g. 'xor:DEADBEEF')
+#	rol:n, ror:n - rotate the bits of each byte left or right by n places
+# Parameters:
+#	data - string, is the data to convert
+#	formats - strings, are the format of data, then any stages and formats to convert through
+# Returns:
+#	string, is the converted data
+# Raises:
+#	UnsupportedConversionError - if a format or stage isn't registered
+#	InvalidDataError - if data isn't valid in its format
+def translate_chain(data, *formats):
+	# formats in the middle of the chain read back the bytes they'd write, so only stages matter
+	stages = []
+	unit = 1 # bytes passed to the stages at a time are a multiple of every stage's unit
+	for name in formats:
+		if name in CODECS:
+			continue
+		found = find_stage(name)
+		if found is None:
+			raise UnsupportedConversionError('\n***ERROR: \'%s\' is not a format or stage that can be chained.' % (name))
+		stages.append(found[0])
+		unit = unit * found[1] // fractions.gcd(unit, found[1])
+	if not formats or formats[0] not in CODECS:
+		raise UnsupportedConversionError('\n***ERROR: A chain must start with a format.')
+	decoder = CODECS[formats[0]]
+	if formats[0] == 'bin' and data[:len(PACKED_MAGIC)] == PACKED_MAGIC:
+		data = unpack_bin(data)
+	encoder = CODECS[[name for name in formats if name in CODECS][-1]]
+
+	pieces = []
+	carry = '' # bytes left over from the last block, short of a whole unit
+	try:
+		for block in itertools.chain(iter_codec_blocks(data, decoder), [None]):
+			if block is None: # the end of the data, where only a part of a unit may be left
+				piece, carry = carry, ''
+			else:
+				piece = carry + decoder['decode'](block)
+				cut = len(piece) - len(piece) % unit
+				piece, carry = piece[:cut], piece[cut:]
+			for stage in stages:
+				piece = stage(piece)
+			if piece:
+				pieces.append(encoder['encode'](piece))
+	except ConversionError:
+		raise
+	except (ValueError, TypeError):
+		raise InvalidDataError(INVALID_DATA_ERRORS.get(formats[0], '\n***ERROR: \'%s\' may contain invalid data.') % (data))
+	return encoder['sep'].join(pieces)
+
+# What a batch does when a destination file already exists
+#	skip - leave the existing file and don't convert the source
+#	replace - overwrite the existing file
+#	rename - save to the source's name with a number appended, as convert() does
+BATCH_OVERWRITE_POLICIES = ('skip', 'replace', 'rename')
+
+# Find the source files of a batch
+# Parameters:
+#	sources - string, is a directory, a glob pattern, or '@' followed by the name of a
+#	          file listing one source per line
+# Returns:
+#	list of strings, is the source files in the order they're converted
+def batch_sources(sources):
+	if sources[:1] == '@':
+		list_file = open(sources[1:], 'rU')
+		names = [line.strip() for line in list_file if line.strip()]
+		list_file.close()
+		return names
+	if os.path.isdir(sources):
+		names = [os.path.join(sources, name) for name in sorted(os.listdir(sources))]
+		return [name for name in names if os.path.isfile(name)]
+	return sorted(name for name in glob.glob(sources) if os.path.isfile(name))
+
+# Set up a process that converts batch files. Nobody is there to answer questions a
+# conversion asks (e.g. whether to keep spaces), so each gets the answer given to the batch.
+# Parameters:
+#	answer - string, is the answer to every question
+# Returns: (none)
+def batch_init(answer):
+	global raw_input
+	raw_input = lambda prompt='': answer
+
+# Convert one file of a batch, keeping what it prints rather than showing it. With a
+# disk cache, a source converted the same way before is copied from the cache instead,
+# and a new conversion is copied into it.
+# Parameters:
+#	job - tuple, is the from format, to format, source, destination, options, and disk
+#	      cache (None, or the cache directory, the source's digest if it's known from
+#	      the index, and the conversion's part of the cache key)
+# Returns:
+#	tuple, is the source, destination, whether it converted, the error shown (if any),
+#	whether it came from the cache, and the source's digest (None without a cache)
+def batch_worker(job):
+	from_what, to_what, src, dst, options, cache = job
+	entry = digest = None
+	if cache:
+		cache_dir, digest, conversion = cache
 		try:
-			bin_to_hex(src, dst, src_text)
-		except ValueError:
-			print '\n***ERROR: \'%s\' may contain invalid binary data.\n       Only 0 and 1 allowed.' % (src_text)
-	elif from_what == 'bin' and to_what == 'dec': # convert binary to decimal
+			digest = digest or file_digest(src)
+			entry = disk_cache_entry(cache_dir, digest, conversion)
+			if os.path.exists(entry):
+				shutil.copyfile(entry, dst)
+				os.utime(entry, None) # mark it recently used
+				return src, dst, True, '', True, digest
+		except (IOError, OSError):
+			if digest is None: # the source couldn't be read, so let the conversion report it
+				entry = None
+	stdout = sys.stdout
+	sys.stdout = output = StringIO.StringIO()
+	try:
+		convert_data(from_what, to_what, src, dst, 0, options)
+		error = ''
+	except SystemExit:
+		error = 'Conversion stopped.'
+	except Exception, e:
+		error = 'Conversion failed: %s' % (e)
+	finally:
+		sys.stdout = stdout
+	# conversions print their errors instead of raising them
+	for line in output.getvalue().splitlines():
+		if line.startswith('***ERROR') or line.startswith('***Error'):
+			error = line.strip('*').replace('ERROR: ', '', 1)
+	if not error and not os.path.exists(dst):
+		error = 'Nothing was written.'
+	if entry and not error:
+		disk_cache_store(dst, entry)
+	return src, dst, not error, error, False, digest
+
+# Disk cache of converted batch files. Each converted file is kept under a name made
+# from the digest of its source and how it was converted, so any source with the same
+# contents converted the same way is copied from the cache instead. An index of each
+# source's size, modification time, and digest saves reading unchanged sources to hash
+# them again. Once the cache holds more than DISK_CACHE_MAX_BYTES, the files used
+# least recently are removed.
+DISK_CACHE_MAX_BYTES = 1 << 30
+DISK_CACHE_INDEX = 'index.json'
+DISK_CACHE_READ_SIZE = 1 << 20 # characters hashed at a time
+
+# Hash a file's contents without reading it all into memory
+# Parameters:
+#	name - string, is the file to hash
+# Returns:
+#	string, is the hex SHA-1 digest of the file
+def file_digest(name):
+	digest = hashlib.sha1()
+	src_file = open(name, 'rb')
+	try:
+		for block in iter(lambda: src_file.read(DISK_CACHE_READ_SIZE), ''):
+			digest.update(block)
+	finally:
+		src_file.close()
+	return digest.hexdigest()
+
+# Hash this script, so that a cache made by another version of it isn't used
+# Parameters: (none)
+# Returns:
+#	string, is the hex SHA-1 digest of the script
+def tool_digest():
+	script = os.path.splitext(os.path.abspath(__file__))[0] + '.py'
+	if not os.path.exists(script): # run from compiled code only
+		script = os.path.abspath(__file__)
+	return file_digest(script)
+
+# Describe how a source is read, which can change what the same contents convert to: as
+# text or as a raw record (e.g. hex sources not named .txt are hexlified, see as_hex_text),
+# and whether it's compressed or packed binary
+# Parameters:
+#	src - string, represents the source file
+#	from_what - string, is the format of the source
+# Returns:
+#	string, is the kind of source, e.g. 'text', 'record', or 'text .gz packed'
+def source_kind(src, from_what):
+	kind = 'text' if re.search('.txt', src) else 'record'
+	compression = compression_of(src, True)
+	if compression:
+		kind += ' ' + compression
+	if from_what == 'bin' and is_packed(src):
+		kind += ' packed'
+	return kind
+
+# Find where a conversion of a source is kept in the cache
+# Parameters:
+#	cache_dir - string, is the cache directory
+#	digest - string, is the digest of the source
+#	conversion - string, is the formats, answer, and script digest of the conversion,
+#	             and the kind of source (see source_kind)
+# Returns:
+#	string, is the cache file's name (which may not exist yet)
+def disk_cache_entry(cache_dir, digest, conversion):
+	key = hashlib.sha1(digest + ' ' + conversion).hexdigest()
+	return os.path.join(cache_dir, key[:2], key + '.txt')
+
+# Copy a converted file into the cache. It's copied to a temporary name and then
+# renamed, so other processes never see part of a file.
+# Parameters:
+#	dst - string, is the converted file
+#	entry - string, is the cache file's name
+# Returns: (none)
+def disk_cache_store(dst, entry):
+	try:
+		if not os.path.isdir(os.path.dirname(entry)):
+			os.makedirs(os.path.dirname(entry))
+		part = '%s.%d.part' % (entry, os.getpid())
+		shutil.copyfile(dst, part)
+		if os.path.exists(entry): # rename can't replace a file on Windows
+			os.remove(part)
+		else:
+			os.rename(part, entry)
+	except (IOError, OSError): # a cache that can't be written just isn't used
+		pass
+
+# Read the cache's index of source digests
+# Parameters:
+#	cache_dir - string, is the cache directory
+# Returns:
+#	dictionary, maps each source's full path to its size, modification time, and digest
+def disk_cache_index(cache_dir):
+	try:
+		index_file = open(os.path.join(cache_dir, DISK_CACHE_INDEX), 'rb')
 		try:
-			bin_to_dec(src, dst, src_text)
-		except ValueError:
-			print '\n***ERROR: \'%s\' may contain invalid binary data.\n       Only 0 and 1 allowed.' % (src_text)
-	elif from_what == 'bin' and to_what == 'ascii': # convert binary to ascii
+			return json.load(index_file)
+		finally:
+			index_file.close()
+	except (IOError, ValueError): # no cache yet, or an index that can't be read
+		return {}
+
+# Look up a source's digest in the index, if the source hasn't changed since
+# Parameters:
+#	index - dictionary, is the index read by disk_cache_index
+#	src - string, is the source file
+# Returns:
+#	string, is the source's digest, or None if it isn't known
+def disk_cache_known(index, src):
+	try:
+		info = os.stat(src)
+	except OSError:
+		return None
+	size, mtime, digest = index.get(os.path.abspath(src), (None, None, None))
+	if size == info.st_size and mtime == info.st_mtime:
+		return digest
+	return None
+
+# Record a source's digest in the index
+# Parameters:
+#	index - dictionary, is the index read by disk_cache_index
+#	src - string, is the source file
+#	digest - string, is the source's digest
+# Returns: (none)
+def disk_cache_remember(index, src, digest):
+	try:
+		info = os.stat(src)
+	except OSError:
+		return
+	index[os.path.abspath(src)] = (info.st_size, info.st_mtime, digest)
+
+# Write the cache's index
+# Parameters:
+#	cache_dir - string, is the cache directory
+#	index - dictionary, is the index to write
+# Returns: (none)
+def disk_cache_save(cache_dir, index):
+	try:
+		if not os.path.isdir(cache_dir):
+			os.makedirs(cache_dir)
+		name = os.path.join(cache_dir, DISK_CACHE_INDEX)
+		index_file = open(name + '.part', 'wb')
+		json.dump(index, index_file)
+		index_file.close()
+		if os.path.exists(name):
+			os.remove(name)
+		os.rename(name + '.part', name)
+	except (IOError, OSError):
+		pass
+
+# Remove the least recently used files from the cache until it fits in its size limit
+# Parameters:
+#	cache_dir - string, is the cache directory
+#	max_bytes - int, is the most the cached files may hold
+# Returns: (none)
+def disk_cache_evict(cache_dir, max_bytes=DISK_CACHE_MAX_BYTES):
+	entries = []
+	for name in glob.glob(os.path.join(cache_dir, '??', '*.txt')):
 		try:
-			bin_to_ascii(src, dst, src_text)
-		except ValueError:
-			print '\n***ERROR: \'%s\' may contain invalid binary data.\n       Only 0 and 1 allowed.' % (src_text)
-	elif from_what == 'bin' and to_what == 'inv': # invert binary bits
+			info = os.stat(name)
+		except OSError:
+			continue
+		entries.append((info.st_mtime, info.st_size, name))
+	total = sum(size for mtime, size, name in entries)
+	for mtime, size, name in sorted(entries):
+		if total <= max_bytes:
+			break
 		try:
-			invert_bin(src, dst, src_text)
-		except ValueError:
-			print '\n***ERROR: \'%s\' may contain invalid binary data.\n       Only 0 and 1 allowed.' % (src_text)
-	elif from_what == 'dec' and to_what == 'bin': # convert decimal to binary
+			os.remove(name)
+			total -= size
+		except OSError:
+			pass
+
+# Convert a batch of files in parallel, then print a summary of what was converted
+# Parameters:
+#	from_what - string, is the original data format
+#	to_what - string, is the format to convert to
+#	sources - string, is a directory, glob pattern, or '@' and a file listing sources
+#	dst_dir - string, is the directory to save to ('' for each source's own directory)
+#	options - dictionary, is the options given with the batch
+# Returns:
+#	boolean, True if some file couldn't be converted
+def batch_convert(from_what, to_what, sources, dst_dir, options):
+	if (from_what, to_what) not in CONVERSIONS:
+		print '\n***ERROR: Invalid conversion method entered.'
+		return True
+	overwrite = options.get('overwrite') or 'skip'
+	if overwrite not in BATCH_OVERWRITE_POLICIES:
+		print '\n***ERROR: Invalid overwrite policy \'%s\'. Enter either \'%s\'.' % (overwrite, '\', \''.join(BATCH_OVERWRITE_POLICIES))
+		return True
+	try:
+		jobs = int(options.get('jobs') or multiprocessing.cpu_count())
+		if jobs < 1:
+			raise ValueError
+	except ValueError:
+		print '\n***ERROR: Invalid number of jobs \'%s\'.' % (options['jobs'])
+		return True
+	answer = options.get('answer') or 'no'
+	try:
+		src_names = batch_sources(sources)
+	except IOError:
+		print '\n***ERROR: Couldn\'t open', sources[1:], 'to read the batch\'s sources.'
+		return True
+	if not src_names:
+		print '\n***ERROR: No source files found in \'%s\'.' % (sources)
+		return True
+	if dst_dir and not os.path.isdir(dst_dir):
+		os.makedirs(dst_dir)
+	conversion_options = dict((name, value) for name, value in options.items() if name in ('stream', 'metrics'))
+	cache_dir = options.get('cachedir')
+	if cache_dir:
+		index = disk_cache_index(cache_dir)
+		# the answer changes what's written, and a new version of this script may too
+		conversion = '%s %s %s %s' % (from_what, to_what, answer, tool_digest())
+
+	# settle every destination first, so that no two sources are saved to the same file
+	work = []
+	skipped = []
+	taken = set(os.path.abspath(src) for src in src_names)
+	for src in src_names:
+		name = os.path.splitext(os.path.basename(strip_compression(src)))[0]
+		base = os.path.join(dst_dir or os.path.dirname(src), name)
+		dst = base + '.txt'
+		if os.path.exists(dst) or os.path.abspath(dst) in taken:
+			if overwrite == 'skip' or os.path.abspath(dst) in taken and overwrite == 'replace':
+				skipped.append(src)
+				continue
+			# increment appended number as long as the file already exists
+			x = -1
+			while overwrite == 'rename' and (os.path.exists(dst) or os.path.abspath(dst) in taken):
+				dst = base + str(x) + '.txt'
+				x -= 1
+		taken.add(os.path.abspath(dst))
+		cache = None
+		if cache_dir:
+			cache = (cache_dir, disk_cache_known(index, src), conversion + ' ' + source_kind(src, from_what))
+		work.append((from_what, to_what, src, dst, conversion_options, cache))
+
+	print '\n...Converting %d files with %d processes...' % (len(work), jobs)
+	start = time.time()
+	failed = []
+	converted = 0
+	cached = 0
+	if work:
+		pool = multiprocessing.Pool(min(jobs, len(work)), batch_init, (answer,))
 		try:
-			dec_to_bin(src, dst, src_text)
-		except ValueError:
-			print '\n***ERROR: \'%s\' may contain invalid decimal data.\n       Only 0-9 allowed.' % (src_text)
-	elif from_what == 'dec' and to_what == 'hex': # convert decimal to hex
+			for src, dst, ok, error, hit, digest in pool.imap_unordered(batch_worker, work):
+				if digest:
+					disk_cache_remember(index, src, digest)
+				if ok:
+					converted += 1
+					cached += hit
+				else:
+					failed.append(src)
+					print '\n***ERROR: %s -> %s: %s' % (src, dst, error)
+			pool.close()
+		except KeyboardInterrupt:
+			pool.terminate()
+			raise
+		pool.join()
+	if cache_dir:
+		disk_cache_save(cache_dir, index)
+		disk_cache_evict(cache_dir)
+
+	# summarize the batch
+	print '\nConverted %d of %d files (%d skipped, %d failed) in %.2f seconds.' % (converted, len(src_names), len(skipped), len(failed), time.time() - start)
+	if cache_dir:
+		print '  %d of them were copied from the cache in %s' % (cached, cache_dir)
+	for src in skipped:
+		print '  Skipped', src
+	return len(failed) > 0
+
+# Options a job of a manifest can be given (see run_manifest). Jobs already run in a pool,
+# so they can't be given processes of their own, or be batches or servers.
+MANIFEST_JOB_OPTIONS = ('stream', 'answer', 'resume', 'offset', 'count', 'metrics')
+
+# Read the jobs of a manifest, one JSON object a line, e.g.
+#	{"src": "a.txt", "dst": "a.bin", "from": "hex", "to": "bin", "options": {"stream": 65536}, "priority": 1}
+# Parameters:
+#	manifest_file - file, is the open manifest
+# Returns:
+#	jobs - list of dictionaries, is each job, with its id (its line number, unless it
+#	       gives one) and its priority (0 unless it gives one)
+#	invalid - list of dictionaries, is the result (see manifest_worker) of each line
+#	          that isn't a valid job
+def read_manifest(manifest_file):
+	jobs = []
+	invalid = []
+	for number, line in enumerate(manifest_file, 1):
+		if not line.strip():
+			continue
 		try:
-			dec_to_hex(src, dst, src_text)
-		except ValueError:
-			print '\n***ERROR: \'%s\' may contain invalid decimal data.\n       Only 0-9 allowed.' % (src_text)
-	elif from_what == 'dec' and to_what == 'ascii': # convert decimal to ascii
+			job = json.loads(line)
+			if not isinstance(job, dict):
+				raise ValueError('a job must be an object')
+			for name in ('src', 'dst', 'from', 'to'):
+				if not isinstance(job.get(name), basestring) or not job[name]:
+					raise ValueError('\'%s\' must be given' % (name))
+				job[name] = job[name].encode('utf-8')
+			for name in ('src', 'dst'):
+				if job[name] == '-': # a job's output is kept from standard output (see batch_worker)
+					raise ValueError('\'%s\' must be a file, not a pipe (\'-\')' % (name))
+			options = {}
+			for name, value in (job.get('options') or {}).items():
+				if name not in MANIFEST_JOB_OPTIONS:
+					raise ValueError('\'%s\' isn\'t an option of a job. Options are: %s' % (name, ', '.join(MANIFEST_JOB_OPTIONS)))
+				if value is not False and value is not None: # true is an option given without a value
+					options[name.encode('utf-8')] = '' if value is True else unicode(value).encode('utf-8')
+			job['options'] = options
+			job['priority'] = float(job.get('priority') or 0)
+			job.setdefault('id', number)
+			jobs.append(job)
+		except (ValueError, TypeError), e:
+			invalid.append({'id': number, 'status': 'invalid', 'error': 'Line %d: %s' % (number, e)})
+	return jobs, invalid
+
+# Run one job of a manifest (see batch_worker), timing it
+# Parameters:
+#	job - dictionary, is the job (see read_manifest)
+# Returns:
+#	dictionary, is the job's result: its id, source, destination, status ('ok' or
+#	'failed'), the error shown (if any), the seconds it took, and the bytes read and written
+def manifest_worker(job):
+	global raw_input, METRICS_SINK
+	answer = job['options'].get('answer') or 'no'
+	raw_input = lambda prompt='': answer # nobody is there to answer questions
+	sink = METRICS_SINK # a job's --metrics is only for that job
+	start = time.time()
+	try:
+		src, dst, ok, error, hit, digest = batch_worker((job['from'], job['to'], job['src'], job['dst'], job['options'], None))
+	finally:
+		METRICS_SINK = sink
+	result = {
+		'id': job['id'], 'src': src, 'dst': dst, 'status': 'ok' if ok else 'failed', 'error': error,
+		'seconds': round(time.time() - start, 6), 'bytes_in': 0, 'bytes_out': 0,
+	}
+	for name, key in ((src, 'bytes_in'), (dst, 'bytes_out')):
+		if os.path.isfile(name):
+			result[key] = os.path.getsize(name)
+	return result
+
+# Run a manifest of conversion jobs in this process, or a pool of them, writing a line of
+# JSON to standard output with the result of each job as it finishes (see manifest_worker).
+# Jobs start in order of priority, highest first, and in the order they're listed when
+# their priorities are the same. Messages go to standard error.
+# Parameters:
+#	options - dictionary, is the options given with the manifest ('manifest', the file to
+#	          read the jobs from or '-' for standard input, and 'jobs')
+# Returns:
+#	boolean, True if some job failed
+def run_manifest(options):
+	try:
+		jobs = int(options.get('jobs') or 1)
+		if jobs < 1:
+			raise ValueError
+	except ValueError:
+		print >>sys.stderr, '\n***ERROR: Invalid number of jobs \'%s\'.' % (options['jobs'])
+		return True
+	try:
+		if options['manifest'] in ('', '-'):
+			work, results = read_manifest(sys.stdin)
+		else:
+			manifest_file = open(options['manifest'], 'rU')
+			try:
+				work, results = read_manifest(manifest_file)
+			finally:
+				manifest_file.close()
+	except IOError:
+		print >>sys.stderr, '\n***ERROR: Couldn\'t open', options['manifest'], 'to read the jobs.'
+		return True
+	# sorting is stable, so jobs of the same priority keep their order
+	work.sort(key=lambda job: -job['priority'])
+
+	start = time.time()
+	pool = None
+	if jobs > 1 and len(work) > 1:
+		pool = multiprocessing.Pool(min(jobs, len(work)))
+		finished = pool.imap_unordered(manifest_worker, work)
+	else:
+		finished = itertools.imap(manifest_worker, work)
+	failed = len(results)
+	try:
+		for result in itertools.chain(results, finished):
+			failed += result['status'] == 'failed'
+			sys.stdout.write(json.dumps(result, sort_keys=True) + '\n')
+			sys.stdout.flush()
+		if pool:
+			pool.close()
+	except KeyboardInterrupt:
+		if pool:
+			pool.terminate()
+		raise
+	finally:
+		if pool:
+			pool.join()
+	print >>sys.stderr, '\nRan %d jobs (%d failed) in %.2f seconds.' % (len(work) + len(results), failed, time.time() - start)
+	return failed > 0
+
+# Local conversion server. Each request is read and answered on its own thread, and
+# the conversion itself is handed to a pool of processes, so long conversions run in
+# parallel and don't hold up requests that are still being read or written.
+SERVE_HOST = '127.0.0.1'
+SERVE_PORT = 8765
+SERVE_QUEUE_PER_JOB = 4 # conversions allowed to wait per process when --queue isn't given
+
+# Threaded HTTP server holding the pool that conversions run in and the counts that
+# GET /status reports
+class ConversionServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+	daemon_threads = True
+
+	def __init__(self, address, pool, jobs, queue):
+		BaseHTTPServer.HTTPServer.__init__(self, address, ConversionHandler)
+		self.pool = pool
+		self.jobs = jobs
+		self.queue = queue
+		self.lock = threading.Lock()
+		self.pending = 0 # conversions running or waiting for a process
+		self.stats = {'served': 0, 'failed': 0, 'rejected': 0, 'total_ms': 0.0, 'max_ms': 0.0}
+
+	# Claim a place for a conversion, unless too many are already waiting
+	# Parameters: (none)
+	# Returns:
+	#	int, is the number of conversions pending including this one, or 0 if it was turned away
+	def claim(self):
+		self.lock.acquire()
 		try:
-			dec_to_ascii(src, dst, src_text)
-		except ValueError:
-			print '\n***ERROR: \'%s\' may contain invalid decimal data.\n       Only 0-9 allowed.' % (src_text)
-	elif from_what == 'ascii' and to_what == 'hex': # convert ascii to hex
+			if self.pending >= self.queue:
+				self.stats['rejected'] += 1
+				return 0
+			self.pending += 1
+			return self.pending
+		finally:
+			self.lock.release()
+
+	# Give back a conversion's place and record how long it took
+	# Parameters:
+	#	ok - boolean, is whether the conversion succeeded
+	#	ms - float, is the milliseconds the request took
+	#	claimed - boolean, False if the request never claimed a place (e.g. a cached result)
+	# Returns: (none)
+	def release(self, ok, ms, claimed=True):
+		self.lock.acquire()
 		try:
-			ascii_to_hex(src, dst, src_text)
-		except ValueError:
-			print '\n***ERROR: \'%s\' may contain invalid ascii data.' % (src_text)
-	elif from_what == 'ascii' and to_what == 'dec': # convert ascii to decimal
+			if claimed:
+				self.pending -= 1
+			self.stats['served' if ok else 'failed'] += 1
+			self.stats['total_ms'] += ms
+			self.stats['max_ms'] = max(self.stats['max_ms'], ms)
+		finally:
+			self.lock.release()
+
+	# Describe how busy the server is
+	# Parameters: (none)
+	# Returns:
+	#	dictionary, is the pool size, queue limit, pending conversions, and request counts
+	def status(self):
+		self.lock.acquire()
 		try:
-			ascii_to_dec(src, dst, src_text)
-		except ValueError:
-			print '\n***ERROR: \'%s\' may contain invalid ascii data.' % (src_text)
-	elif from_what == 'ascii' and to_what == 'bin': # convert ascii to binary
+			status = dict(self.stats)
+			status.update(jobs=self.jobs, queue=self.queue, pending=self.pending)
+		finally:
+			self.lock.release()
+		finished = status['served'] + status['failed']
+		status['mean_ms'] = round(status.pop('total_ms') / finished, 3) if finished else 0.0
+		status['max_ms'] = round(status['max_ms'], 3)
+		status['cache'] = cache_stats()
+		return status
+
+# Request handler for the conversion server
+#	POST /translate?from=fmt&to=fmt[&spaces=no] - body is the data, reply is the converted data
+#	GET /status - reply is the server's load and latency as JSON
+# Every reply carries X-Queue-Depth (conversions pending) and conversions carry
+# X-Latency-Ms (time spent on the request).
+class ConversionHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+	protocol_version = 'HTTP/1.1' # keep connections open between requests
+	server_version = 'DataFormatTranslator'
+	latency = '-' # milliseconds the current conversion took, for the log
+	reasons = {422: 'Unprocessable Entity'} # statuses BaseHTTPRequestHandler.responses has no reason for
+
+	def do_GET(self):
+		if urlparse.urlparse(self.path).path <> '/status':
+			self.reply(404, 'Not found. Use POST /translate or GET /status.')
+			return
+		self.reply(200, json.dumps(self.server.status(), sort_keys=True), 'application/json')
+
+	def do_POST(self):
+		start = time.time()
+		url = urlparse.urlparse(self.path)
+		if url.path <> '/translate':
+			self.reply(404, 'Not found. Use POST /translate or GET /status.')
+			return
+		try:
+			length = int(self.headers.getheader('Content-Length'))
+		except (TypeError, ValueError):
+			self.reply(411, 'Content-Length is required.')
+			return
+		data = self.rfile.read(length)
+		query = dict(urlparse.parse_qsl(url.query))
+		from_fmt = query.get('from', '').lower()
+		to_fmt = query.get('to', '').lower()
+		keep_spaces = not re.search('N|0', query.get('spaces', 'yes').upper())
+
+		# send back a result converted before without waiting for the pool
+		key = None
+		if CACHE_LIMITS['entries']:
+			key = cache_key(data, from_fmt, to_fmt, keep_spaces)
+			text = cache_get(key)
+			if text is not None:
+				ms = (time.time() - start) * 1000
+				self.server.release(True, ms, False)
+				self.latency = '%.3f' % (ms)
+				self.reply(200, text, headers={'X-Latency-Ms': self.latency, 'X-Cache': 'hit'})
+				return
+
+		# turn the request away rather than let conversions pile up
+		if not self.server.claim():
+			self.reply(503, 'Server busy, try again shortly.', headers={'Retry-After': '1'})
+			return
+		ok = False
+		try:
+			try:
+				text = self.server.pool.apply_async(translate_text, (data, from_fmt, to_fmt, keep_spaces)).get()
+				code = 200
+				ok = True
+				if key:
+					cache_put(key, text)
+			except UnsupportedConversionError, e:
+				text, code = str(e).strip().lstrip('*'), 400
+			except ConversionError, e:
+				text, code = str(e).strip().lstrip('*'), 422
+			except Exception, e:
+				text, code = 'Conversion failed: %s' % (e), 500
+		finally:
+			ms = (time.time() - start) * 1000
+			self.server.release(ok, ms)
+		self.latency = '%.3f' % (ms)
+		self.reply(code, text, headers={'X-Latency-Ms': self.latency})
+
+	# Send a reply with the load the server is under
+	# Parameters:
+	#	code - int, is the HTTP status
+	#	text - string, is the body
+	#	content_type - string, is the body's type
+	#	headers - dictionary, is any further headers
+	# Returns: (none)
+	def reply(self, code, text, content_type='text/plain', headers={}):
+		self.send_response(code, self.reasons.get(code))
+		self.send_header('Content-Type', content_type)
+		self.send_header('Content-Length', str(len(text)))
+		self.send_header('Access-Control-Allow-Origin', '*') # so the Run page can call it
+		self.send_header('X-Queue-Depth', str(self.server.pending))
+		for name, value in headers.items():
+			self.send_header(name, value)
+		self.end_headers()
+		self.wfile.write(text)
+
+	# Log each request with its status, latency, and the conversions pending
+	def log_request(self, code='-', size='-'):
+		self.log_message('"%s" %s %s ms, %d pending', self.requestline, code, self.latency, self.server.pending)
+
+# Run the conversion server until it's stopped with Ctrl+C
+# Parameters:
+#	options - dictionary, is the options given with --serve
+# Returns:
+#	boolean, True if the server couldn't be started
+def serve(options):
+	try:
+		port = int(options.get('serve') or SERVE_PORT)
+		jobs = int(options.get('jobs') or multiprocessing.cpu_count())
+		queue = int(options.get('queue') or jobs * SERVE_QUEUE_PER_JOB)
+		if jobs < 1 or queue < 1:
+			raise ValueError
+	except ValueError:
+		print '\n***ERROR: Invalid server option. The port, --jobs, and --queue must be positive numbers.'
+		return True
+
+	if 'cache' in options:
 		try:
-			ascii_to_bin(src, dst, src_text)
+			set_cache(int(options['cache'] or CACHE_DEFAULT_ENTRIES))
 		except ValueError:
-			print '\n***ERROR: \'%s\' may contain invalid ascii data.' % (src_text)
-	else: # no valid conversion method was given, print error
-		print '\n***ERROR: Invalid conversion method entered.'
+			print '\n***ERROR: Invalid cache size \'%s\'. Enter the number of results to keep.' % (options['cache'])
+			return True
+
+	pool = multiprocessing.Pool(jobs)
+	try:
+		server = ConversionServer((SERVE_HOST, port), pool, jobs, queue)
+	except socket.error, e:
+		pool.terminate()
+		print '\n***ERROR: Couldn\'t listen on port %d: %s' % (port, e)
+		return True
+	print '\nServing conversions on http://%s:%d/ with %d processes (queue %d, cache %d). Press Ctrl+C to stop.' % (SERVE_HOST, port, jobs, queue, CACHE_LIMITS['entries'])
+	try:
+		server.serve_forever()
+	except KeyboardInterrupt:
+		print '\nStopping server.'
+	server.server_close()
+	pool.terminate()
+	pool.join()
+	return False
+
+# Instrumentation of each conversion, off until enable_metrics gives it somewhere to
+# send what it records. While a conversion runs, METRICS holds its record:
+#	seconds - dictionary, is the time spent in each stage of the conversion:
+#	          read, detect (and hexlify), tokenize, convert, format, and write
+#	bytes_in, bytes_out - int, are the characters read and written (or returned)
+#	words - int, is the number of words tokenized
+#	skipped - int, is the number of invalid words skipped
+# 'convert' is the time left over once the other stages are taken out. Each stage
+# checks METRICS before timing anything, so turned off it costs nothing.
+METRICS = None
+METRICS_SINK = None
+METRICS_STAGES = ('read', 'detect', 'tokenize', 'convert', 'format', 'write')
+
+# Turn conversion metrics on or off
+# Parameters:
+#	sink - string, is a file to add a line of JSON to for each conversion, or a
+#	       function that's called with each conversion's record (None turns metrics off)
+# Returns: (none)
+def enable_metrics(sink):
+	global METRICS_SINK
+	METRICS_SINK = sink
+
+# Start recording a conversion
+# Parameters:
+#	from_what - string, is the original data format
+#	to_what - string, is the format to convert to
+#	src - string, represents the source (0 for data in memory)
+#	dst - string, represents the destination
+# Returns: (none)
+def metrics_begin(from_what, to_what, src=0, dst='--tmp'):
+	global METRICS
+	METRICS = {
+		'from': from_what, 'to': to_what, 'src': src, 'dst': dst, 'start': time.time(),
+		'seconds': dict((stage, 0.0) for stage in METRICS_STAGES),
+		'bytes_in': 0, 'bytes_out': 0, 'words': 0, 'skipped': 0,
+	}
+
+# Add time to a stage of the conversion being recorded
+# Parameters:
+#	stage - string, is the stage (see METRICS_STAGES)
+#	start - float, is the time the stage started
+# Returns: (none)
+def metrics_time(stage, start):
+	METRICS['seconds'][stage] += time.time() - start
+
+# Count something in the conversion being recorded, if metrics are on
+# Parameters:
+#	name - string, is what to count (e.g. 'skipped')
+#	count - int, is how many to add
+# Returns: (none)
+def metrics_count(name, count=1):
+	if METRICS is not None:
+		METRICS[name] += count
+
+# Finish recording a conversion and send its record to the sink
+# Parameters: (none)
+# Returns: (none)
+def metrics_end():
+	global METRICS
+	record, METRICS = METRICS, None
+	seconds = record['seconds']
+	record['total'] = time.time() - record.pop('start')
+	seconds['convert'] = max(record['total'] - sum(seconds.values()), 0.0)
+	if callable(METRICS_SINK):
+		METRICS_SINK(record)
+		return
+	# one write to a file opened for appending, so batch processes don't mix their lines
+	line = json.dumps(record, sort_keys=True) + '\n'
+	try:
+		fd = os.open(METRICS_SINK, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0666)
+		try:
+			os.write(fd, line)
+		finally:
+			os.close(fd)
+	except OSError, e:
+		print '\n***ERROR: Couldn\'t write metrics to %s: %s' % (METRICS_SINK, e.strerror)
+
+# Compressed files are read and written through their compression as they're converted,
+# so they never have to be decompressed to disk first. Sources are recognised by their
+# extension or the bytes they start with, and destinations by their extension.
+#	COMPRESSIONS - maps each extension to the function that opens a file of it ('rb' or 'wb'),
+#	               or None if the module it needs isn't installed
+#	COMPRESSION_MAGIC - maps the bytes each compressed file starts with to its extension
+COMPRESSIONS = {
+	'.gz': lambda name, mode: gzip.GzipFile(name, mode, 6), # the default, 9, is much slower for little gain
+	'.bz2': bz2.BZ2File,
+	'.xz': lzma and (lambda name, mode: lzma.LZMAFile(name, mode)),
+}
+COMPRESSION_MAGIC = {'\x1f\x8b': '.gz', 'BZh': '.bz2', '\xfd7zXZ\x00': '.xz'}
+
+# Compressed data that isn't in a file (from a pipe, or given to translate) is decompressed
+# a block at a time as it's read (see decompress_blocks).
+#	DECOMPRESSORS - maps each extension to the function that makes a decompressor of one
+#	                compressed stream, or None if the module it needs isn't installed
+#	DECOMPRESS_ERRORS - are the errors raised by decompressors for damaged data
+DECOMPRESSORS = {
+	'.gz': lambda: zlib.decompressobj(16 + zlib.MAX_WBITS), # 16 + reads the gzip header and trailer
+	'.bz2': bz2.BZ2Decompressor,
+	'.xz': lzma and lzma.LZMADecompressor,
+}
+DECOMPRESS_ERRORS = (zlib.error, IOError) + ((lzma.LZMAError,) if lzma else ())
+
+# Find the compression of data by the bytes it starts with
+# Parameters:
+#	start - string, is the start of the data
+# Returns:
+#	string, is the compression's extension (see COMPRESSIONS), or None if it isn't compressed
+def sniff_compression(start):
+	for magic, extension in COMPRESSION_MAGIC.iteritems():
+		if start.startswith(magic):
+			return extension
+	return None
+
+# Find the compression of a file
+# Parameters:
+#	name - string, represents the file
+#	sniff - boolean, True to also check the bytes the file starts with (for sources)
+# Returns:
+#	string, is the compression's extension (see COMPRESSIONS), or None if it isn't compressed
+def compression_of(name, sniff=False):
+	if not name or name == '-' or name == '--s' or name == '--tmp':
+		return None
+	extension = os.path.splitext(name)[1].lower()
+	if extension in COMPRESSIONS:
+		return extension
+	if sniff and os.path.isfile(name):
+		src_file = open(name, 'rb')
+		try:
+			return sniff_compression(src_file.read(max(map(len, COMPRESSION_MAGIC))))
+		finally:
+			src_file.close()
+	return None
+
+# Remove a compressed file's extension from its name (e.g. 'data.txt.gz' -> 'data.txt')
+# Parameters:
+#	name - string, represents the file
+# Returns:
+#	string, is the name of the file it holds compressed
+def strip_compression(name):
+	base, extension = os.path.splitext(name)
+	if extension.lower() in COMPRESSIONS:
+		return base
+	return name
+
+# Check that a compressed file can be opened, i.e. that the module it needs is installed
+# Parameters:
+#	name - string, represents the file
+#	sniff - boolean, True to also check the bytes the file starts with (for sources)
+# Returns:
+#	string, is the error shown if it can't be, otherwise ''
+def compression_error(name, sniff=False):
+	compression = compression_of(name, sniff)
+	if compression and not COMPRESSIONS[compression]:
+		return '\n***ERROR: Can\'t open %s without the lzma module (install backports.lzma).' % (name)
+	return ''
+
+# Decompress a stream of blocks of data if it's compressed, which is known from the bytes
+# the first block starts with (see COMPRESSION_MAGIC). Compressed streams written one
+# after another (as by 'cat a.gz b.gz') are decompressed one after another. Decompressed
+# blocks are at least STREAM_MIN_BLOCK_SIZE characters, but for the last, so checks made
+# on the start of the data see as much as they need.
+# Parameters:
+#	blocks - iterable of strings, is the data in the order it was read
+# Returns:
+#	block - string, yielded for each block of the data, decompressed if it was compressed
+# Raises:
+#	InvalidDataError - if the compressed data is damaged, or can't be decompressed here
+def decompress_blocks(blocks):
+	blocks = iter(blocks)
+	first = next(blocks, '')
+	compression = sniff_compression(first)
+	if not compression:
+		if first:
+			yield first
+		for block in blocks:
+			yield block
+		return
+	if not DECOMPRESSORS[compression]:
+		raise InvalidDataError('\n***ERROR: Can\'t read %s data without the lzma module (install backports.lzma).' % (compression[1:]))
+
+	decompressor = DECOMPRESSORS[compression]()
+	held = ''
+	try:
+		for block in itertools.chain([first], blocks):
+			while block:
+				try:
+					held += decompressor.decompress(block)
+				except EOFError: # the stream ended with the last block, so another starts with this one
+					decompressor = DECOMPRESSORS[compression]()
+					continue
+				# data after the end of a stream starts the next one
+				block = decompressor.unused_data
+				if block:
+					decompressor = DECOMPRESSORS[compression]()
+			if len(held) >= STREAM_MIN_BLOCK_SIZE:
+				yield held
+				held = ''
+	except DECOMPRESS_ERRORS:
+		raise InvalidDataError('\n***ERROR: Compressed %s data is damaged.' % (compression[1:]))
+	if held:
+		yield held
+
+# Reads compressed text the way a file opened in universal newline mode reads text, with
+# '\r\n' and '\r' read as '\n'
+class NewlineReader(object):
+	def __init__(self, src_file):
+		self.src_file = src_file
+		self.held = '' # a character read ahead to see if a '\r' ended a line on its own
+
+	def read(self, size=-1):
+		text = self.held + self.src_file.read(size)
+		self.held = ''
+		if text[-1:] == '\r':
+			self.held = self.src_file.read(1)
+			if self.held == '\n':
+				text += self.held
+				self.held = ''
+		return text.replace('\r\n', '\n').replace('\r', '\n')
+
+	def close(self):
+		self.src_file.close()
+
+# Open a source file for reading, decompressing it if it's compressed
+# Parameters:
+#	src - string, represents the source file
+#	text - boolean, True to read newlines as a file opened in universal newline mode
+#	       does, False to read the bytes exactly as they are
+# Returns:
+#	file, is the open source
+def open_source(src, text=True):
+	compression = compression_of(src, True)
+	if not compression:
+		return open(src, 'rU' if text else 'rb')
+	if not COMPRESSIONS[compression]:
+		raise IOError(compression_error(src, True))
+	src_file = COMPRESSIONS[compression](src, 'rb')
+	if text:
+		return NewlineReader(src_file)
+	return src_file
+
+# Open a destination file for writing, compressing it if its name ends with a
+# compression's extension
+# Parameters:
+#	dst - string, represents the destination file
+#	binary - boolean, True to write bytes rather than text
+#	compression - string, is the compression to use, if not the one dst's name gives
+# Returns:
+#	file, is the open destination
+def open_output(dst, binary=False, compression=None):
+	compression = compression or compression_of(dst)
+	if not compression:
+		return open(dst, 'wb' if binary else 'w')
+	if not COMPRESSIONS[compression]:
+		raise IOError(compression_error(dst))
+	return COMPRESSIONS[compression](dst, 'wb')
+
+# Packed binary files hold binary data as the bytes themselves rather than as '0' and '1'
+# characters, so they're about a ninth of the size. A packed file starts with PACKED_HEADER
+# (PACKED_MAGIC, the number of bits, and the number of runs of words), then a PACKED_RUN
+# (the width in bits of the words and how many of them there are) for each run of words of
+# the same width, so the spacing of the text is kept, and then the bits, padded at the
+# front with zeros to whole bytes. Destinations ending with PACKED_SUFFIX are written packed
+# (see write_output), and binary sources are read packed whatever their name (see read_source).
+PACKED_MAGIC = '\x89BN1'
+PACKED_HEADER = struct.Struct('<4sQI')
+PACKED_RUN = struct.Struct('<IQ')
+PACKED_SUFFIX = '.bin'
+
+# Check if a conversion writes binary data, so it can be written packed
+# Parameters:
+#	from_what - string, is the original data format
+#	to_what - string, is the format to convert to
+# Returns:
+#	boolean, True if the converted data is binary
+def writes_bits(from_what, to_what):
+	return to_what == 'bin' or (from_what == 'bin' and to_what == 'inv')
+
+# Check if a destination is written as packed binary, by its name
+# Parameters:
+#	dst - string, represents the destination file
+# Returns:
+#	boolean, True if its name (less any compression's extension) ends with PACKED_SUFFIX
+def packs_to(dst):
+	return strip_compression(dst).endswith(PACKED_SUFFIX)
+
+# Pack binary text (see PACKED_MAGIC)
+# Parameters:
+#	text - string, is the binary text, '0's and '1's with words separated by spaces
+# Returns:
+#	string, is the packed data
+def pack_bin(text):
+	if text.translate(None, '01 '):
+		raise InvalidDataError('\n***ERROR: Only binary data can be written to a packed binary file.')
+	if is_spaced(text, 8): # the usual spacing of binary, a space between bytes
+		runs = [(8, (len(text) + 1) // 9)]
+	elif ' ' not in text:
+		runs = [(len(text), 1)]
+	else:
+		runs = [(width, len(list(group))) for width, group in itertools.groupby(map(len, text.split(' ')))]
+	bits = text.replace(' ', '')
+	header = PACKED_HEADER.pack(PACKED_MAGIC, len(bits), len(runs)) + ''.join(PACKED_RUN.pack(*run) for run in runs)
+	return header + bin_to_bytes('0' * (-len(bits) % 8) + bits)
+
+# Unpack packed binary data back into the text it was packed from
+# Parameters:
+#	data - string, is the packed data
+# Returns:
+#	string, is the binary text
+def unpack_bin(data):
+	try:
+		magic, bit_count, run_count = PACKED_HEADER.unpack_from(data)
+		start = PACKED_HEADER.size + PACKED_RUN.size * run_count
+		runs = [PACKED_RUN.unpack_from(data, PACKED_HEADER.size + PACKED_RUN.size * i) for i in xrange(run_count)]
+	except struct.error:
+		runs = None
+	if not runs or magic <> PACKED_MAGIC or len(data) - start <> (bit_count + 7) // 8 \
+			or sum(width * count for width, count in runs) <> bit_count:
+		raise InvalidDataError('\n***ERROR: Packed binary data is cut short or damaged.')
+	if runs == [(8, len(data) - start)]:
+		return bytes_to_bin(data[start:])
+	bits = bytes_to_bin(data[start:], '')[-bit_count:] if bit_count else ''
+
+	# a run of many short words is written a column of the words at a time, and a run of a
+	# few long words (e.g. one unspaced word) a word at a time, so neither takes a slice
+	# for every bit
+	texts = []
+	pos = 0
+	for width, count in runs:
+		if count == 1:
+			texts.append(bits[pos:pos + width])
+		elif width and width <= count:
+			texts.append(interleave([bits[pos + k:pos + width * count:width] for k in xrange(width)]))
+		elif width:
+			texts.append(' '.join(bits[pos + width * i:pos + width * (i + 1)] for i in xrange(count)))
+		else: # empty words, from consecutive spaces
+			texts.append(' ' * (count - 1))
+		pos += width * count
+	return ' '.join(texts)
+
+# Check if a source file is packed binary, without reading it
+# Parameters:
+#	src - string, represents the source file
+# Returns:
+#	boolean, True if the file is packed
+def is_packed(src):
+	try:
+		src_file = open_source(src, False)
+	except IOError:
+		return False
+	try:
+		return src_file.read(len(PACKED_MAGIC)) == PACKED_MAGIC
+	finally:
+		src_file.close()
+
+# Read a whole source file, recording the time and size if metrics are on. Binary sources
+# that are packed are unpacked (see PACKED_MAGIC).
+# Parameters:
+#	src - string, represents the source file
+#	from_what - string, is the format of the source
+# Returns:
+#	string, is the text of the file
+def read_source(src, from_what=None):
+	if METRICS is not None:
+		start = time.time()
+	# packed data isn't text, so a binary source's newlines are only translated once
+	# it's known not to be packed
+	src_file = open_source(src, from_what <> 'bin')
+	try:
+		src_text = src_file.read()
+	finally:
+		src_file.close()
+	if from_what == 'bin' and src_text[:len(PACKED_MAGIC)] == PACKED_MAGIC:
+		src_text = unpack_bin(src_text)
+	elif from_what == 'bin':
+		src_text = src_text.replace('\r\n', '\n').replace('\r', '\n')
+	if METRICS is not None:
+		metrics_time('read', start)
+		METRICS['bytes_in'] += len(src_text)
+	return src_text
+
+# Write converted text to a file, recording the time and size if metrics are on. Binary
+# text is packed if the file's name ends with PACKED_SUFFIX.
+# Parameters:
+#	dst - string, represents the destination file
+#	text - string, is the converted text
+# Returns: (none)
+def write_output(dst, text):
+	if METRICS is not None:
+		start = time.time()
+	if packs_to(dst):
+		text = pack_bin(text)
+		f = open_output(dst, True)
+	else:
+		f = open_output(dst)
+	f.write(text)
+	f.close()
+	if METRICS is not None:
+		metrics_time('write', start)
+		METRICS['bytes_out'] += len(text)
+
+# Join converted words into text, recording the time if metrics are on
+# Parameters:
+#	words - list of strings, is the converted words
+#	sep - string, is written between the words
+# Returns:
+#	string, is the joined text
+def join_words(words, sep=' '):
+	if METRICS is None:
+		return sep.join(words)
+	start = time.time()
+	text = sep.join(words)
+	metrics_time('format', start)
+	return text
+
+# Hexlify source text, recording the time if metrics are on
+# Parameters:
+#	src_text - string, is the text to hexlify
+# Returns:
+#	string, is the text as hex
+def hexlify_text(src_text):
+	if METRICS is None:
+		return binascii.hexlify(src_text)
+	start = time.time()
+	hex_text = binascii.hexlify(src_text)
+	metrics_time('detect', start)
+	return hex_text
+
+# Generate blocks read from a source, recording the time taken to read each one and
+# their sizes
+# Parameters:
+#	blocks - iterator, is the blocks to generate
+# Returns:
+#	block - string, yielded for each block
+def metered_blocks(blocks):
+	while True:
+		start = time.time()
+		block = next(blocks, '')
+		metrics_time('read', start)
+		if not block:
+			return
+		METRICS['bytes_in'] += len(block)
+		yield block
+
+# Generate words from a tokenizer, recording the time taken to find each one and
+# counting them
+# Parameters:
+#	words - iterator, is the words to generate
+# Returns:
+#	word - string, yielded for each word
+def metered_words(words):
+	words = iter(words)
+	while True:
+		start = time.time()
+		try:
+			word = next(words)
+		except StopIteration:
+			metrics_time('tokenize', start)
+			return
+		metrics_time('tokenize', start)
+		METRICS['words'] += 1
+		yield word
+
+# Generate the offsets of each space-delimited 'word' in the source text. Words are
+# found by scanning forward from an offset instead of slicing the rest of the text
+# off after every word, so tokenizing takes time linear in the length of the input.
+# Spacing is treated exactly as the original character loops treated it: only ' '
+# delimits words, consecutive spaces produce empty words, and scanning stops as
+# soon as nothing but whitespace is left in the text.
+# Parameters:
+#	src_text - string, is the data to split into words
+#	width - int, if given, words longer than this are further split into pieces of
+#	        at most width characters (e.g. 8 for binary bytes)
+#	final - boolean, False if a space and more data follow src_text, in which case
+#	        every word is read, including trailing whitespace and an empty last word
+# Returns:
+#	(start, stop) - tuple, yielded for each word so that src_text[start:stop] is the word
+def iter_word_spans(src_text, width=0, final=True):
+	if final:
+		end = len(src_text.rstrip()) # nothing is read once only whitespace remains
+	else:
+		end = len(src_text) + 1
+	start = 0
+	while start < end:
+		stop = src_text.find(' ', start)
+		if stop < 0:
+			stop = len(src_text)
+		while width and stop - start > width:
+			yield start, start + width
+			start += width
+			if start >= end:
+				return
+		yield start, stop
+		start = stop + 1
+
+# Generate each space-delimited 'word' in the source text (see iter_word_spans)
+# Parameters:
+#	src_text - string, is the data to split into words
+#	final - boolean, False if more data follows src_text
+# Returns:
+#	iterator of strings, is each word in order (timed and counted if metrics are on)
+def iter_words(src_text, final=True):
+	words = (src_text[start:stop] for start, stop in iter_word_spans(src_text, 0, final))
+	if METRICS is not None:
+		return metered_words(words)
+	return words
+
+# Size of each window of a source that's sampled to detect its format, and the number of
+# windows, spread evenly from the start to the end of the source. Detection only ever looks
+# at this much of a source, however large it is.
+DETECT_WINDOW = 512
+DETECT_WINDOWS = 8
+
+# Characters each text format is written with, from the most specific format to the least.
+# A sample is in the first format that at least DETECT_MIN_SHARE of its characters fit.
+DETECT_ALPHABETS = (
+	('bin', '01'),
+	('dec', string.digits),
+	('hex', string.hexdigits),
+	('ascii', ''.join(map(chr, xrange(32, 127)))),
+)
+DETECT_MIN_SHARE = 0.95
+
+# Find where the windows sampled from a source start. Sources no longer than all the
+# windows together are sampled whole instead.
+# Parameters:
+#	length - int, is the length of the source
+# Returns:
+#	list of ints, is the offset of each window
+def sample_offsets(length):
+	last = length - DETECT_WINDOW
+	return [last * i // (DETECT_WINDOWS - 1) for i in xrange(DETECT_WINDOWS)]
+
+# Sample the windows of source text
+# Parameters:
+#	src_text - string, is the source text
+# Returns:
+#	string, is the sampled text
+def sample_text(src_text):
+	if len(src_text) <= DETECT_WINDOW * DETECT_WINDOWS:
+		return src_text
+	return ''.join([src_text[offset:offset + DETECT_WINDOW] for offset in sample_offsets(len(src_text))])
+
+# Sample the windows of a source file without reading the rest of it
+# Parameters:
+#	src - string, represents the source file
+# Returns:
+#	string, is the sampled text
+def sample_file(src):
+	src_file = open_source(src)
+	size = os.path.getsize(src)
+	if compression_of(src, True): # compressed sources can't be sought in, so only their start is sampled
+		sample = src_file.read(DETECT_WINDOW * DETECT_WINDOWS)
+	elif size <= DETECT_WINDOW * DETECT_WINDOWS:
+		sample = src_file.read()
+	else:
+		windows = []
+		for offset in sample_offsets(size):
+			src_file.seek(offset)
+			windows.append(src_file.read(DETECT_WINDOW))
+		sample = ''.join(windows)
+	src_file.close()
+	return sample
+
+# Classify sampled text as 'bin', 'dec', 'hex', 'ascii', or 'raw' data. Whitespace and
+# '0x'/'0b' prefixes are ignored.
+# Parameters:
+#	sample - string, is the sampled text
+# Returns:
+#	tuple, is the format (None if there's nothing but whitespace) and the confidence in it,
+#	from 0 to 1: the share of sampled characters that fit the format ('raw' data's
+#	confidence is the share that aren't printable ascii)
+def classify_sample(sample):
+	if isinstance(sample, unicode):
+		sample = sample.encode('utf-8')
+	sample = sample.replace('0x', '').replace('0b', '').translate(None, string.whitespace)
+	if not sample:
+		return None, 0.0
+	for name, alphabet in DETECT_ALPHABETS:
+		share = float(len(sample) - len(sample.translate(None, alphabet))) / len(sample)
+		if share >= DETECT_MIN_SHARE:
+			return name, share
+	return 'raw', 1.0 - share
+
+# Detect the format of source text from a bounded sample of it (see classify_sample)
+# Parameters:
+#	src_text - string, is the source text
+# Returns:
+#	tuple, is the format and the confidence in it
+def detect_format(src_text):
+	return classify_sample(sample_text(src_text))
+
+# Check whether the text of a source file given as hex is really raw data that should be
+# hexlified before converting it. Text that's just not valid hex (e.g. ascii) isn't raw,
+# so it's left for the conversion to report as invalid.
+# Parameters:
+#	src_text - string, is the source text to check
+# Returns:
+#	boolean, True if the source text needs to be hexlified before converting
+def needs_hexlify(src_text):
+	if METRICS is None:
+		return detect_format(src_text)[0] == 'raw'
+	start = time.time()
+	hexlify = detect_format(src_text)[0] == 'raw'
+	metrics_time('detect', start)
+	return hexlify
+
+# Make sure source text is actually in hex format before converting it as hex.
+# Strings coming from user input are just strings that can be converted. Strings
+# coming from a .INO record have formatting to represent them as hex.
+# If the data is coming from a record (i.e. src <> 0), hexlifying the text
+# will remove the formatting and leave a straight hex string to convert.
+# Parameters:
+#	src - string, represents source file the text came from (0 for user input)
+#	src_text - string, is the source data
+# Returns:
+#	string, is the source data as hex
+def as_hex_text(src, src_text):
+	if src <> 0 and not re.search('.txt', src):
+		return hexlify_text(src_text)
+	# Data given directly is converted as hex, or fails as invalid hex
+	if src == 0:
+		return src_text
+	# If source file is .txt, we don't know what format the data is in.
+	# This will convert it to hex if it's raw data.
+	if needs_hexlify(src_text):
+		return hexlify_text(src_text)
+	return src_text
+
+# Build text from columns of characters, taking one character from each column in turn
+# and writing sep after each group but the last. The output is filled into a bytearray of
+# its exact length by slice assignment, so nothing is built up a character at a time.
+# e.g. interleave(['ac', 'bd']) -> 'ab cd'
+# Parameters:
+#	columns - list of strings, is the columns, all the same length
+#	sep - string, is '' or a single character to write between groups
+# Returns:
+#	string, is the interleaved text
+def interleave(columns, sep=' '):
+	count = len(columns[0])
+	if not count:
+		return ''
+	step = len(columns) + len(sep)
+	out = bytearray(count * step - len(sep))
+	if sep:
+		out[len(columns)::step] = sep * (count - 1)
+	for k, column in enumerate(columns):
+		out[k::step] = column
+	return str(out)
+
+# Write bytes as uppercase hex, two digits a byte (e.g. 'O\x01' -> '4F 01')
+# Parameters:
+#	data - string, is the bytes to write
+#	sep - string, is written between bytes
+# Returns:
+#	string, is the hex text
+def bytes_to_hex(data, sep=' '):
+	return interleave([data.translate(table) for table in HEX_COLUMNS], sep)
+
+# Write bytes as binary, eight bits a byte (e.g. 'O' -> '01001111')
+# Parameters:
+#	data - string, is the bytes to write
+#	sep - string, is written between bytes
+# Returns:
+#	string, is the binary text
+def bytes_to_bin(data, sep=' '):
+	return interleave([data.translate(table) for table in BIN_COLUMNS], sep)
+
+# Read binary digits as bytes, eight bits a byte. Python reads and writes numbers in
+# binary and hex in time linear in their length, so the bits are read as one number and
+# written back out as hex to be unhexlified.
+# Parameters:
+#	bits - string, is '0's and '1's, a multiple of 8 of them
+# Returns:
+#	string, is the bytes
+def bin_to_bytes(bits):
+	if not bits:
+		return ''
+	return binascii.unhexlify('%0*x' % (len(bits) // 4, int(bits, 2)))
+
+# Check if text is words of exactly the same width separated by single spaces (the way
+# bytes are usually written), which can be converted all at once
+# Parameters:
+#	text - string, is the text to check
+#	width - int, is the width of each word
+# Returns:
+#	boolean, True if the text is evenly spaced words of that width
+def is_spaced(text, width):
+	count = (len(text) + 1) // (width + 1)
+	return count > 0 and len(text) == count * (width + 1) - 1 and text.count(' ') == count - 1 \
+		and text[width::width + 1] == ' ' * (count - 1)
+
+# Divide a number of up to 2n bits by an n-bit number by splitting it into halves, so
+# that large divisions are done with multiplication (Burnikel-Ziegler division).
+# Parameters:
+#	a - int, is the number to divide, with a < 2**n * b
+#	b - int, is the divisor, with 2**(n-1) <= b < 2**n
+#	n - int, is the number of bits in b
+# Returns:
+#	tuple, is the quotient and remainder
+def big_div_2n1n(a, b, n):
+	if a.bit_length() - n <= BIG_DIV_BITS:
+		return divmod(a, b)
+	pad = n & 1
+	if pad:
+		a <<= 1
+		b <<= 1
+		n += 1
+	half_n = n >> 1
+	mask = (1 << half_n) - 1
+	b1, b2 = b >> half_n, b & mask
+	q1, r = big_div_3n2n(a >> n, (a >> half_n) & mask, b, b1, b2, half_n)
+	q2, r = big_div_3n2n(r, a & mask, b, b1, b2, half_n)
+	if pad:
+		r >>= 1
+	return q1 << half_n | q2, r
+
+# Divide the top three halves of a number by the two halves of the divisor, for big_div_2n1n
+# Parameters:
+#	a12 - int, is the top two halves of the number
+#	a3 - int, is the third half of the number
+#	b, b1, b2 - int, are the divisor and its top and bottom halves
+#	n - int, is the number of bits in a half
+# Returns:
+#	tuple, is the quotient and remainder
+def big_div_3n2n(a12, a3, b, b1, b2, n):
+	if a12 >> n == b1:
+		q, r = (1 << n) - 1, a12 - (b1 << n) + b1
+	else:
+		q, r = big_div_2n1n(a12, b1, n)
+	r = (r << n | a3) - q * b2
+	while r < 0:
+		q -= 1
+		r += b
+	return q, r
+
+# Divide any non-negative number by a positive one, a divisor-sized piece at a time
+# Parameters:
+#	a - int, is the number to divide
+#	b - int, is the divisor
+# Returns:
+#	tuple, is the quotient and remainder
+def big_divmod(a, b):
+	n = b.bit_length()
+	if a.bit_length() - n <= BIG_DIV_BITS:
+		return divmod(a, b)
+	mask = (1 << n) - 1
+	q = 0
+	r = 0
+	for shift in xrange((a.bit_length() - 1) // n * n, -1, -n):
+		q_piece, r = big_div_2n1n((r << n) | ((a >> shift) & mask), b, n)
+		q = (q << n) | q_piece
+	return q, r
+
+# Write a number in decimal, the same as str() does. Numbers with many digits are split
+# into halves by dividing by a power of 10, and each half is written on its own.
+# Parameters:
+#	value - int, is the number to write
+# Returns:
+#	string, is the decimal digits
+def big_int_to_dec(value):
+	if value < 0:
+		return '-' + big_int_to_dec(-value)
+	digits = int(value.bit_length() * 0.30103) + 1 # never fewer than the number has
+	if digits < BIG_DEC_DIGITS:
+		return str(value)
+	powers = {}
+	def write(value, digits):
+		if digits < BIG_DEC_DIGITS:
+			return str(value).zfill(digits)
+		low_digits = digits >> 1
+		if low_digits not in powers:
+			powers[low_digits] = 10 ** low_digits
+		high, low = big_divmod(value, powers[low_digits])
+		return write(high, digits - low_digits) + write(low, low_digits)
+	return write(value, digits).lstrip('0') or '0'
+
+# Read a decimal 'word' as a number, the same as int() does. Long words of digits are
+# split into halves, each half is read on its own, and they're combined by multiplying.
+# Parameters:
+#	dec_word - string, is the decimal data to read
+# Returns:
+#	int, is the number
+def big_dec_to_int(dec_word):
+	if len(dec_word) < BIG_DEC_DIGITS or not dec_word.isdigit():
+		return int(dec_word)
+	powers = {}
+	def read(dec_word):
+		if len(dec_word) < BIG_DEC_DIGITS:
+			return int(dec_word)
+		low_digits = len(dec_word) >> 1
+		if low_digits not in powers:
+			powers[low_digits] = 10 ** low_digits
+		return read(dec_word[:-low_digits]) * powers[low_digits] + read(dec_word[-low_digits:])
+	return read(dec_word)
+
+# Convert a long hex 'word' to binary with NumPy, the same way hex_to_bin_text does
+# with int(), i.e. leading zero bytes are dropped and the bits are padded to whole bytes.
+# Parameters:
+#	hex_word - string, is the hex data to convert
+# Returns:
+#	string, is the converted binary data (None if the word isn't all hex digits)
+def numpy_hex_to_bin(hex_word):
+	if not isinstance(hex_word, str):
+		return None
+	if len(hex_word) % 2 <> 0:
+		hex_word = '0' + hex_word
+	try:
+		data = binascii.unhexlify(hex_word)
+	except TypeError:
+		return None
+	data = data.lstrip('\x00') or '\x00'
+	return (numpy.unpackbits(numpy.frombuffer(data, numpy.uint8)) | ord('0')).tostring()
+
+# Convert a long binary 'word' to uppercase hex with NumPy, the same way bin_to_hex_text
+# does with int(), i.e. leading zeros are dropped and the hex is padded to whole bytes.
+# Parameters:
+#	bin_word - string, is the binary data to convert
+# Returns:
+#	string, is the converted hex data (None if the word isn't all 0s and 1s)
+def numpy_bin_to_hex(bin_word):
+	if not isinstance(bin_word, str):
+		return None
+	bits = numpy.frombuffer(bin_word, numpy.uint8) - ord('0')
+	if (bits > 1).any():
+		return None
+	# pad the front so the bits pack into whole bytes
+	bits = numpy.concatenate((numpy.zeros(-len(bits) % 8, numpy.uint8), bits))
+	data = numpy.packbits(bits).tostring().lstrip('\x00') or '\x00'
+	return binascii.hexlify(data).upper()
+
+# Number of bytes of a memory-mapped record converted at a time
+MAP_SLICE_SIZE = 1 << 20
+
+# Generate slices of a memory-mapped file without copying them. Each slice is a buffer
+# onto the mapping, so the file's pages are only read in as each slice is converted.
+# (Python 2 can't make a memoryview of an mmap, but buffer gives the same zero-copy view.)
+# Parameters:
+#	src_map - mmap, is the mapped file
+#	start - int, is the offset in the file to start at
+# Returns:
+#	buffer, yielded for each slice of at most MAP_SLICE_SIZE bytes
+def map_slices(src_map, start=0):
+	for offset in xrange(start, len(src_map), MAP_SLICE_SIZE):
+		yield buffer(src_map, offset, MAP_SLICE_SIZE)
+
+# Convert a memory-mapped record to binary. The record is read as one long hex word, so
+# each byte becomes 8 bits, except that leading zero bytes are dropped the way they are
+# when the whole word is read as one number.
+# Parameters:
+#	src_map - mmap, is the mapped record (or '' for an empty file, which can't be mapped)
+# Returns:
+#	bin_text - string, yielded for each converted slice of the record
+def map_to_bin(src_map):
+	if not len(src_map):
+		return
+	first = re.search('[^\x00]', src_map)
+	if first is None:
+		yield '00000000'
+		return
+	for piece in map_slices(src_map, first.start()):
+		if numpy:
+			yield (numpy.unpackbits(numpy.frombuffer(piece, numpy.uint8)) | ord('0')).tostring()
+		else:
+			# the leading '1' keeps the slice's own leading zero bits in the number
+			yield bin(int('1' + binascii.hexlify(piece), 16))[3:]
+
+# Invert the bits of a memory-mapped record, giving the hex that converting it to binary,
+# inverting, and converting back to hex does. Leading zero bytes are dropped from the
+# record before it's inverted and from the inverted hex afterwards, since each is read
+# as one long number.
+# Parameters:
+#	src_map - mmap, is the mapped record (or '' for an empty file, which can't be mapped)
+# Returns:
+#	hex_text - string, yielded for each inverted slice of the record
+def map_to_inverted_hex(src_map):
+	if not len(src_map):
+		return
+	first = re.search('[^\x00]', src_map)
+	if first is None:
+		yield 'FF'
+		return
+	leading = True # still dropping leading zeros of the inverted hex
+	for piece in map_slices(src_map, first.start()):
+		hex_text = binascii.hexlify(piece).translate(INVERTED_HEX_DIGITS)
+		if leading:
+			hex_text = hex_text.lstrip('0')
+			if not hex_text:
+				continue
+			if len(hex_text) % 2 <> 0:
+				hex_text = '0' + hex_text
+			leading = False
+		yield hex_text
+	if leading: # every inverted byte was zero
+		yield '00'
+
+# Convert a raw record file (e.g. .INO) to binary for hex_to_bin, or invert it for
+# invert_hex. The file is memory mapped and converted a slice at a time, so the record
+# is never loaded into memory as a whole or hexlified in one piece, and when saving to
+# a file each slice is written out as soon as it's converted. The record's bytes are
+# read exactly as they are stored.
+# Parameters:
+#	src - string, represents source file to be converted
+#	dst - string, represents destination to write converted data to
+#	to_what - string, 'bin' to convert to binary or 'inv' to invert to hex
+# Returns:
+#	string, is the converted data (only returns if dst = '--tmp')
+def convert_record(src, dst, to_what):
+	try:
+		src_file = open_source(src, False)
+		if compression_of(src, True): # a compressed record can't be mapped, so it's read whole
+			src_map = src_file.read()
+		elif os.path.getsize(src):
+			src_map = mmap.mmap(src_file.fileno(), 0, access=mmap.ACCESS_READ)
+		else:
+			src_map = ''
+	except EnvironmentError:
+		print '\n***ERROR: Couldn\'t open', src, 'while converting hex to binary.'
+		sys.exit(1)
+
+	if to_what == 'inv':
+		pieces = map_to_inverted_hex(src_map)
+	else:
+		pieces = map_to_bin(src_map)
+	if METRICS is not None:
+		METRICS['bytes_in'] += len(src_map)
+	try:
+		# determine where to write converted data
+		if dst == '--s':
+			print '\n' + ''.join(pieces)
+		elif dst == '--tmp':
+			return ''.join(pieces)
+		elif dst == '-':
+			for text in pieces:
+				sys.stdout.write(text)
+				sys.stdout.flush()
+		elif packs_to(dst): # packed binary is written whole (see pack_bin)
+			print '\n...Writing file...'
+			write_output(dst, ''.join(pieces))
+			print '\nFile ' + dst + ' saved to ' + os.getcwd() + '.'
+		else:
+			print '\n...Writing file...'
+			f = open_output(dst)
+			for text in pieces:
+				if METRICS is not None:
+					start = time.time()
+					METRICS['bytes_out'] += len(text)
+				f.write(text)
+				if METRICS is not None:
+					metrics_time('write', start)
+			f.close()
+			print '\nFile ' + dst + ' saved to ' + os.getcwd() + '.'
+	finally:
+		if isinstance(src_map, mmap.mmap):
+			src_map.close()
+		src_file.close()
+
+# Convert hex 'words' to binary, padding each one out to whole bytes
+# Parameters:
+#	src_text - string, is the hex data to convert
+#	final - boolean, False if more data follows src_text
+# Returns:
+#	bin_text - string, is the converted binary words separated by spaces
+def hex_to_bin_text(src_text, final=True):
+	# whole bytes separated by single spaces are converted all at once
+	if isinstance(src_text, str) and is_spaced(src_text, 2):
+		try:
+			return bytes_to_bin(binascii.unhexlify(src_text.replace(' ', '')))
+		except TypeError:
+			pass # not all hex, so let each word be converted (and fail) on its own
+
+	bin_words = []
+
+	# convert each space-delimited 'word' of the source text
+	for bin_word in iter_words(src_text, final):
+		# convert the 'word' to binary
+		if bin_word: # bin_word will be null if the current character is a space. This only converts if bin_word has data to convert.
+			# long words are converted with NumPy if it's installed
+			if numpy and len(bin_word) >= NUMPY_MIN_SIZE:
+				numpy_word = numpy_hex_to_bin(bin_word)
+				if numpy_word is not None:
+					bin_words.append(numpy_word)
+					continue
+			bin_word = bin(int(bin_word, 16))[2:]
+
+			# make sure binary data is in byte form
+			while len(bin_word) % 8 <> 0:
+				bin_word = '0' + bin_word
+			bin_words.append(bin_word)
+	return join_words(bin_words)
 
 # Convert data from hex to binary. Spaces in input text are retained and used
 # as delimiters between pieces to convert individually.
@@ -220,75 +2610,45 @@ def convert():
 # Returns:
 #	bin_text - string, is the converted binary data (only returns if dst = '--tmp')
 def hex_to_bin(src, dst, src_text):
+	# records are converted straight from a memory map of the file instead of being read in
+	if not src_text and src <> 0 and not re.search('.txt', src):
+		return convert_record(src, dst, 'bin')
+
 	try:
 		# read in source text if not in standalone mode
 		if not src_text:
-			src_text = open(src, 'rU').read()
+			src_text = read_source(src)
 	except IOError, WindowsError:
 		print '\n***ERROR: Couldn\'t open', src, 'while converting hex to binary.'
 		sys.exit(1)
 	else:
-		# This if statement serves to make sure src_text is actually in hex format.
-		# Strings coming from user input are just strings that can be converted. Strings
-		# coming from a .INO record have formatting to represent them as hex.
-		# If the data is coming from a record (i.e. src <> 0), hexlifying the text
-		# will remove the formatting and leave a straight hex string to convert.
-		if src <> 0 and not re.search('.txt', src):
-			src_text = binascii.hexlify(src_text)
-		else:
-			# This Try blocks allows for correct handling of invalid input from either
-			# a source file or user-entered input.
-			# If source file is .txt, we don't know what format the data is in.
-			# This will convert to hex if needed (by checking for an error when not).
-			try:
-				test = bin(int(src_text, 16))
-			except ValueError, e:
-				# The second value in this comparison is the interpreted string from the ValueError.
-				# This will be the program's rendering of the source text in hex. If src_text is not
-				# already in hex, this string will be longer, as each character is converted into at
-				# least two characters, thus we know it's not in hex and needs to be hexlified.
-				if len(src_text) < len(str(e)[41:-1]):
-					src_text = binascii.hexlify(src_text)
-			
-		bin_text = ''
-		
-		# loop over whole source text to convert while there's data left to convert
-		while re.search('\S', src_text):
-			i = 0
-			bin_word = ''
-			# grab data until a space, indicating a 'word' to convert
-			while i < len(src_text) and src_text[i] <> ' ':
-				bin_word += src_text[i]
-				i += 1
-			# convert the 'word' to binary							    
-			if bin_word: # bin_word will be null if the current character is a space. This only converts if bin_word has data to convert.
-				bin_word = bin(int(bin_word, 16))[2:]
-			
-				# make sure binary data is in byte form
-				while len(bin_word) % 8 <> 0:
-					bin_word = '0' + bin_word
-				bin_text += ' ' + bin_word
-			
-			# remove that part of source text that was just read in and converted
-			if i >= len(src_text):
-				break
-			else:
-				src_text = src_text[i+1:]
-				
+		bin_text = hex_to_bin_text(as_hex_text(src, src_text))
+
 		# determine where to write converted data
 		if dst == '--s':
-			print '\n' + bin_text.replace('0b', '')[1:]
+			print '\n' + bin_text.replace('0b', '')
 		elif dst == '--tmp':
 			return bin_text.replace(' ', '')
 		else:
-			if dst <> 'origBin.txt':
-				print '\n...Writing file...'
-			f = open(dst, 'w')
-			f.write(bin_text[1:])
-			f.close()
-			if dst <> 'origBin.txt':
-				print '\nFile ' + dst + ' saved to ' + os.getcwd() + '.'
+			print '\n...Writing file...'
+			write_output(dst, bin_text)
+			print '\nFile ' + dst + ' saved to ' + os.getcwd() + '.'
 	
+# Convert hex 'words' to decimal
+# Parameters:
+#	src_text - string, is the hex data to convert
+#	final - boolean, False if more data follows src_text
+# Returns:
+#	dec_text - string, is the converted decimal words separated by spaces
+def hex_to_dec_text(src_text, final=True):
+	dec_words = []
+	# convert each space-delimited 'word' of the source text, skipping repeated spaces
+	for dec_word in iter_words(src_text, final):
+		# convert source hex 'word' to decimal
+		if dec_word:
+			dec_words.append(big_int_to_dec(int(dec_word, 16)))
+	return join_words(dec_words)
+
 # Convert data from hex to decimal. Spaces in input text are retained and used
 # as delimiters between pieces to convert individually.
 # Parameters:
@@ -301,49 +2661,52 @@ def hex_to_dec(src, dst, src_text):
 	try:
 		# read in source text if not in standalone mode
 		if not src_text:
-			src_text = open(src, 'rU').read()
+			src_text = read_source(src)
 	except IOError, WindowsError:
 		print '\n***ERROR: Couldn\'t open', src, 'while converting hex to decimal.'
 		sys.exit(1)
 	else:
 		# If the data is coming from a file, make sure it's actually in hex format
-		# by trying a conversion and convert to hex if there's an error.
-		if src <> 0:
-			try:
-				tmp = str(int(src_text[:6], 16))
-			except ValueError:
-				src_text = binascii.hexlify(src_text)
-		dec_text = ''
-		# loop over whole source text to convert while there's non-whitespace left
-		while re.search('\S', src_text):
-			i = 0
-			while src_text[i] == ' ':
-				src_text = src_text[i+1:]
-			dec_word = ''
-			# grab data until a space, indicating a 'word' to convert
-			while i < len(src_text) and src_text[i] <> ' ':
-				dec_word += src_text[i]
-				i += 1
-			# convert source hex 'word' to decimal
-			dec_text += ' ' + str(int(dec_word, 16))
-			
-			if i >= len(src_text):
-				break
-			else:
-				src_text = src_text[i+1:]
-		
+		# and convert to hex if it's not.
+		if src <> 0 and needs_hexlify(src_text):
+			src_text = hexlify_text(src_text)
+		dec_text = hex_to_dec_text(src_text)
+
 		# determine where to write data
 		if dst == '--s':
-			print '\n' + dec_text[1:]
+			print '\n' + dec_text
 		elif dst == '--tmp':
-			return dec_text[1:]
+			return dec_text
 		else:
 			print '\n...Writing file...'
-			f = open(dst, 'w')
-			f.write(dec_text[1:])
-			f.close()
+			write_output(dst, dec_text)
 			print '\nFile ' + dst + ' saved to ' + os.getcwd() + '.'
 
+# Convert hex 'words' to ascii
+# Parameters:
+#	src_text - string, is the hex data to convert
+#	final - boolean, False if more data follows src_text
+#	skip - boolean, True to skip words that aren't valid hex (counting them), False to
+#	       raise the error instead
+# Returns:
+#	ascii_text - string, is the converted ascii words separated by spaces
+def hex_to_ascii_text(src_text, final=True, skip=True):
+	ascii_words = []
+	# convert each space-delimited 'word' of the source text
+	for ascii_word in iter_words(src_text, final):
+		# convert source hex 'word' to ascii
+		if ascii_word and len(ascii_word) % 2 == 0:
+			try:
+				ascii_words.append(binascii.unhexlify(ascii_word))
+			except (TypeError, ValueError): # Python 2 raises TypeError for non-hex digits
+				if not skip:
+					raise
+				print '\n***ERROR: 0x%s is not a valid ascii character. Character skipped.' % (ascii_word)
+				metrics_count('skipped')
+		else:
+			raise InvalidDataError('\n***ERROR: Input data must be an even number of characters. You may need to add leading zeros to the hex bytes.')
+	return join_words(ascii_words)
+
 # Convert data from hex to ascii. Spaces in input text are retained and used
 # as delimiters between pieces to convert individually.
 # Parameters:
@@ -356,67 +2719,79 @@ def hex_to_ascii(src, dst, src_text):
 	try:
 		# read in source text if not in standalone mode
 		if not src_text:
-			src_file = open(src, 'rU')
-			src_text = src_file.read()
-			src_file.close()
+			src_text = read_source(src)
 	except IOError, WindowsError:
 		print '\n***ERROR: Couldn\'t open', src, 'while converting hex to ascii.'
 		sys.exit(1)
 	else:
 		# If the data is coming from a file, make sure it's actually in hex format
-		# by trying a conversion and convert to hex if there's an error.
-		if src <> 0:
-			try:
-				tmp = str(int(src_text[:6], 16))
-			except ValueError:
-				src_text = binascii.hexlify(src_text)
+		# and convert to hex if it's not.
+		if src <> 0 and needs_hexlify(src_text):
+			src_text = hexlify_text(src_text)
 				
-		ascii_text = ''
 		src_text = src_text.replace('0x', '')
 		if re.search('\s', src_text):
 			spaces = True
 		else:
 			spaces = False
-		if src:
-			src_text = src_text.replace(' ', '')
-		
-		# loop over whole source text to convert while there's non-whitespace left
-		while re.search('\S', src_text):
-			i = 0
-			ascii_word = ''
-			# grab data until a space, indicating a 'word' to convert
-			while i < len(src_text) and src_text[i] <> ' ':
-				ascii_word += src_text[i]
-				i += 1
-			# convert source hex 'word' to ascii
-			if ascii_word and len(ascii_word) % 2 == 0:
-				try:
-					ascii_text += ' ' + binascii.unhexlify(ascii_word)
-				except ValueError:
-					print '\n***ERROR: 0x%s is not a valid ascii character. Character skipped.' % (ascii_word)
-			else:
-				print '\n***ERROR: Input data must be an even number of characters. You may need to add leading zeros to the hex bytes.'
-				return
-			
-			if i >= len(src_text):
-				break
-			else:
-				src_text = src_text[i+1:]
+		if src:
+			src_text = src_text.replace(' ', '')
 		
+		try:
+			# a file's spaces are removed, so it's one word that's either valid or not
+			ascii_text = hex_to_ascii_text(src_text, True, not src)
+		except ConversionError, e:
+			print e
+			return
+
 		# determine where to write data
 		if dst == '--s':
 			if spaces:
 				print '\nNOTE: Delimiting spaces from input are indistinguishable from converted spaces (0x20).'
-			print '\n' + ascii_text[1:]
+			print '\n' + ascii_text
 		elif dst == '--tmp':
-			return ascii_text[1:]
+			return ascii_text
 		else:
 			print '\n...Writing file...'
-			f= open(dst, 'w')
-			f.write(ascii_text[1:])
-			f.close()
+			write_output(dst, ascii_text)
 			print '\nFile ' + dst + ' saved to ' + os.getcwd() + '.'
 
+# Convert binary 'words' to hex, padding each one out to whole bytes
+# Parameters:
+#	src_text - string, is the binary data to convert
+#	final - boolean, False if more data follows src_text
+# Returns:
+#	hex_text - string, is the converted hex words separated by spaces
+def bin_to_hex_text(src_text, final=True):
+	# whole bytes separated by single spaces are converted all at once
+	if isinstance(src_text, str) and is_spaced(src_text, 8):
+		bits = src_text.replace(' ', '')
+		if not bits.translate(None, '01'):
+			return bytes_to_hex(bin_to_bytes(bits))
+
+	hex_words = []
+	# convert each space-delimited 'word' of the source text
+	for hex_word in iter_words(src_text, final):
+		# long words are converted with NumPy if it's installed
+		if numpy and len(hex_word) >= NUMPY_MIN_SIZE:
+			numpy_word = numpy_bin_to_hex(hex_word)
+			if numpy_word is not None:
+				hex_words.append(numpy_word)
+				continue
+
+		# convert source binary 'word' to hex
+		hex_word = hex(int(hex_word, 2))[2:]
+		hex_word = hex_word.replace('L', '')
+
+		# ensure each hex 'word' is at least 2 characters for future conversions
+		##if len(hex_word) < 2:
+		if len(hex_word) % 2 <> 0:
+			hex_word = '0' + hex_word
+
+		# add hex 'word' to the output text
+		hex_words.append(hex_word)
+	return join_words(hex_words).upper()
+
 # Convert data from binary to hex. Spaces in input text are retained and used
 # as delimiters between pieces to convert individually.
 # Parameters:
@@ -428,51 +2803,39 @@ def bin_to_hex(src, dst, src_text):
 	try:
 		# read in source text if not in standalone mode
 		if not src_text:
-			src_text = open(src, 'rU').read()
+			src_text = read_source(src, 'bin')
 	except IOError, WindowsError:
 		print '\n***ERROR: Couldn\'t open', src, 'while converting binary to hex.'
 		sys.exit(1)
 	else:
-		hex_text = ''
-		# loop over whole source text to convert while there's non-whitespace left
-		while re.search('\S', src_text):
-			i = 0
-			hex_word = ''
-			# grab data until a space, indicating a 'word' to convert
-			while i < len(src_text) and src_text[i] <> ' ':
-				hex_word += src_text[i]
-				i += 1
-			# convert source binary 'word' to hex
-			hex_word = hex(int(hex_word, 2))[2:]
-			hex_word = hex_word.replace('L', '')
-			
-			# ensure each hex 'word' is at least 2 characters for future conversions
-			##if len(hex_word) < 2:
-			if len(hex_word) % 2 <> 0:
-				hex_word = '0' + hex_word
-			
-			# add hex 'word' to the output text
-			hex_text += ' ' + hex_word
-			
-			if i >= len(src_text):
-				break
-			else:
-				src_text = src_text[i+1:]			
-					
+		hex_text = bin_to_hex_text(src_text)
+
 		# determine where to write data
 		if dst == '--s':
-			print '\n' + hex_text.upper()[1:]
+			print '\n' + hex_text
 		elif dst == '--tmp':
-			return hex_text.upper()[1:]
+			return hex_text
 		else:
 			if dst <> '--tmp':
 				print '\n...Writing file...'
-			f = open(dst, 'w')
-			f.write(hex_text.upper()[1:])
-			f.close()
+			write_output(dst, hex_text)
 			if dst <> '--tmp':
 				print '\nFile ' + dst + ' saved to ' + os.getcwd() + '.'
 
+# Convert binary 'words' to decimal
+# Parameters:
+#	src_text - string, is the binary data to convert
+#	final - boolean, False if more data follows src_text
+# Returns:
+#	dec_text - string, is the converted decimal words separated by spaces
+def bin_to_dec_text(src_text, final=True):
+	dec_words = []
+	# convert each space-delimited 'word' of the source text
+	for dec_word in iter_words(src_text, final):
+		# convert source binary 'word' to decimal
+		dec_words.append(big_int_to_dec(int(dec_word,2)))
+	return join_words(dec_words)
+
 # Convert data from binary to decimal. Spaces in input text are retained and used
 # as delimiters between pieces to convert individually.
 # Parameters:
@@ -485,41 +2848,68 @@ def bin_to_dec(src, dst, src_text):
 	try:
 		# read in source text if not in standalone mode
 		if not src_text:
-			src_text = open(src, 'rU').read()
+			src_text = read_source(src, 'bin')
 	except IOError, WindowsError:
 		print '\n***ERROR: Couldn\'t open', src, 'while converting binary to decimal.'
 		sys.exit(1)
 	else:
-		dec_text = ''
-		# loop over whole source text to convert while there's non-whitespace left
-		while re.search('\S', src_text):
-			i = 0
-			dec_word = ''
-			# grab data until a space, indicating a 'word' to convert
-			while src_text[i] <> ' ':
-				dec_word += src_text[i]
-				i += 1
-				if i >= len(src_text):
-					break
-			# convert source binary 'word' to decimal
-			dec_text += ' ' + str(int(dec_word,2))
-			if i >= len(src_text):
-				break
-			else:
-				src_text = src_text[i+1:]
-		
+		dec_text = bin_to_dec_text(src_text)
+
 		# determine where to write data
 		if dst == '--s':
-			print '\n' + dec_text[1:]
+			print '\n' + dec_text
 		elif dst == '--tmp':
-			return dec_text[1:]
+			return dec_text
 		else:
 			print '\n...Writing file...'
-			f = open(dst, 'w')
-			f.write(dec_text[1:])
-			f.close()
+			write_output(dst, dec_text)
 			print '\nFile ' + dst + ' saved to ' + os.getcwd() + '.'
 
+# Check whether any byte read from binary text is shorter than 8 bits
+# Parameters:
+#	src_text - string, is the binary data to check
+#	final - boolean, False if more data follows src_text
+# Returns:
+#	boolean, True if some byte would need leading zeros added
+def has_partial_byte(src_text, final=True):
+	for start, stop in iter_word_spans(src_text, 8, final):
+		if 0 < stop - start < 8:
+			return True
+	return False
+
+# Convert binary 'words' to ascii, 8 bits at a time. A space follows each converted
+# word that was followed by a space in the source text.
+# Parameters:
+#	src_text - string, is the binary data to convert
+#	add_zeros - string, the answer to whether leading zeros are added to short bytes
+#	final - boolean, False if more data follows src_text
+# Returns:
+#	ascii_text - string, is the converted ascii data
+def bin_to_ascii_text(src_text, add_zeros, final=True):
+	# whole bytes separated by single spaces are converted all at once
+	if isinstance(src_text, str) and is_spaced(src_text, 8):
+		bits = src_text.replace(' ', '')
+		if not bits.translate(None, '01'):
+			return interleave([bin_to_bytes(bits)])
+
+	ascii_chars = []
+	# convert each space-delimited 'word' of the source text 8 bits at a time
+	for start, stop in iter_word_spans(src_text, 8, final):
+		ascii_word = src_text[start:stop]
+
+		if ascii_word:
+			if add_zeros:
+				ascii_word = ascii_word.zfill(8)
+
+			if ascii_word in BIN_CHARS:
+				ascii_chars.append(BIN_CHARS[ascii_word])
+			else:
+				ascii_chars.append(chr(int(ascii_word, 2)))
+
+		if src_text[stop:stop + 1] == ' ':
+			ascii_chars.append(' ')
+	return join_words(ascii_chars, '')
+
 # Convert data from binary to ascii. Spaces in input text are retained and used
 # as delimiters between pieces to convert individually. Binary representations of
 # space characters are translated as '_' since the visual space character is
@@ -534,44 +2924,19 @@ def bin_to_ascii(src, dst, src_text):
 	try:
 		# read in source text if not in standalone mode
 		if not src_text:
-			src_text = open(src, 'rU').read()
+			src_text = read_source(src, 'bin')
 	except IOError, WindowsError:
 		print '\n***ERROR: Couldn\'t open', src, 'while converting binary to ascii.'
 		sys.exit(1)
 	else:
-		ascii_text = ''
 		#use_spaces = '0'
 		add_zeros = '0'
 		src_text = src_text.replace('0b', '')
-		
-		# loop over whole source text to convert while there's non-whitespace left
-		while re.search('\S', src_text):
-			i = 0
-			ascii_word = ''
-			
-			while i < 8 and i < len(src_text) and src_text[i] <> ' ':
-				ascii_word += src_text[i]
-				i += 1
-				
-			if ascii_word:
-				if len(ascii_word) <> 8 and add_zeros == '0':
-					add_zeros = raw_input('\n***Input data does not divide evenly into bytes. Would you like to add leading \n   zeros? (y, n) ')
-				
-				if add_zeros:
-					while len(ascii_word) % 8 <> 0:
-						ascii_word = '0' + ascii_word
-				
-				ascii_text += chr(int(ascii_word, 2))
-			
-			if i < len(src_text) and src_text[i] == ' ':
-				ascii_text += ' '
-				i += 1
+		if has_partial_byte(src_text):
+			add_zeros = raw_input('\n***Input data does not divide evenly into bytes. Would you like to add leading \n   zeros? (y, n) ')
+
+		ascii_text = bin_to_ascii_text(src_text, add_zeros)
 
-			if i >= len(src_text):
-				break
-			else:
-				src_text = src_text[i:]
-		
 		# determine where to write data
 		if dst == '--s':
 			if re.search(' ', ascii_text):
@@ -581,11 +2946,28 @@ def bin_to_ascii(src, dst, src_text):
 			return ascii_text[1:]
 		else:
 			print '\n...Writing file...'
-			f = open(dst, 'w')
-			f.write(ascii_text[1:])
-			f.close()
+			write_output(dst, ascii_text[1:])
 			print '\nFile ' + dst + ' saved to ' + os.getcwd() + '.'
 	
+# Convert decimal 'words' to binary
+# Parameters:
+#	src_text - string, is the decimal data to convert
+#	keep_spaces - boolean, True to separate the converted words with spaces
+#	final - boolean, False if more data follows src_text
+# Returns:
+#	bin_text - string, is the converted binary data
+def dec_to_bin_text(src_text, keep_spaces, final=True):
+	bin_words = []
+	for bin_word in iter_words(src_text, final):
+		if bin_word:
+			# convert source decimal 'word' to binary
+			bin_words.append(bin(big_dec_to_int(bin_word))[2:])
+
+	# Decimal data can't be broken into bytes, so the words are only joined by spaces if asked to.
+	if keep_spaces:
+		return join_words(bin_words)
+	return join_words(bin_words, '')
+
 # Convert data from decimal to binary. Spaces in input text are retained and used
 # as delimiters between pieces to convert individually.
 # Parameters:
@@ -598,40 +2980,17 @@ def dec_to_bin(src, dst, src_text):
 	try:
 		# read in source text if not in standalone mode
 		if not src_text:
-			src_text = open(src, 'rU').read()
+			src_text = read_source(src)
 	except IOError, WindowsError:
 		print '\n***ERROR: Couldn\'t open', src, 'while converting decimal to binary.'
 		sys.exit(1)
 	else:
-		bin_text = ''
 		use_spaces = '0'
 		if re.search('\s', src_text):
 			use_spaces = raw_input('\n***Spaces detected in input.\n   Would you like to preserve spaces in conversion? (yes/no) ')
-		# loop over whole source text to convert while there's non-whitespace left
-		while re.search('\S', src_text):
-			i = 0
-			bin_word = ''
-			# grab data until a space, indicating a 'word' to convert
-			while i < len(src_text) and src_text[i] <> ' ':
-				bin_word += src_text[i]
-				i += 1
-				
-			if bin_word:
-				# convert source decimal 'word' to binary
-				bin_text += ' ' + bin(int(bin_word))[2:]
+		# convert each space-delimited 'word' of the source text
+		bin_text = dec_to_bin_text(src_text, re.search('Y', use_spaces.upper()))
 
-			if i >= len(src_text):
-				break
-			else:
-				src_text = src_text[i+1:]
-		
-		# Decimal data can't be broken into bytes, so we need to leave the spaces until after converting.
-		# Now we determine whether or not to remove spaces in output.
-		if not re.search('Y', use_spaces.upper()):
-			bin_text = bin_text.replace(' ', '')
-		if bin_text[0] == ' ':
-			bin_text = bin_text[1:]
-		
 		# determine where to write data
 		if dst == '--s':
 			print '\n' + bin_text
@@ -639,11 +2998,28 @@ def dec_to_bin(src, dst, src_text):
 			return bin_text
 		else:
 			print '\n...Writing file...'
-			f = open(dst, 'w')
-			f.write(bin_text)
-			f.close()
+			write_output(dst, bin_text)
 			print '\nFile ' + dst + ' saved to ' + os.getcwd() + '.'
 
+# Convert decimal 'words' to hex
+# Parameters:
+#	src_text - string, is the decimal data to convert
+#	keep_spaces - boolean, True to separate the converted words with spaces
+#	final - boolean, False if more data follows src_text
+# Returns:
+#	hex_text - string, is the converted hex data
+def dec_to_hex_text(src_text, keep_spaces, final=True):
+	hex_words = []
+	for hex_word in iter_words(src_text, final):
+		if hex_word:
+			# convert source decimal 'word' to hex
+			hex_words.append(hex(big_dec_to_int(hex_word))[2:].replace('L', ''))
+
+	# Decimal data can't be broken into bytes, so the words are only joined by spaces if asked to.
+	if keep_spaces:
+		return join_words(hex_words).upper()
+	return join_words(hex_words, '').upper()
+
 # Convert data from decimal to hex. Spaces in input text are retained and used
 # as delimiters between pieces to convert individually.
 # Parameters:
@@ -656,53 +3032,58 @@ def dec_to_hex(src, dst, src_text):
 	try:
 		# read in source text if not in standalone mode
 		if not src_text:
-			src_text = open(src, 'rU').read()
+			src_text = read_source(src)
 	except IOError, WindowsError:
 		print '\n***ERROR: Couldn\'t open', src, 'while converting decimal to hex.'
 		sys.exit(1)
 	else:
-		hex_text = ''
 		use_spaces = '0'
 		if re.search('\s', src_text):
 			use_spaces = raw_input('\n***Spaces detected in input.\n   Would you like to preserve spaces in conversion? (yes/no) ')
-		# loop over whole source text to convert while there's non-whitespace left
-		while re.search('\S', src_text):
-			i = 0
-			hex_word = ''
-			# grab data until a space, indicating a 'word' to convert
-			while i < len(src_text) and src_text[i] <> ' ':
-				hex_word += src_text[i]
-				i += 1
-			
-			if hex_word:
-				# convert source decimal 'word' to hex
-				hex_text += ' ' + hex(int(hex_word))[2:]
-				hex_text = hex_text.replace('L', '')
-				
-			if i >= len(src_text):
-				break
-			else:
-				src_text = src_text[i+1:]
-		
-		# Decimal data can't be broken into bytes, so we need to leave the spaces until after converting.
-		# Now we determine whether or not to remove spaces in output.
-		if not re.search('Y', use_spaces.upper()):
-			hex_text = hex_text.replace(' ', '')
-		if hex_text[0] == ' ':
-			hex_text = hex_text[1:]
-		
+		# convert each space-delimited 'word' of the source text
+		hex_text = dec_to_hex_text(src_text, re.search('Y', use_spaces.upper()))
+
 		# determine where to write data
 		if dst == '--s':
-			print '\n' + hex_text.upper()
+			print '\n' + hex_text
 		elif dst == '--tmp':
-			return hex_text.uuper()
+			return hex_text
 		else:
 			print '\n...Writing file...'
-			f = open(dst, 'w')
-			f.write(hex_text.upper())
-			f.close()
+			write_output(dst, hex_text)
 			print '\nFile ' + dst + ' saved to ' + os.getcwd() + '.'
 
+# Convert decimal 'words' to ascii
+# Parameters:
+#	src_text - string, is the decimal data to convert
+#	keep_spaces - boolean, True to separate the converted words with spaces
+#	final - boolean, False if more data follows src_text
+# Returns:
+#	ascii_text - string, is the converted ascii data
+def dec_to_ascii_text(src_text, keep_spaces, final=True):
+	# convert each space-delimited 'word' of the source text. The first word is
+	# always examined, even if the input is nothing but whitespace.
+	words = iter_words(src_text, final)
+	if final and not re.search('\S', src_text):
+		words = src_text.split(' ')[:1]
+	ascii_words = []
+	for ascii_word in words:
+		# convert source decimal 'word' to ascii
+		if ascii_word:
+			if int(ascii_word) > 255:
+				raise InvalidDataError('\n***ERROR: Cannot convert integers greater than 255 to ASCII.')
+			if int(ascii_word) == 32:
+				ascii_words.append('|~') # temporary placeholder for space character since it can be convused with delimiting spaces
+			else:
+				ascii_words.append(chr(int(ascii_word)))
+
+	# Decimal data can't be broken into bytes, so the words are only joined by spaces if asked to.
+	if keep_spaces:
+		ascii_text = join_words(ascii_words)
+	else:
+		ascii_text = join_words(ascii_words, '')
+	return ascii_text.replace('|~', ' ') # replace the space placeholder now that delimiting spaces have been placed
+
 # Convert data from decimal to ascii. Spaces in input text are retained and used
 # as delimiters between pieces to convert individually. Decimal representations of
 # space characters are translated as '_' since the visual space character is
@@ -717,67 +3098,51 @@ def dec_to_ascii(src, dst, src_text):
 	try:
 		# read in source text if not in standalone mode
 		if not src_text:
-			src_text = open(src, 'rU').read()
+			src_text = read_source(src)
 	except IOError, WindowsError:
 		print '\n***ERROR: Couldn\'t open', src, 'while converting decimal to ascii.'
 		sys.exit(1)
 	else:
-		ascii_text = ''
 		use_spaces = '0'
 		if re.search('\s', src_text):
 			use_spaces = raw_input('\n***Spaces detected in input.\n   Would you like to preserve spaces in conversion? (yes/no) ')
 		if len(src_text) > 3 and not re.search('\s', src_text):
 			print '\n***ERROR: Invalid input format. Enter decimal values delimited by spaces.'
 			return
-		# loop over whole source text to convert while there's non-whitespace left
-		loop = 1
-		while re.search('\S', src_text) or loop:
-			i = 0
-			ascii_word = ''
-			# grab data until a space, indicating a 'word' to convert
-			while i < len(src_text) and src_text[i] <> ' ':
-				ascii_word += src_text[i]
-				i += 1
-			
-			# convert source decimal 'word' to ascii
-			if ascii_word:
-				if int(ascii_word) > 255:
-					print '\n***ERROR: Cannot convert integers greater than 255 to ASCII.'
-					return
-				if int(ascii_word) == 32:
-					ascii_text += ' |~' # temporary placeholder for space character since it can be convused with delimiting spaces
-				else:
-					ascii_text += ' ' + chr(int(ascii_word))
-				
-			if i >= len(src_text):
-				break
-			else:
-				src_text = src_text[i+1:]
-			
-			loop = 0
-		
-		# Decimal data can't be broken into bytes, so we need to leave the spaces until after converting.
-		# Now we determine whether or not to remove spaces in output.
-		if not re.search('Y', use_spaces.upper()):
-			ascii_text = ascii_text.replace(' ', '')
-		if ascii_text[0] == ' ':
-			ascii_text = ascii_text[1:]
-		ascii_text = ascii_text.replace('|~', ' ') # replace the space placeholder now that delimiting spaces have been removed
-		
+		# convert each space-delimited 'word' of the source text
+		try:
+			ascii_text = dec_to_ascii_text(src_text, re.search('Y', use_spaces.upper()))
+		except ConversionError, e:
+			print e
+			return
+
 		# determine where to write data
 		if dst == '--s':
 			if re.search('Y', use_spaces.upper()):
 				print '\nNOTE: Delimiting spaces from input are indistinguishable from converted spaces (32).'
 			print '\n' + ascii_text
-		elif dst == '-tmp':
+		elif dst == '--tmp':
 			return ascii_text
 		else:
 			print '\n...Writing file...'
-			f = open(dst, 'w')
-			f.write(ascii_text)
-			f.close()
+			write_output(dst, ascii_text)
 			print '\nFile ' + dst + ' saved to ' + os.getcwd() + '.'
 
+# Convert each ascii character to 8-bit binary
+# Parameters:
+#	src_text - string, is the ascii data to convert
+# Returns:
+#	bin_text - string, is the converted binary bytes separated by spaces
+def ascii_to_bin_text(src_text):
+	# space characters in src_text are left intact and converted to '00100000'.
+	if isinstance(src_text, str):
+		return bytes_to_bin(src_text)
+	# unicode characters are written by their code points, without looking them up in the
+	# tables, which are keyed by bytes
+	if isinstance(src_text, unicode):
+		return ' '.join(['{0:08b}'.format(ord(char)) for char in src_text])
+	return ' '.join(map(CHAR_BINS.__getitem__, src_text))
+
 # Convert data from ascii to binary. Spaces in input text are not retained since they
 # represent an ascii character, and they are converted to'00100000'. Output prints each
 # character one after another without delimiter based on input.
@@ -791,34 +3156,37 @@ def ascii_to_bin(src, dst, src_text):
 	try:
 		# read in source text if not in standalone mode
 		if not src_text:
-			src_text = open(src, 'rU').read()
+			src_text = read_source(src)
 	except IOError, WindowsError:
 		print '\n***ERROR: Couldn\'t open', src, 'while converting ascii to binary.'
 		sys.exit(1)
 	else:
-		i = 0
-		bin_text = ''
-		# loop over whole source text and convert each ascii character to 8-bit binary
-		# space characters in src_text are left intact and converted to '00100000'.
-		while i < len(src_text):
-			bin_word = bin(ord(src_text[i]))[2:]
-			while len(bin_word) < 8:
-				bin_word = '0' + bin_word
-			bin_text += ' ' + bin_word
-			i += 1
-			
+		# convert each ascii character to 8-bit binary
+		bin_text = ascii_to_bin_text(src_text)
+
 		# determine where to write data
 		if dst == '--s':
-			print '\n(Spaces entered above are represented as \'00100000\'.\n' + bin_text[1:]
+			print '\n(Spaces entered above are represented as \'00100000\'.\n' + bin_text
 		elif dst == '--tmp':
-			return bin_text[1:]
+			return bin_text
 		else:
 			print '\n...Writing file...'
-			f = open(dst, 'w')
-			f.write(bin_text[1:])
-			f.close()
+			write_output(dst, bin_text)
 			print '\nFile ' + dst + ' saved to ' + os.getcwd() + '.'
 	
+# Convert each ascii character to decimal
+# Parameters:
+#	src_text - string, is the ascii data to convert
+# Returns:
+#	dec_text - string, is the converted decimal values separated by spaces
+def ascii_to_dec_text(src_text):
+	# space characters in src_text are left intact and converted to '32'.
+	# unicode characters are written by their code points, without looking them up in the
+	# tables, which are keyed by bytes
+	if isinstance(src_text, unicode):
+		return ' '.join([str(ord(char)) for char in src_text])
+	return ' '.join(map(CHAR_DECS.__getitem__, src_text))
+
 # Convert data from ascii to decimal. Spaces in input text are not retained since they
 # represent an ascii character, and they are converted to'35'. Output prints each
 # character one after another without delimiter based on input.
@@ -833,31 +3201,39 @@ def ascii_to_dec(src, dst, src_text):
 	try:
 		# read in source text if not in standalone mode
 		if not src_text:
-			src_text = open(src, 'rU').read()
+			src_text = read_source(src)
 	except IOError, WindowsError:
 		print '\n***ERROR: Couldn\'t open', src, 'while converting ascii to decimal.'
 		sys.exit(1)
 	else:
-		dec_text = ''
-		# loop over whole source text and convert each ascii character to decimal
-		# space characters in src_text are left intact and converted to '32'.
-		i = 0
-		while i < len(src_text):
-			dec_text += ' ' + str(ord(src_text[i]))
-			i += 1
-		
+		# convert each ascii character to decimal
+		dec_text = ascii_to_dec_text(src_text)
+
 		# determine where to write data
 		if dst == '--s':
-			print '\nSpaces entered above are represented as \'32\'.\n' + dec_text[1:]
+			print '\nSpaces entered above are represented as \'32\'.\n' + dec_text
 		elif dst == '--tmp':
-			return dec_text[1:]
+			return dec_text
 		else:
 			print '\n...Writing file...'
-			f = open(dst, 'w')
-			f.write(dec_text[1:])
-			f.close()
+			write_output(dst, dec_text)
 			print '\nFile ' + dst + ' saved to ' + os.getcwd() + '.'
 
+# Convert each ascii character to hex
+# Parameters:
+#	src_text - string, is the ascii data to convert
+# Returns:
+#	hex_text - string, is the converted hex bytes separated by spaces
+def ascii_to_hex_text(src_text):
+	# space characters in src_text are left intact and converted to '20'.
+	if isinstance(src_text, str):
+		return bytes_to_hex(src_text)
+	# unicode characters are written by their code points, without looking them up in the
+	# tables, which are keyed by bytes
+	if isinstance(src_text, unicode):
+		return ' '.join(['%02X' % (ord(char)) for char in src_text])
+	return ' '.join(map(CHAR_HEXES.__getitem__, src_text))
+
 # Convert data from ascii to hex. Spaces in input text are not retained since they
 # represent an ascii character, and they are converted to'20'. Output prints each
 # character one after another without delimiter based on input.
@@ -871,48 +3247,87 @@ def ascii_to_hex(src, dst, src_text):
 	try:
 		# read in source text if not in standalone mode
 		if not src_text:
-			src_text = open(src, 'rU').read()
+			src_text = read_source(src)
 	except IOError, WindowsError:
 		print '***ERROR: Couldn\'t open', src, 'while converting ascii to hex.'
 		sys.exit(1)
 	else:
-		hex_text = ''
-		# loop over whole source text and convert each ascii character to hex
-		# space characters in src_text are left intact and converted to '20'.
-		i = 0
-		while i < len(src_text):
-			hex_word = str(hex(ord(src_text[i])))[2:]
-			while len(hex_word) < 2:
-				hex_word = '0' + hex_word
-			hex_text += ' ' + hex_word
-			i += 1
-			
+		# convert each ascii character to hex
+		hex_text = ascii_to_hex_text(src_text)
+
 		# determine where to write data
 		if dst == '--s':
-			print '\n(Each ASCII character above is separated by a space below. \'20\' indicates a space character in input.)\n' + hex_text.upper()[1:]
+			print '\n(Each ASCII character above is separated by a space below. \'20\' indicates a space character in input.)\n' + hex_text
 		elif dst == '--tmp':
-			return hex_text.upper()[1:]
+			return hex_text
 		else:
 			print '\n...Writing file...'
-			f = open(dst, 'w')
-			f.write(hex_text.upper()[1:])
-			f.close()
+			write_output(dst, hex_text)
 			print '\nFile ' + dst + ' saved to ' + os.getcwd() + '.'
 
-# Convert hex to binary, invert the bits, convert back to hex
+# Invert the bits of hex 'words', giving what converting each word to binary, inverting
+# it, and converting it back to hex does. Each word is padded out to whole bytes before
+# it's inverted, and leading zero bytes are dropped from the inverted word.
+# Parameters:
+#	src_text - string, is the hex data to invert
+#	final - boolean, False if more data follows src_text
+# Returns:
+#	hex_text - string, is the inverted hex words separated by spaces
+def invert_hex_text(src_text, final=True):
+	hex_words = []
+	for hex_word in iter_words(src_text, final):
+		if hex_word:
+			value = int(hex_word, 16)
+			bits = max(8, (value.bit_length() + 7) // 8 * 8)
+			hex_word = '%X' % (value ^ ((1 << bits) - 1))
+			if len(hex_word) % 2 <> 0:
+				hex_word = '0' + hex_word
+			hex_words.append(hex_word)
+	return join_words(hex_words)
+
+# Convert hex to binary, invert the bits, convert back to hex. This is done in memory
+# in one pass, so nothing is written to the current directory along the way.
 # Parameters:
 #	src - string, represents source file to be converted
 #	dst - string, represents destination to write converted data to
+#	src_text - string, is the input data to convert
 # Returns:
-#	inverted_hex, string of inverted and converted data
+#	inverted_hex, string of inverted and converted data (only returns if dst = '--tmp')
 def invert_hex(src, dst, src_text):
-	# creates two intermediate files and then deletes them
-	hex_to_bin(src, 'origBin.txt', src_text)
-	invert_bin('origBin.txt', 'invBin.txt', 0)
-	inverted_hex = bin_to_hex('invBin.txt', dst, 0)
-	os.remove('origBin.txt')
-	os.remove('invBin.txt')
-	return inverted_hex
+	# records are inverted straight from a memory map of the file instead of being read in
+	if not src_text and src <> 0 and not re.search('.txt', src):
+		return convert_record(src, dst, 'inv')
+
+	try:
+		# read in source text if not in standalone mode
+		if not src_text:
+			src_text = read_source(src)
+	except IOError, WindowsError:
+		print '\n***ERROR: Couldn\'t open', src, 'while converting hex to binary.'
+		sys.exit(1)
+	else:
+		inverted_hex = invert_hex_text(as_hex_text(src, src_text))
+
+		# determine where to write data
+		if dst == '--s':
+			print '\n' + inverted_hex
+		elif dst == '--tmp':
+			return inverted_hex
+		else:
+			print '\n...Writing file...'
+			write_output(dst, inverted_hex)
+			print '\nFile ' + dst + ' saved to ' + os.getcwd() + '.'
+
+# Invert each bit of a binary string, leaving spaces in place
+# Parameters:
+#	src_text - string, is the binary data to invert
+# Returns:
+#	inv_bits - string, is the inverted bits
+def invert_bin_text(src_text):
+	src_text = str(src_text) # binary digits, even if given as unicode
+	if src_text.translate(None, '01 '): # source file containined non-binary bits, error
+		raise InvalidDataError('\n***Error in inversion: Invalid binary file...')
+	return src_text.translate(INVERTED_BITS)
 
 # Invert binary string
 # Parameters:
@@ -923,33 +3338,22 @@ def invert_hex(src, dst, src_text):
 def invert_bin(src, dst, src_text):
 	try:
 		if not src_text:
-			s = open(src,'rU')
-			src_text = s.read()
-			s.close()
+			src_text = read_source(src, 'bin')
 	except IOError, WindowsError:
 		print '***ERROR: Couldn\'t open', src, 'while inverting binary.'
 		sys.exit(1)
 	else:		
 		# add a leading zero if the input string is not an even number of bits
 		src_bits = len(src_text)
-		while len(src_text.replace(' ', '')) %8 <> 0:
-			src_text = '0' + src_text
+		src_text = '0' * (-(len(src_text) - src_text.count(' ')) % 8) + src_text
 			
-		# print to screen or write to file
-		inv_bits = ""
-		
 		# save inverted bits to temporary string
-		for i in src_text:
-			if i == '1':
-				inv_bits += '0'
-			elif i == '0':
-				inv_bits += '1'
-			elif i == ' ':
-				inv_bits += ' '
-			else: # source file containined non-binary bits, error
-				print "\n***Error in inversion: Invalid binary file..."
-				sys.exit(1)
-				
+		try:
+			inv_bits = invert_bin_text(src_text)
+		except ConversionError, e:
+			print e
+			sys.exit(1)
+
 		# print, return, or write inverted string
 		if dst == '--s':
 			print '\nAs entered: ' + inv_bits[-src_bits:] # print string of inverted bits
@@ -957,23 +3361,773 @@ def invert_bin(src, dst, src_text):
 		elif dst == '--tmp':
 			return inv_bits # return string of inverted bits
 		else:
-			if re.search('.txt', dst):
-				d = open(dst, 'w')
-			else:
-				d = open(dst + '.txt', 'w')
-			
-			# only print writing status if not being called internally from invert_hex
-			if not (src == 'origBin.txt' and dst == 'invBin.txt'):
-				print '\n...Writing file...'
+			print '\n...Writing file...'
 			
 			# write inverted bits to file
-			d.write(inv_bits)
-					
-			d.close()
-			# only print saved status if not being called internally from invert_hex
-			if not (src == 'origBin.txt' and dst == 'invBin.txt'):
-				print '\nFile ' + dst + ' saved to ' + os.getcwd() + '.'
+			if re.search('.txt', dst) or packs_to(dst):
+				write_output(dst, inv_bits)
+			else:
+				write_output(dst + '.txt', inv_bits)
+			print '\nFile ' + dst + ' saved to ' + os.getcwd() + '.'
 				
 
+# Function that does each conversion, by the formats it converts from and to
+CONVERSIONS = {
+	('hex', 'bin'): hex_to_bin,
+	('hex', 'dec'): hex_to_dec,
+	('hex', 'ascii'): hex_to_ascii,
+	('hex', 'inv'): invert_hex,
+	('bin', 'hex'): bin_to_hex,
+	('bin', 'dec'): bin_to_dec,
+	('bin', 'ascii'): bin_to_ascii,
+	('bin', 'inv'): invert_bin,
+	('dec', 'bin'): dec_to_bin,
+	('dec', 'hex'): dec_to_hex,
+	('dec', 'ascii'): dec_to_ascii,
+	('ascii', 'hex'): ascii_to_hex,
+	('ascii', 'dec'): ascii_to_dec,
+	('ascii', 'bin'): ascii_to_bin,
+}
+
+# Function that converts text in each pair of formats (see convert_text), and the options
+# it takes after the text, in order
+TEXT_CONVERSIONS = {
+	('hex', 'bin'): (hex_to_bin_text, ('final',)),
+	('hex', 'dec'): (hex_to_dec_text, ('final',)),
+	('hex', 'ascii'): (hex_to_ascii_text, ('final',)),
+	('hex', 'inv'): (invert_hex_text, ('final',)),
+	('bin', 'hex'): (bin_to_hex_text, ('final',)),
+	('bin', 'dec'): (bin_to_dec_text, ('final',)),
+	('bin', 'ascii'): (bin_to_ascii_text, ('add_zeros', 'final')),
+	('bin', 'inv'): (invert_bin_text, ()),
+	('dec', 'bin'): (dec_to_bin_text, ('keep_spaces', 'final')),
+	('dec', 'hex'): (dec_to_hex_text, ('keep_spaces', 'final')),
+	('dec', 'ascii'): (dec_to_ascii_text, ('keep_spaces', 'final')),
+	('ascii', 'bin'): (ascii_to_bin_text, ()),
+	('ascii', 'dec'): (ascii_to_dec_text, ()),
+	('ascii', 'hex'): (ascii_to_hex_text, ()),
+}
+
+# Convert text from one format to another with the conversion's core function
+# Parameters:
+#	from_fmt - string, is the format to convert from
+#	to_fmt - string, is the format to convert to
+#	text - string, is the text to convert
+#	final - bool, is whether the text is the end of the source
+#	keep_spaces - bool, is whether to keep spaces between values (decimal sources)
+#	add_zeros - string or bool, is whether to add leading zeros (binary to ascii)
+# Returns:
+#	string, is the converted text
+def convert_text(from_fmt, to_fmt, text, final=True, keep_spaces=True, add_zeros=True):
+	function, options = TEXT_CONVERSIONS[(from_fmt, to_fmt)]
+	values = {'final': final, 'keep_spaces': keep_spaces, 'add_zeros': add_zeros}
+	return function(text, *[values[option] for option in options])
+
+# Number of characters read at a time when streaming a conversion. Blocks are never
+# smaller than STREAM_MIN_BLOCK_SIZE, so checks made on the start of a source that is
+# streamed see as much of it as they need.
+STREAM_BLOCK_SIZE = 1 << 20
+STREAM_MIN_BLOCK_SIZE = 4096
+
+# How the source text of each conversion can be split up when streaming (see split_blocks)
+STREAM_SPLITS = {
+	('hex', 'bin'): 'word',
+	('hex', 'dec'): 'word',
+	('hex', 'ascii'): 'pair',
+	('hex', 'inv'): 'word',
+	('bin', 'hex'): 'word',
+	('bin', 'dec'): 'word',
+	('bin', 'ascii'): 'byte',
+	('bin', 'inv'): 'char',
+	('dec', 'bin'): 'word',
+	('dec', 'hex'): 'word',
+	('dec', 'ascii'): 'word',
+	('ascii', 'bin'): 'char',
+	('ascii', 'dec'): 'char',
+	('ascii', 'hex'): 'char',
+}
+
+
+# Generate the text of an open source file in blocks
+# Parameters:
+#	src_file - file, is the open source file to read
+#	block_size - int, is the number of characters to read at a time
+# Returns:
+#	block - string, yielded for each block read until the end of the file
+def read_blocks(src_file, block_size):
+	block = src_file.read(block_size)
+	while block:
+		yield block
+		block = src_file.read(block_size)
+
+# Read blocks of text from a pipe as the data arrives, rather than waiting for whole
+# blocks. The first block is at least STREAM_MIN_BLOCK_SIZE characters (unless the pipe
+# closes first), so checks made on the start of a source see as much as they need.
+# Parameters:
+#	src_file - file, is the pipe to read from
+#	block_size - int, is the most characters to read at a time
+# Returns:
+#	block - string, yielded for each block read
+def read_pipe_blocks(src_file, block_size):
+	fd = src_file.fileno()
+	first = []
+	size = 0
+	while size < STREAM_MIN_BLOCK_SIZE:
+		block = os.read(fd, block_size)
+		if not block:
+			break
+		first.append(block)
+		size += len(block)
+	if first:
+		yield ''.join(first)
+	block = os.read(fd, block_size)
+	while block:
+		yield block
+		block = os.read(fd, block_size)
+
+# Remove every occurrence of a two-character marker (e.g. '0b') from a stream of text
+# blocks. A block's last character is held back when it could start a marker, so
+# markers split across two blocks are removed as well.
+# Parameters:
+#	blocks - iterable of strings, is the text to remove the marker from
+#	marker - string, is the two characters to remove
+# Returns:
+#	block - string, yielded for each block with the marker removed
+def strip_marker(blocks, marker):
+	carry = ''
+	for block in blocks:
+		block = carry + block
+		carry = ''
+		if block[-1:] == marker[0]:
+			carry = block[-1]
+			block = block[:-1]
+		yield block.replace(marker, '')
+	if carry:
+		yield carry
+
+# Split a stream of text blocks into pieces that can each be converted on their own,
+# cutting only where the conversion allows it:
+#	'word' - at a space with more words after it. The space is dropped, so converted
+#	         pieces are joined back together with the conversion's output separator.
+#	'byte' - like 'word', but the space stays with the piece before it, and a single
+#	         long word can also be cut every 8 characters.
+#	'pair' - every 2 characters
+#	'char' - anywhere
+# Parameters:
+#	blocks - iterable of strings, is the source text in the order it was read
+#	split - string, is one of the ways of splitting above
+# Returns:
+#	(piece, final) - tuple, yielded for each piece. final is only True for the last piece.
+def split_blocks(blocks, split):
+	buf = ''
+	end = 0 # buf[:end] ends with the last non-whitespace character read, and has no space to cut at
+	for block in blocks:
+		if split == 'char' or split == 'pair':
+			buf += block
+			cut = len(buf)
+			if split == 'pair':
+				cut -= cut % 2
+			if cut:
+				yield buf[:cut], False
+				buf = buf[cut:]
+			continue
+
+		searched = end
+		if block.rstrip():
+			end = len(buf) + len(block.rstrip())
+		buf += block
+		cut = buf.rfind(' ', searched, end)
+		if cut >= 0:
+			if split == 'word':
+				yield buf[:cut], False
+			else:
+				yield buf[:cut + 1], False
+			buf = buf[cut + 1:]
+			end -= cut + 1
+		elif split == 'byte' and end > 8:
+			cut = (end - 1) // 8 * 8
+			yield buf[:cut], False
+			buf = buf[cut:]
+			end -= cut
+	yield buf, True
+
+# Convert the pieces of a file source to ascii for hex_to_ascii. Spaces are removed from
+# file sources, so the file is read as one long hex word, and errors are reported as that
+# word reports them: first an odd number of digits, then an invalid digit, and nothing at
+# all if the file holds only whitespace.
+# Parameters:
+#	pieces - iterable of (piece, final) tuples, is the hex text split into whole bytes
+# Returns:
+#	ascii_text - string, yielded for each converted piece
+def unhexlify_pieces(pieces):
+	length = 0
+	data = False
+	error = None
+	for piece, final in pieces:
+		length += len(piece)
+		data = data or piece.strip() <> ''
+		if error is None:
+			try:
+				ascii_text = binascii.unhexlify(piece)
+			except (TypeError, ValueError), e:
+				error = e
+			else:
+				yield ascii_text
+	if data and length % 2 <> 0:
+		raise InvalidDataError('\n***ERROR: Input data must be an even number of characters. You may need to add leading zeros to the hex bytes.')
+	if data and error is not None:
+		raise error
+
+# Seconds between the checkpoints saved by a resumable conversion (see stream_convert)
+CHECKPOINT_SECONDS = 5
+
+# Describe a conversion, so a checkpoint is only used to resume the same conversion of
+# the same source
+# Parameters:
+#	from_what - string, is the format to convert from
+#	to_what - string, is the format to convert to
+#	src - string, represents the source file
+#	block_size - int, is the number of characters read at a time
+# Returns:
+#	dictionary, is the conversion, block size, and the source's path, size, and
+#	modification time
+def checkpoint_signature(from_what, to_what, src, block_size):
+	info = os.stat(src)
+	return {
+		'from': from_what, 'to': to_what, 'block_size': block_size,
+		'src': os.path.abspath(src), 'size': info.st_size, 'mtime': info.st_mtime,
+	}
+
+# Read a conversion's checkpoint, if it has one it can resume from
+# Parameters:
+#	checkpoint - string, is the checkpoint file
+#	signature - dictionary, is the conversion's signature (see checkpoint_signature)
+#	part - string, is the '.part' file the conversion writes to
+# Returns:
+#	dictionary, is the saved state (see stream_convert), or None to start over
+def read_checkpoint(checkpoint, signature, part):
+	try:
+		checkpoint_file = open(checkpoint, 'rb')
+		try:
+			state = json.load(checkpoint_file)
+		finally:
+			checkpoint_file.close()
+	except (IOError, ValueError): # no checkpoint, or one that was cut short
+		return None
+	if state.get('signature') <> signature or not os.path.exists(part) or os.path.getsize(part) < state['output']:
+		return None
+	for name in ('sep', 'held', 'add_zeros'): # JSON gives back unicode
+		state[name] = state[name].encode('utf-8')
+	return state
+
+# Save a checkpoint. What has been written is flushed to disk first, and the checkpoint
+# is written to a temporary file and renamed, so a checkpoint on disk is never ahead of
+# the output or cut short.
+# Parameters:
+#	checkpoint - string, is the checkpoint file
+#	signature - dictionary, is the conversion's signature (see checkpoint_signature)
+#	out - file, is the '.part' file being written
+#	state - dictionary, is what carries over to the next piece
+# Returns: (none)
+def save_checkpoint(checkpoint, signature, out, state):
+	out.flush()
+	os.fsync(out.fileno())
+	state = dict(state, signature=signature, output=out.tell())
+	checkpoint_file = open(checkpoint + '.tmp', 'wb')
+	json.dump(state, checkpoint_file)
+	checkpoint_file.flush()
+	os.fsync(checkpoint_file.fileno())
+	checkpoint_file.close()
+	if os.name == 'nt' and os.path.exists(checkpoint): # rename can't replace a file on Windows
+		os.remove(checkpoint)
+	os.rename(checkpoint + '.tmp', checkpoint)
+
+# Convert one piece of a streamed source (see stream_convert). Pieces are converted
+# independently of each other, so they can be converted in other processes.
+# Parameters:
+#	job - tuple, is the from format, to format, piece, whether it's the final piece,
+#	      whether to keep spaces (decimal sources), and whether to add leading zeros
+#	      (binary to ascii)
+# Returns:
+#	string, is the converted piece
+def convert_piece(job):
+	from_what, to_what, piece, final, keep_spaces, add_zeros = job
+	if from_what == 'hex' and to_what == 'ascii':
+		return piece # pieces that were already converted while splitting
+	return convert_text(from_what, to_what, piece, final, keep_spaces, add_zeros)
+
+# Convert a source file to a destination file in bounded blocks, so that memory use
+# stays flat however large the source is. Blocks are only cut where the conversion
+# allows (between words, or on byte boundaries), and the output is the same as the
+# one written by the conversion's own function. It is written to a '.part' file next
+# to the destination and only renamed into place once the whole source converted.
+# Sources that fit in a single block, and conversions that need the whole source at
+# once (hexlified text converted to anything but ascii), aren't streamed.
+# Either end can also be a pipe ('-'): standard input is read as data arrives, and
+# standard output is written and flushed a block at a time. Piped sources are always
+# streamed, and any that need to be converted whole are read whole first.
+# With more than one job, blocks are converted by a pool of processes, a few blocks
+# ahead of the one being written, and written in order as they're done. Questions are
+# still asked (and answered) here, before the block that raises them is handed out.
+# A resumable conversion saves a checkpoint every CHECKPOINT_SECONDS: how many pieces
+# of the source have been written, how much of the '.part' file they filled, and what
+# carries over to the next piece. The '.part' file and checkpoint are kept if the
+# conversion is stopped, and running it again picks up from the checkpoint (as long as
+# the source hasn't changed), skipping the pieces that were already converted.
+# Parameters:
+#	from_what - string, is the format to convert from
+#	to_what - string, is the format to convert to
+#	src - string, represents source file to be converted, or '-' for standard input
+#	dst - string, represents destination file to write converted data to, or '-' for
+#	      standard output
+#	block_size - int, is the number of characters to read at a time
+#	answer - string, is the answer to any question the conversion asks (None to ask)
+#	jobs - int, is the number of processes converting blocks
+#	resume - boolean, True to save checkpoints and carry on from the last one
+# Returns:
+#	boolean, False if the conversion wasn't streamed and should be run normally
+def stream_convert(from_what, to_what, src, dst, block_size=STREAM_BLOCK_SIZE, answer=None, jobs=1, resume=False):
+	# records are already converted a slice at a time from a memory map (see convert_record)
+	if src <> '-' and from_what == 'hex' and to_what in ('bin', 'inv') and not re.search('.txt', src):
+		return False
+	# packed binary files are a ninth of the size of their text, so they're converted whole
+	if src <> '-' and from_what == 'bin' and is_packed(src):
+		return False
+
+	log = sys.stdout # where messages are shown
+	if dst == '-':
+		log = sys.stderr
+	block_size = max(block_size, STREAM_MIN_BLOCK_SIZE)
+	try:
+		if src == '-':
+			src_file = os.fdopen(os.dup(sys.stdin.fileno()), 'r')
+			blocks = decompress_blocks(read_pipe_blocks(src_file, block_size))
+		else:
+			src_file = open_source(src)
+			blocks = read_blocks(src_file, block_size)
+	except (IOError, OSError), WindowsError:
+		if from_what == 'bin' and to_what == 'inv':
+			print >>log, '\n***ERROR: Couldn\'t open', src, 'while inverting binary.'
+		elif to_what == 'inv':
+			print >>log, '\n***ERROR: Couldn\'t open', src, 'while converting hex to binary.'
+		else:
+			print >>log, '\n***ERROR: Couldn\'t open', src, 'while converting %s to %s.' % (FORMAT_NAMES[from_what], FORMAT_NAMES[to_what])
+		sys.exit(1)
+
+	# a piped source is converted as it arrives, so it isn't read ahead to find its size.
+	# A file that isn't streamed after all is read again whole, so what was read ahead
+	# isn't counted twice.
+	if METRICS is not None:
+		bytes_in = METRICS['bytes_in']
+		blocks = metered_blocks(blocks)
+	first = next(blocks, '')
+	if src == '-':
+		if from_what == 'bin' and first[:len(PACKED_MAGIC)] == PACKED_MAGIC:
+			# packed binary can only be unpacked whole, which it's small enough to be
+			first = unpack_bin(first + ''.join(blocks))
+			blocks = iter(())
+		blocks = itertools.chain([first], blocks)
+	else:
+		second = next(blocks, '')
+		blocks = itertools.chain([first, second], blocks)
+	if src <> '-' and dst <> '-' and not second or (from_what, to_what) not in STREAM_SPLITS:
+		src_file.close()
+		if METRICS is not None:
+			METRICS['bytes_in'] = bytes_in
+		return False
+	split = STREAM_SPLITS[(from_what, to_what)]
+	sep = ' ' # written between converted pieces
+	skip = 0 # characters dropped from the start of the output
+	keep_spaces = True
+	add_zeros = '0'
+
+	# Set up the conversion the same way its own function does. Hex sources are checked
+	# from a sample of the file, and ones that would be hexlified first are only streamed
+	# to ascii, which gives back the source as it was.
+	if src == '-': # a pipe can only be sampled from the start
+		hexlify = from_what == 'hex' and classify_sample(sample_text(first))[0] == 'raw'
+	else:
+		hexlify = from_what == 'hex' and classify_sample(sample_file(src))[0] == 'raw'
+	if hexlify and to_what <> 'ascii':
+		if src <> '-':
+			src_file.close()
+			if METRICS is not None:
+				METRICS['bytes_in'] = bytes_in
+			return False
+		# the hexlified text is one long word, so it's converted whole
+		blocks = [binascii.hexlify(''.join(blocks))]
+	elif from_what == 'hex' and to_what == 'ascii':
+		sep = ''
+		if hexlify:
+			split = 'char'
+		else:
+			blocks = (block.replace(' ', '') for block in strip_marker(blocks, '0x'))
+	elif from_what == 'bin' and to_what == 'ascii':
+		blocks = strip_marker(blocks, '0b')
+		sep = ''
+		skip = 1
+	elif from_what == 'bin' and to_what == 'inv':
+		# bits are padded at the front to whole bytes, so count them before converting
+		bits = 0
+		if src == '-': # a pipe can only be read once, so it's read whole
+			blocks = [''.join(blocks)]
+			bits = len(blocks[0]) - blocks[0].count(' ')
+		else:
+			count_file = open_source(src)
+			for block in read_blocks(count_file, block_size):
+				bits += len(block) - block.count(' ')
+			count_file.close()
+		sep = ''
+		if dst <> '-' and not re.search('.txt', dst):
+			dst += '.txt'
+
+	pieces = split_blocks(blocks, split)
+	if from_what == 'hex' and to_what == 'ascii' and split == 'pair':
+		pieces = ((ascii_text, False) for ascii_text in unhexlify_pieces(pieces))
+
+	started = False
+	written = False
+	asked = False
+	held = '' # the last character of dec to ascii output may combine with the next piece
+	done = 0 # pieces written so far
+	checkpoint = None
+	if dst == '-':
+		part = None
+		out = sys.stdout
+	else:
+		part = dst + '.part'
+		if resume and src <> '-':
+			checkpoint = dst + '.checkpoint'
+			signature = checkpoint_signature(from_what, to_what, src, block_size)
+			state = read_checkpoint(checkpoint, signature, part)
+		if checkpoint and state:
+			# carry on from where the last run stopped
+			out = open(part, 'r+')
+			out.seek(state['output'])
+			out.truncate()
+			done = state['pieces']
+			keep_spaces, add_zeros, sep, skip = state['keep_spaces'], state['add_zeros'], state['sep'], state['skip']
+			started, written, asked, held = state['started'], state['written'], state['asked'], state['held']
+			print >>log, '\n...Resuming from a checkpoint (%d pieces already converted)...' % (done)
+		else:
+			out = open_output(part, False, compression_of(dst))
+		saved = time.time()
+
+	# pieces that were already converted while splitting aren't worth handing out
+	pool = None
+	if jobs > 1 and not (from_what == 'hex' and to_what == 'ascii'):
+		pool = multiprocessing.Pool(jobs)
+	pending = collections.deque() # converted pieces (or pieces being converted) not yet written
+	count = 0 # pieces read so far
+	try:
+		for piece, final in pieces:
+			# pieces written before a checkpoint are split off again, but not converted
+			count += 1
+			if count <= done:
+				continue
+
+			# decimal sources ask about spaces before converting, as dec_to_bin and the others do
+			if not asked and from_what == 'dec':
+				asked = True
+				keep_spaces = False
+				if not final or re.search('\s', piece):
+					use_spaces = answer
+					if answer is None:
+						use_spaces = raw_input('\n***Spaces detected in input.\n   Would you like to preserve spaces in conversion? (yes/no) ')
+					keep_spaces = re.search('Y', use_spaces.upper()) is not None
+				if not keep_spaces:
+					sep = ''
+				if to_what == 'ascii' and final and len(piece) > 3 and not re.search('\s', piece):
+					raise InvalidDataError('\n***ERROR: Invalid input format. Enter decimal values delimited by spaces.')
+
+			# binary to ascii asks about leading zeros before the first piece that needs them
+			if from_what == 'bin' and to_what == 'ascii' and add_zeros == '0' and has_partial_byte(piece, final):
+				add_zeros = answer
+				if answer is None:
+					add_zeros = raw_input('\n***Input data does not divide evenly into bytes. Would you like to add leading \n   zeros? (y, n) ')
+
+			# convert the piece, or hand it to the pool and write the pieces that are done
+			job = (from_what, to_what, piece, final, keep_spaces, add_zeros)
+			if pool:
+				pending.append(pool.apply_async(convert_piece, (job,)))
+			else:
+				pending.append(convert_piece(job))
+			while pending and (len(pending) > 2 * jobs or final or not pool):
+				text = pending.popleft()
+				if pool:
+					text = text.get()
+				if from_what == 'dec' and to_what == 'ascii':
+					# '|' followed by '~' is read as a placeholder for a space, even across pieces
+					if held and text[:1] == '~':
+						held, text = '', ' ' + text[1:]
+					text, held = held + text, ''
+					if not sep and text[-1:] == '|':
+						text, held = text[:-1], '|'
+
+				# write the converted piece
+				if not started:
+					if part:
+						print '\n...Writing file...'
+					if from_what == 'bin' and to_what == 'inv':
+						text = '1' * (-bits % 8) + text # inverted zeros padding the bits out to whole bytes
+					started = True
+				if skip:
+					text, skip = text[skip:], skip - len(text[:skip])
+				if text:
+					if METRICS is not None:
+						start = time.time()
+						METRICS['bytes_out'] += len(text) + len(sep) * written
+					if written and sep:
+						out.write(sep)
+					out.write(text)
+					written = True
+					if not part:
+						out.flush()
+					if METRICS is not None:
+						metrics_time('write', start)
+				done += 1
+				if checkpoint and time.time() - saved >= CHECKPOINT_SECONDS:
+					save_checkpoint(checkpoint, signature, out, {
+						'pieces': done, 'keep_spaces': keep_spaces, 'add_zeros': add_zeros, 'sep': sep,
+						'skip': skip, 'started': started, 'written': written, 'asked': asked, 'held': held,
+					})
+					saved = time.time()
+		out.write(held)
+	except ConversionError, e:
+		src_file.close()
+		if part:
+			out.close()
+			os.remove(part)
+			if checkpoint and os.path.exists(checkpoint):
+				os.remove(checkpoint)
+		if src == '-' or dst == '-': # a pipe's error is reported (and exited on) by pipe_convert
+			raise
+		print >>log, e
+		if from_what == 'bin' and to_what == 'inv':
+			sys.exit(1)
+		return True
+	except:
+		src_file.close()
+		if part:
+			out.close()
+			# a resumable conversion that was stopped keeps what it wrote up to its checkpoint
+			if not checkpoint:
+				os.remove(part)
+		raise
+	finally:
+		if pool:
+			pool.terminate()
+			pool.join()
+	src_file.close()
+	if not part:
+		out.flush()
+		return True
+	out.close()
+	if os.path.exists(dst):
+		os.remove(dst)
+	os.rename(part, dst)
+	if checkpoint and os.path.exists(checkpoint):
+		os.remove(checkpoint)
+	print '\nFile ' + dst + ' saved to ' + os.getcwd() + '.'
+	return True
+
+# Words between the offsets kept in a word index (see build_word_index). Finding word k
+# reads the offset of word k - k % WORD_INDEX_STRIDE and skips the rest, so the index
+# stays small and a lookup never reads more than this many words.
+WORD_INDEX_STRIDE = 1024
+WORD_INDEX_SUFFIX = '.idx' # an index is saved beside its source, e.g. data.txt.idx
+WORD_INDEX_ENTRY = struct.Struct('<Q') # each offset is saved as 8 little-endian bytes
+
+# Skip a number of words of a memory mapped source, along with the whitespace after each.
+# Words are runs of characters between whitespace.
+# Parameters:
+#	src_map - mmap, is the source
+#	pos - int, is the offset of a word
+#	count - int, is the number of words to skip (at most WORD_INDEX_STRIDE)
+#	end - int, is the offset the source's last word ends at
+# Returns:
+#	int, is the offset of the word count words after the one at pos, or end if there
+#	are fewer words left than that
+def skip_words(src_map, pos, count, end):
+	if not count:
+		return pos
+	match = re.compile('(?:\S+\s+){%d}' % (count)).match(src_map, pos, end)
+	if match is None:
+		return end
+	return match.end()
+
+# Index the words of a source file in a single pass, saving the byte offset of every
+# WORD_INDEX_STRIDE-th word so that any word can be found without reading the words
+# before it (see read_word_range). The index file starts with a line of JSON describing
+# the source, followed by the offsets.
+# Parameters:
+#	src - string, represents the source file
+#	index - string, is the file to save the index to (default: src + WORD_INDEX_SUFFIX)
+# Returns:
+#	dictionary, is the index's header: the source's size and modification time, the
+#	stride, the number of words, and the offset the last word ends at
+def build_word_index(src, index=None):
+	index = index or src + WORD_INDEX_SUFFIX
+	info = os.stat(src)
+	offsets = []
+	words = 0
+	end = 0
+	src_file = open(src, 'rb') # offsets are of bytes, so newlines aren't translated
+	try:
+		if info.st_size:
+			src_map = mmap.mmap(src_file.fileno(), 0, access=mmap.ACCESS_READ)
+			try:
+				end = len(src_map)
+				while end and src_map[end - 1].isspace():
+					end -= 1
+				pos = re.compile('\s*').match(src_map, 0, end).end()
+				while pos < end:
+					offsets.append(pos)
+					next_pos = skip_words(src_map, pos, WORD_INDEX_STRIDE, end)
+					if next_pos == end: # fewer than a stride of words are left
+						words += len(re.compile('\S+').findall(src_map, pos, end))
+						break
+					pos = next_pos
+					words += WORD_INDEX_STRIDE
+			finally:
+				src_map.close()
+	finally:
+		src_file.close()
+	header = {'size': info.st_size, 'mtime': info.st_mtime, 'stride': WORD_INDEX_STRIDE, 'words': words, 'end': end}
+	index_file = open(index, 'wb')
+	try:
+		index_file.write(json.dumps(header) + '\n')
+		index_file.write(struct.pack('<%dQ' % (len(offsets)), *offsets))
+	finally:
+		index_file.close()
+	return header
+
+# Read the header of a source file's word index, if it has one that's up to date
+# Parameters:
+#	src - string, represents the source file
+#	index_file - file, is the open index
+# Returns:
+#	dictionary, is the index's header (see build_word_index), or None if the source
+#	has changed since it was indexed
+def read_word_index(src, index_file):
+	try:
+		header = json.loads(index_file.readline())
+	except ValueError:
+		return None
+	info = os.stat(src)
+	if header.get('size') <> info.st_size or header.get('mtime') <> info.st_mtime or header.get('stride') <> WORD_INDEX_STRIDE:
+		return None
+	return header
+
+# Find the byte offset of a word of a source file using its index
+# Parameters:
+#	src_map - mmap, is the source
+#	index_file - file, is the open index, positioned just after its header
+#	header - dictionary, is the index's header
+#	word - int, is the number of the word (0 for the first)
+# Returns:
+#	int, is the offset of the word, or the offset the last word ends at if there
+#	are no more than word words
+def word_offset(src_map, index_file, header, word):
+	if word >= header['words']:
+		return header['end']
+	index_file.seek(header['base'] + WORD_INDEX_ENTRY.size * (word // header['stride']))
+	pos = WORD_INDEX_ENTRY.unpack(index_file.read(WORD_INDEX_ENTRY.size))[0]
+	return skip_words(src_map, pos, word % header['stride'], header['end'])
+
+# Read a range of words from a source file, without reading the words before it. The
+# source is indexed first if it has no index, or has changed since it was indexed.
+# Parameters:
+#	src - string, represents the source file
+#	offset - int, is the number of the first word to read (0 for the first word)
+#	count - int, is the number of words to read (None to read to the end)
+#	index - string, is the source's index file (default: src + WORD_INDEX_SUFFIX)
+# Returns:
+#	string, is the words, with the whitespace between them, as it would be read
+#	from the file as text
+def read_word_range(src, offset, count=None, index=None):
+	index = index or src + WORD_INDEX_SUFFIX
+	header = None
+	if os.path.exists(index):
+		index_file = open(index, 'rb')
+		header = read_word_index(src, index_file)
+		if header is None:
+			index_file.close()
+	if header is None:
+		build_word_index(src, index)
+		index_file = open(index, 'rb')
+		header = read_word_index(src, index_file)
+	try:
+		header['base'] = index_file.tell()
+		if not header['words'] or offset >= header['words']:
+			return ''
+		src_file = open(src, 'rb')
+		try:
+			src_map = mmap.mmap(src_file.fileno(), 0, access=mmap.ACCESS_READ)
+			try:
+				start = word_offset(src_map, index_file, header, offset)
+				if count is None:
+					stop = header['end']
+				else:
+					stop = word_offset(src_map, index_file, header, offset + count)
+				text = src_map[start:stop].rstrip()
+			finally:
+				src_map.close()
+		finally:
+			src_file.close()
+	finally:
+		index_file.close()
+	return text.replace('\r\n', '\n').replace('\r', '\n') # as reading in universal newline mode would
+
+# Convert a range of words of a source file (see read_word_range), taking time that
+# depends on the size of the range rather than of the file
+# Parameters:
+#	from_what - string, is the original data format
+#	to_what - string, is the format to convert to
+#	src - string, represents source file to be converted
+#	dst - string, represents destination to write converted data to
+#	options - dictionary, is the options given with the conversion ('offset' and 'count')
+# Returns:
+#	string, is the converted words if dst is '--tmp', otherwise nothing
+def range_convert(from_what, to_what, src, dst, options):
+	if not src or src == '-':
+		print '\n***ERROR: A range of words can only be converted from a source file.'
+		return
+	if from_what == 'ascii':
+		print '\n***ERROR: Cannot convert a range of ascii words. Spaces in ascii data are characters, not delimiters.'
+		return
+	try:
+		offset = int(options.get('offset') or 0)
+		count = None
+		if options.get('count'):
+			count = int(options['count'])
+		if offset < 0 or (count is not None and count < 0):
+			raise ValueError
+	except ValueError:
+		print '\n***ERROR: Invalid range \'--offset=%s --count=%s\'. Enter the number of the first word (0 for the first) and the number of words.' % (options.get('offset', ''), options.get('count', ''))
+		return
+	keep_spaces = 'n' not in (options.get('answer') or 'yes').lower()
+	try:
+		if from_what == 'bin' and is_packed(src) or compression_of(src, True): # these have no text to index, so they're read whole
+			words = read_source(src, from_what).split()
+			src_text = ' '.join(words[offset:] if count is None else words[offset:offset + count])
+		else:
+			src_text = read_word_range(src, offset, count)
+		dst_text = translate(src_text, from_what, to_what, keep_spaces)
+	except (IOError, OSError):
+		print '\n***ERROR: Couldn\'t open', src, 'while converting a range of words.'
+		return
+	except ConversionError, e:
+		print e
+		return
+	if dst == '--tmp':
+		return dst_text
+	elif dst == '--s':
+		print '\n' + dst_text
+	else:
+		print '\n...Writing file...'
+		write_output(dst, dst_text)
+		print '\nFile ' + dst + ' saved to ' + os.getcwd() + '.'
+
 if __name__ == '__main__':
   main()
\ No newline at end of file
@@ -0,0 +1,307 @@
+############################################################################
+#	Data Format Translator Benchmark
+#
+#	Times every conversion in Data_Format_Translator.py (each from/to pair,
+#	plus inverting hex and binary) on generated data of increasing size,
+#	with the data both spaced into words and run together as one long word.
+#	For each conversion and size it records the throughput (MB/s) and the
+#	peak memory of the process, and for each conversion the scaling exponent
+#	(k where time grows as size ** k, so 1.0 is linear).
+#
+#	Usage:
+#	  <program name> [--sizes=1K,64K,1M] [--repeat=N] [--max-seconds=S]
+#	                 [--only=from-to,...] [--save=results.json]
+#	                 [--compare=baseline.json] [--tolerance=0.25]
+#	--sizes        sizes of the generated data, in characters (K, M, and G
+#	               suffixes are allowed, up to 1G)
+#	--repeat       times each case is run, the fastest of which is kept
+#	--max-seconds  a conversion that takes longer than this at one size isn't
+#	               run at larger sizes
+#	--only         run only these conversions (e.g. hex-bin,bin-inv)
+#	--save         write the results as JSON, to be used as a baseline later
+#	--compare      compare the results with a baseline saved before, and exit
+#	               with status 1 if any case has slowed down by more than
+#	               --tolerance (a fraction of the baseline's throughput).
+#	               Timings under MIN_COMPARE_SECONDS are too noisy to compare.
+#
+#	Every case runs in a fresh process, so peak memory is measured per case.
+#	The same seed generates the same data every run.
+############################################################################
+
+import sys
+import time
+import math
+import json
+import random
+import binascii
+import platform
+import multiprocessing
+try:
+	import resource
+except ImportError: # not on Windows, where peak memory isn't measured
+	resource = None
+
+import Data_Format_Translator as translator
+
+SIZES = '1K,16K,256K,4M'
+REPEAT = 3
+MAX_SECONDS = 10.0
+TOLERANCE = 0.25
+MIN_COMPARE_SECONDS = 0.01 # timings shorter than this are too noisy to compare
+SEED = 2012
+BLOCK_SIZE = 1 << 16 # generated data repeats a random block of this many characters
+SIZE_SUFFIXES = {'K': 1 << 10, 'M': 1 << 20, 'G': 1 << 30}
+MAX_SIZE = 1 << 30
+BENCHMARK_OPTIONS = ('sizes', 'repeat', 'max-seconds', 'only', 'save', 'compare', 'tolerance')
+
+# Variants of the generated data for each source format
+#	spaced - words of one byte (value) each, separated by spaces
+#	unspaced - one word as long as the data
+#	text - ascii text with spaces between words
+VARIANTS = {
+	'hex': ('spaced', 'unspaced'),
+	'bin': ('spaced', 'unspaced'),
+	'dec': ('spaced', 'unspaced'),
+	'ascii': ('text',),
+}
+
+# Cases that can't be run, as the translator only reads them as an error
+UNSUPPORTED_CASES = (('dec', 'ascii', 'unspaced'),)
+
+# Main method that runs the benchmark
+# Parameters: (none)
+# Returns: (none)
+def main():
+	options = parse_options(sys.argv[1:])
+	try:
+		sizes = [parse_size(size) for size in options.get('sizes', SIZES).split(',')]
+		repeat = int(options.get('repeat', REPEAT))
+		max_seconds = float(options.get('max-seconds', MAX_SECONDS))
+		tolerance = float(options.get('tolerance', TOLERANCE))
+	except ValueError, e:
+		print '\n***ERROR: %s' % (e)
+		sys.exit(1)
+
+	cases = benchmark_cases(options.get('only'))
+	if not cases:
+		print '\n***ERROR: No conversions match \'%s\'.' % (options['only'])
+		sys.exit(1)
+	results = run_benchmark(cases, sorted(sizes), repeat, max_seconds)
+
+	if 'save' in options:
+		save_file = open(options['save'], 'w')
+		json.dump(results, save_file, indent=1, sort_keys=True)
+		save_file.close()
+		print '\nResults saved to', options['save']
+	if 'compare' in options:
+		try:
+			baseline_file = open(options['compare'], 'rU')
+			baseline = json.load(baseline_file)
+			baseline_file.close()
+		except (IOError, ValueError):
+			print '\n***ERROR: Couldn\'t read baseline', options['compare']
+			sys.exit(1)
+		if compare_results(baseline, results, tolerance):
+			sys.exit(1)
+
+# Read the options given to the benchmark, written as '--name=value'
+# Parameters:
+#	args - list of strings, is the command line arguments
+# Returns:
+#	options - dictionary, maps each option name to its value
+def parse_options(args):
+	options = {}
+	for arg in args:
+		name, eq, value = arg[2:].partition('=')
+		if arg[:2] <> '--' or name not in BENCHMARK_OPTIONS or not value:
+			print '\n***ERROR: Invalid option \'%s\'. Options are: %s' % (arg, ', '.join('--%s=' % (name) for name in BENCHMARK_OPTIONS))
+			sys.exit(1)
+		options[name] = value
+	return options
+
+# Read a size such as '64K' or '1G'
+# Parameters:
+#	size - string, is a number of characters, optionally followed by K, M, or G
+# Returns:
+#	int, is the number of characters
+def parse_size(size):
+	number = size.strip().upper()
+	scale = SIZE_SUFFIXES.get(number[-1:], 1)
+	if number[-1:] in SIZE_SUFFIXES:
+		number = number[:-1]
+	if not number.isdigit() or not 0 < int(number) * scale <= MAX_SIZE:
+		raise ValueError('Invalid size \'%s\'. Enter sizes from 1 to 1G.' % (size))
+	return int(number) * scale
+
+# List the cases to run: every conversion with every variant of its source data
+# Parameters:
+#	only - string, is the conversions to run (e.g. 'hex-bin,bin-inv'), or None for all
+# Returns:
+#	list of tuples, is the from format, to format, and variant of each case
+def benchmark_cases(only=None):
+	pairs = sorted(translator.CONVERSIONS)
+	if only:
+		wanted = set(tuple(pair.split('-', 1)) for pair in only.split(','))
+		pairs = [pair for pair in pairs if pair in wanted]
+	return [(from_fmt, to_fmt, variant) for from_fmt, to_fmt in pairs for variant in VARIANTS[from_fmt]
+		if (from_fmt, to_fmt, variant) not in UNSUPPORTED_CASES]
+
+# Generate a block of random data in a format, to be repeated out to any size
+# Parameters:
+#	fmt - string, is the format of the data
+#	variant - string, is the variant of the data (see VARIANTS)
+#	rand - Random, is the random number generator to use
+# Returns:
+#	string, is the block, which ends with a space if its words are spaced
+def generate_block(fmt, variant, rand):
+	values = [rand.randrange(256) for i in xrange(BLOCK_SIZE // 2)]
+	if fmt == 'ascii':
+		letters = 'abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789.,;:!?-    '
+		return ''.join(letters[value % len(letters)] for value in values)[:BLOCK_SIZE]
+	if fmt == 'hex':
+		words = [binascii.hexlify(chr(value)).upper() for value in values]
+	elif fmt == 'bin':
+		words = [translator.CHAR_BINS[chr(value)] for value in values]
+	else:
+		words = [str(value) for value in values]
+		if variant == 'unspaced':
+			words[0] = str(rand.randrange(1, 10)) # a long decimal number doesn't start with 0
+	if variant == 'unspaced':
+		return ''.join(words)[:BLOCK_SIZE]
+	block = ''
+	for word in words: # whole words only, each followed by a space
+		if len(block) + len(word) + 1 > BLOCK_SIZE:
+			break
+		block += word + ' '
+	return block
+
+# Generate data of a size in a format, by repeating a random block
+# Parameters:
+#	fmt - string, is the format of the data
+#	variant - string, is the variant of the data (see VARIANTS)
+#	size - int, is the number of characters to generate
+# Returns:
+#	string, is the data
+def generate_data(fmt, variant, size):
+	block = generate_block(fmt, variant, random.Random('%d %s %s' % (SEED, fmt, variant)))
+	data = block * (size // len(block) + 1)
+	if variant == 'spaced' and data[size:size + 1] <> ' ': # no partial last word
+		size = max(data.rfind(' ', 0, size), data.find(' '))
+	return data[:size].rstrip(' ')
+
+# Time one case at one size. This runs in its own process, so that the peak memory
+# measured is the case's own.
+# Parameters:
+#	case - tuple, is the from format, to format, variant, size, and times to repeat
+# Returns:
+#	dictionary, is the size, fastest time, throughput, and peak memory of the case,
+#	or the error the conversion raised
+def time_case(case):
+	from_fmt, to_fmt, variant, size, repeat = case
+	data = generate_data(from_fmt, variant, size)
+	best = None
+	try:
+		for i in xrange(repeat):
+			start = time.time()
+			translator.translate(data, from_fmt, to_fmt)
+			elapsed = time.time() - start
+			best = elapsed if best is None else min(best, elapsed)
+	except translator.ConversionError, e:
+		return {'size': len(data), 'error': str(e).strip().lstrip('*')}
+	result = {'size': len(data), 'seconds': best, 'mb_per_s': len(data) / float(1 << 20) / max(best, 1e-9), 'peak_mb': None}
+	if resource:
+		peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+		if sys.platform <> 'darwin': # Linux reports kilobytes, macOS bytes
+			peak *= 1024
+		result['peak_mb'] = peak / float(1 << 20)
+	return result
+
+# Find how time grows with size, as the slope of log time against log size
+# Parameters:
+#	timings - list of dictionaries, is the results of one case at each size
+# Returns:
+#	float, is the scaling exponent, or None with fewer than two sizes timed
+def scaling_exponent(timings):
+	points = [(math.log(timing['size']), math.log(max(timing['seconds'], 1e-9))) for timing in timings if 'seconds' in timing]
+	if len(points) < 2:
+		return None
+	mean_x = sum(x for x, y in points) / len(points)
+	mean_y = sum(y for x, y in points) / len(points)
+	spread = sum((x - mean_x) ** 2 for x, y in points)
+	if not spread:
+		return None
+	return sum((x - mean_x) * (y - mean_y) for x, y in points) / spread
+
+# Run every case at every size, printing each result as it's timed
+# Parameters:
+#	cases - list of tuples, is the cases to run (see benchmark_cases)
+#	sizes - list of ints, is the sizes to run them at, smallest first
+#	repeat - int, is the times each case is run at each size
+#	max_seconds - float, is the time after which a case isn't run at larger sizes
+# Returns:
+#	dictionary, is the environment, the results of each case by size, and the
+#	scaling exponent of each case
+def run_benchmark(cases, sizes, repeat, max_seconds):
+	results = {
+		'python': platform.python_version(),
+		'platform': platform.platform(),
+		'numpy': translator.numpy is not None,
+		'repeat': repeat,
+		'cases': {},
+	}
+	print '\n%-24s %10s %10s %10s %9s' % ('case', 'size', 'seconds', 'MB/s', 'peak MB')
+	for from_fmt, to_fmt, variant in cases:
+		name = '%s-%s/%s' % (from_fmt, to_fmt, variant)
+		timings = []
+		for size in sizes:
+			# a fresh process for each case, so that memory used by one isn't counted in the next
+			pool = multiprocessing.Pool(1)
+			try:
+				timing = pool.apply(time_case, ((from_fmt, to_fmt, variant, size, repeat),))
+			finally:
+				pool.terminate()
+				pool.join()
+			timings.append(timing)
+			if 'error' in timing:
+				print '%-24s %10d   ***ERROR: %s' % (name, timing['size'], timing['error'].splitlines()[0])
+				break
+			peak = '%9.1f' % (timing['peak_mb']) if timing['peak_mb'] is not None else '%9s' % ('-')
+			print '%-24s %10d %10.4f %10.2f %s' % (name, timing['size'], timing['seconds'], timing['mb_per_s'], peak)
+			if timing['seconds'] > max_seconds:
+				print '%-24s %10s   (too slow to run at larger sizes)' % (name, '')
+				break
+		exponent = scaling_exponent(timings)
+		results['cases'][name] = {'timings': timings, 'exponent': exponent}
+		if exponent is not None:
+			print '%-24s %10s   scaling exponent %.2f' % (name, '', exponent)
+	return results
+
+# Compare results with a baseline, printing every case that has slowed down
+# Parameters:
+#	baseline - dictionary, is results saved by an earlier run
+#	results - dictionary, is the results of this run
+#	tolerance - float, is the fraction of its baseline throughput a case may lose
+# Returns:
+#	boolean, True if any case has regressed
+def compare_results(baseline, results, tolerance):
+	regressions = []
+	compared = 0
+	for name, case in sorted(results['cases'].items()):
+		before = dict((timing['size'], timing) for timing in baseline.get('cases', {}).get(name, {}).get('timings', []) if 'mb_per_s' in timing)
+		for timing in case['timings']:
+			if 'mb_per_s' not in timing or timing['size'] not in before or timing['seconds'] < MIN_COMPARE_SECONDS:
+				continue
+			compared += 1
+			ratio = timing['mb_per_s'] / max(before[timing['size']]['mb_per_s'], 1e-9)
+			if ratio < 1 - tolerance:
+				regressions.append((name, timing['size'], before[timing['size']]['mb_per_s'], timing['mb_per_s'], ratio))
+
+	print '\nCompared %d timings with the baseline (tolerance %d%%).' % (compared, tolerance * 100)
+	for name, size, old, new, ratio in regressions:
+		print '  REGRESSION %-24s %10d  %10.2f -> %10.2f MB/s (%.0f%%)' % (name, size, old, new, ratio * 100)
+	if not regressions:
+		print '  No regressions.'
+	return len(regressions) > 0
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,495 @@
+############################################################################
+#	Data Format Translator Tests
+#
+#	Checks that changes to how Data_Format_Translator.py converts text keep
+#	its output the same:
+#	  - Streamed conversions (stream_convert) write the same file as the
+#	    conversion's own function does reading the whole source at once, for
+#	    every conversion that can be streamed and blocks of several sizes.
+#	    This is what checks how split_blocks and iter_word_spans cut sources.
+#	  - The *_text functions at the core of each conversion give the same
+#	    output (or fail the same way) as the original character loops they
+#	    replaced, which are kept here as OLD_CORES.
+#	It also checks that data makes the round trip through the other ways of
+#	reading and writing it: packed binary, compressed files and data, chains
+#	of stages, ranges of words, the result cache, format detection, and
+#	manifests of jobs.
+#
+#	Usage:
+#	  <program name> [-v]
+#
+#	Sources are generated from a fixed seed, so every run checks the same
+#	data.
+############################################################################
+
+import os
+import re
+import sys
+import bz2
+import time
+import random
+import shutil
+import tempfile
+import unittest
+import StringIO
+
+import Data_Format_Translator as translator
+
+SEED = 2012
+CASES = 40 # sources generated for each conversion
+BLOCK_SIZES = (8, 9, 16, 64) # characters read at a time by streamed conversions
+ANSWERS = ('yes', 'no', '') # answers to the questions conversions ask
+
+# Characters that make up each format's words, and the ones that make a word invalid
+WORD_CHARS = {
+	'hex': '0123456789abcdefABCDEF',
+	'bin': '01',
+	'dec': '0123456789',
+}
+INVALID_WORDS = {
+	'hex': ('zz', 'G1', '0x', '\t'),
+	'bin': ('2', '0b', '0000000a', '\t'),
+	'dec': ('1a', '-', '\t'),
+}
+WORD_LENGTHS = {
+	'hex': (1, 2, 2, 2, 3, 8, 17),
+	'bin': (1, 7, 8, 8, 8, 9, 16, 40),
+	'dec': (1, 2, 3),
+}
+ASCII_CHARS = 'abc XYZ|~09\n'
+
+# Generate the text of a source in a format: words of the format's characters, split
+# by spaces (sometimes more than one), sometimes ending in whitespace
+# Parameters:
+#	rand - Random, generates the source
+#	fmt - string, is the format of the source
+#	length - int, is about how many characters the source has
+#	invalid - bool, is whether some words may be invalid in the format
+# Returns:
+#	string, is the source text
+def generate_source(rand, fmt, length, invalid=False):
+	if fmt == 'ascii':
+		return ''.join(rand.choice(ASCII_CHARS) for i in range(length))
+	if fmt == 'dec' and rand.random() < 0.5: # values that are also ascii characters
+		return ' '.join(str(rand.choice((32, 65, 124, 126, 200))) for i in range(length // 3))
+	words = []
+	while sum(len(word) + 1 for word in words) < length:
+		if invalid and rand.random() < 0.02:
+			words.append(rand.choice(INVALID_WORDS[fmt]))
+		else:
+			words.append(''.join(rand.choice(WORD_CHARS[fmt]) for i in range(rand.choice(WORD_LENGTHS[fmt]))))
+		if rand.random() < 0.1:
+			words.append('') # two spaces in a row
+	text = ' '.join(words)
+	if rand.random() < 0.3:
+		text += rand.choice((' ', '\n', ' \n '))
+	return text
+
+# Make a word have a whole number of characters of size by adding leading zeros
+def pad_word(word, size):
+	while len(word) % size <> 0:
+		word = '0' + word
+	return word
+
+# Read the words of source text as the original conversions did: up to each space,
+# stopping once nothing but whitespace is left
+# Parameters:
+#	src_text - string, is the source text
+# Returns:
+#	list of strings, is the words, which are empty between consecutive spaces
+def old_words(src_text):
+	words = []
+	while re.search('\S', src_text):
+		i = 0
+		while i < len(src_text) and src_text[i] <> ' ':
+			i += 1
+		words.append(src_text[:i])
+		if i >= len(src_text):
+			break
+		src_text = src_text[i+1:]
+	return words
+
+# The original conversions, as the text each wrote to its destination file
+def old_hex_to_bin(src_text):
+	return ' '.join(pad_word(bin(int(word, 16))[2:], 8) for word in old_words(src_text) if word)
+
+def old_hex_to_dec(src_text):
+	dec_words = []
+	while re.search('\S', src_text):
+		src_text = src_text.lstrip(' ') # leading spaces are skipped before each word
+		word = src_text.split(' ', 1)[0]
+		dec_words.append(str(int(word, 16)))
+		src_text = src_text[len(word) + 1:]
+	return ' '.join(dec_words)
+
+def old_bin_to_hex(src_text):
+	return ' '.join(pad_word(hex(int(word, 2))[2:].replace('L', ''), 2) for word in old_words(src_text)).upper()
+
+def old_bin_to_dec(src_text):
+	return ' '.join(str(int(word, 2)) for word in old_words(src_text))
+
+def old_bin_to_ascii(src_text, add_zeros):
+	ascii_text = '' # '0b' markers are removed before this by bin_to_ascii
+	while re.search('\S', src_text):
+		i = 0
+		while i < 8 and i < len(src_text) and src_text[i] <> ' ':
+			i += 1
+		if i:
+			word = src_text[:i]
+			if add_zeros:
+				word = pad_word(word, 8)
+			ascii_text += chr(int(word, 2))
+		if i < len(src_text) and src_text[i] == ' ':
+			ascii_text += ' '
+			i += 1
+		if i >= len(src_text):
+			break
+		src_text = src_text[i:]
+	return ascii_text # bin_to_ascii writes this without its first character
+
+def old_dec_to(src_text, keep_spaces, convert):
+	text = ''.join(' ' + convert(int(word)) for word in old_words(src_text) if word)
+	if not keep_spaces:
+		text = text.replace(' ', '')
+	return text[1:] if text[:1] == ' ' else text
+
+def old_dec_to_bin(src_text, keep_spaces):
+	return old_dec_to(src_text, keep_spaces, lambda value: bin(value)[2:])
+
+def old_dec_to_hex(src_text, keep_spaces):
+	return old_dec_to(src_text, keep_spaces, lambda value: hex(value)[2:].replace('L', '')).upper()
+
+def old_dec_to_ascii(src_text, keep_spaces):
+	ascii_text = ''
+	for word in old_words(src_text):
+		if word and int(word) > 255:
+			raise ValueError('Cannot convert integers greater than 255 to ASCII.')
+		if word and int(word) == 32:
+			ascii_text += ' |~' # stands for a space until delimiting spaces are removed
+		elif word:
+			ascii_text += ' ' + chr(int(word))
+	if not keep_spaces:
+		ascii_text = ascii_text.replace(' ', '')
+	if ascii_text[:1] == ' ':
+		ascii_text = ascii_text[1:]
+	return ascii_text.replace('|~', ' ')
+
+def old_ascii_to_bin(src_text):
+	return ' '.join(pad_word(bin(ord(char))[2:], 8) for char in src_text)
+
+def old_ascii_to_dec(src_text):
+	return ' '.join(str(ord(char)) for char in src_text)
+
+def old_ascii_to_hex(src_text):
+	return ' '.join(pad_word(hex(ord(char))[2:], 2) for char in src_text).upper()
+
+# Original conversion and the core that replaced it, by the formats they convert from and
+# to, and the options the core is given (see TEXT_CONVERSIONS) in each run
+OLD_CORES = {
+	('hex', 'bin'): (old_hex_to_bin, ({},)),
+	('hex', 'dec'): (old_hex_to_dec, ({},)),
+	('bin', 'hex'): (old_bin_to_hex, ({},)),
+	('bin', 'dec'): (old_bin_to_dec, ({},)),
+	('bin', 'ascii'): (old_bin_to_ascii, ({'add_zeros': 'yes'}, {'add_zeros': ''})),
+	('dec', 'bin'): (old_dec_to_bin, ({'keep_spaces': True}, {'keep_spaces': False})),
+	('dec', 'hex'): (old_dec_to_hex, ({'keep_spaces': True}, {'keep_spaces': False})),
+	('dec', 'ascii'): (old_dec_to_ascii, ({'keep_spaces': True}, {'keep_spaces': False})),
+	('ascii', 'bin'): (old_ascii_to_bin, ({},)),
+	('ascii', 'dec'): (old_ascii_to_dec, ({},)),
+	('ascii', 'hex'): (old_ascii_to_hex, ({},)),
+}
+
+# Run a conversion, keeping what it prints
+# Parameters:
+#	function - function, is the conversion to run
+#	args - tuple, is the arguments to give it
+# Returns:
+#	tuple, is what the conversion returned (or the name of the exception it raised) and
+#	whether it raised one
+def run_quietly(function, *args):
+	stdout = sys.stdout
+	sys.stdout = StringIO.StringIO()
+	try:
+		return function(*args), False
+	except SystemExit:
+		return 'SystemExit', True
+	except (ValueError, TypeError), e:
+		return type(e).__name__, True
+	finally:
+		sys.stdout = stdout
+
+# Call a conversion's core or original function, as either's output or failure
+def call_core(function, src_text, options):
+	try:
+		return 'ok', function(src_text, **options)
+	except (ValueError, TypeError):
+		return 'failed', None
+
+class CoreTests(unittest.TestCase):
+	# Each core converts words the way the original character loop did
+	def test_cores_match_old_cores(self):
+		rand = random.Random(SEED)
+		for (from_fmt, to_fmt), (old_core, runs) in sorted(OLD_CORES.items()):
+			for case in range(CASES):
+				src_text = generate_source(rand, from_fmt, rand.choice((0, 1, 5, 40, 300)), case % 4 == 0)
+				for options in runs:
+					core = lambda text, **options: translator.convert_text(from_fmt, to_fmt, text, **options)
+					self.assertEqual(call_core(core, src_text, options), call_core(old_core, src_text, options),
+						'%s to %s of %r with %r' % (from_fmt, to_fmt, src_text, options))
+
+	# Splitting text into words scans it the way old_words does
+	def test_word_spans_match_old_words(self):
+		rand = random.Random(SEED)
+		for case in range(CASES):
+			src_text = generate_source(rand, rand.choice(('hex', 'bin', 'dec')), rand.choice((0, 1, 5, 40, 300)))
+			spans = translator.iter_word_spans(src_text)
+			self.assertEqual([src_text[start:stop] for start, stop in spans], old_words(src_text), repr(src_text))
+
+# Tests that read and write files, in a directory of their own
+class FileTests(unittest.TestCase):
+	def setUp(self):
+		self.cwd = os.getcwd()
+		self.dir = tempfile.mkdtemp()
+		os.chdir(self.dir)
+
+	def tearDown(self):
+		if 'raw_input' in vars(translator):
+			del translator.raw_input
+		os.chdir(self.cwd)
+		shutil.rmtree(self.dir)
+
+	def write_file(self, name, data):
+		out = open(name, 'wb')
+		out.write(data)
+		out.close()
+
+	def read_file(self, name):
+		src_file = open(name, 'rb')
+		try:
+			return src_file.read()
+		finally:
+			src_file.close()
+
+class StreamTests(FileTests):
+	def setUp(self):
+		FileTests.setUp(self)
+		self.min_block_size = translator.STREAM_MIN_BLOCK_SIZE
+		translator.STREAM_MIN_BLOCK_SIZE = 1 # so sources are cut into many small blocks
+
+	def tearDown(self):
+		translator.STREAM_MIN_BLOCK_SIZE = self.min_block_size
+		FileTests.tearDown(self)
+
+	# Convert a source whole with the conversion's own function and streamed, and return
+	# the file each wrote (None if it wrote nothing), and whether the stream was used
+	def convert_both(self, from_fmt, to_fmt, src, src_text, block_size, answer):
+		self.write_file(src, src_text)
+		outputs = []
+		translator.raw_input = lambda prompt='': answer # the whole conversion asks its questions
+		run_quietly(translator.CONVERSIONS[(from_fmt, to_fmt)], src, 'whole.txt', 0)
+		streamed, failed = run_quietly(translator.stream_convert, from_fmt, to_fmt, src, 'stream.txt', block_size, answer)
+		for dst in ('whole.txt', 'stream.txt'):
+			if os.path.exists(dst):
+				outputs.append(self.read_file(dst))
+				os.remove(dst)
+			else:
+				outputs.append(None)
+		os.remove(src)
+		return outputs[0], outputs[1], failed or streamed
+
+	# A streamed conversion writes the same file as converting the source whole
+	def test_stream_matches_whole(self):
+		rand = random.Random(SEED)
+		for from_fmt, to_fmt in sorted(translator.STREAM_SPLITS):
+			streamed = 0
+			for case in range(CASES):
+				src = 'src.txt'
+				src_text = generate_source(rand, from_fmt, rand.choice((50, 300, 2000)), case % 4 == 0)
+				if (from_fmt, to_fmt) == ('hex', 'bin') and case % 5 == 0: # a record, which is hexlified
+					src = 'src.ino'
+					src_text = ''.join(chr(rand.choice((0, 0, 1, 10, 13, 65, 255))) for i in range(300))
+				block_size = rand.choice(BLOCK_SIZES)
+				answer = rand.choice(ANSWERS)
+				whole, stream, was_streamed = self.convert_both(from_fmt, to_fmt, src, src_text, block_size, answer)
+				if not was_streamed:
+					continue
+				streamed += 1
+				self.assertEqual(whole, stream, '%s to %s of %r in blocks of %d, answering %r' % (from_fmt, to_fmt, src_text[:200], block_size, answer))
+			self.assertTrue(streamed, '%s to %s was never streamed' % (from_fmt, to_fmt))
+
+class PackedTests(FileTests):
+	# Packing and unpacking binary text gives back the text, with its spacing
+	def test_pack_round_trip(self):
+		rand = random.Random(SEED)
+		texts = ['', '1', '01000001', ' 0 1 ', '0101  1 000000001']
+		for case in range(CASES):
+			texts.append(generate_source(rand, 'bin', rand.choice((1, 40, 300, 2000))).rstrip())
+		for text in texts:
+			self.assertEqual(translator.unpack_bin(translator.pack_bin(text)), text, repr(text))
+
+	# One long unspaced run of bits, as convert_record writes, unpacks in one slice
+	def test_large_unspaced_run(self):
+		rand = random.Random(SEED)
+		bits = translator.bytes_to_bin(''.join(chr(rand.randrange(256)) for i in range(1 << 19)), '')[3:]
+		packed = translator.pack_bin(bits)
+		start = time.time()
+		self.assertEqual(translator.unpack_bin(packed), bits)
+		self.assertTrue(time.time() - start < 1.0, 'unpacking %d unspaced bits is slow' % (len(bits)))
+
+	# Damaged packed data is an error, not converted
+	def test_damaged_packed_data(self):
+		packed = translator.pack_bin('01000001 01000010')
+		for data in (packed[:-1], packed[:10], packed + '\x00'):
+			self.assertRaises(translator.InvalidDataError, translator.unpack_bin, data)
+
+	# Binary written to a .bin file is packed, and reads back as the same binary
+	def test_packed_file_round_trip(self):
+		self.write_file('src.txt', 'DE AD BE EF 01')
+		run_quietly(translator.hex_to_bin, 'src.txt', 'out.bin', 0)
+		self.assertEqual(self.read_file('out.bin')[:len(translator.PACKED_MAGIC)], translator.PACKED_MAGIC)
+		self.assertEqual(run_quietly(translator.bin_to_hex, 'out.bin', '--tmp', 0), ('DE AD BE EF 01', False))
+		self.assertEqual(translator.translate(self.read_file('out.bin'), 'bin', 'hex'), 'DE AD BE EF 01')
+
+	# Only binary sources are read as packed, whatever other sources start with
+	def test_only_binary_is_unpacked(self):
+		self.write_file('src.txt', translator.PACKED_MAGIC + 'hi')
+		self.assertEqual(run_quietly(translator.ascii_to_hex, 'src.txt', '--tmp', 0), ('89 42 4E 31 68 69', False))
+
+class CompressionTests(FileTests):
+	# Compressed sources convert the same as the text they hold, found by their
+	# extension or by the bytes they start with
+	def test_compressed_sources(self):
+		text = '48 65 6C 6C 6F\r\n20 77 6F 72 6C 64'
+		expected = run_quietly(translator.hex_to_dec, 0, '--tmp', text.replace('\r\n', '\n'))
+		for extension in sorted(translator.COMPRESSIONS):
+			if not translator.COMPRESSIONS[extension]: # its module isn't installed
+				continue
+			for name in ('src.txt' + extension, 'sniffed.txt'):
+				out = translator.open_output(name, True, extension)
+				out.write(text)
+				out.close()
+				self.assertEqual(translator.compression_of(name, True), extension)
+				self.assertEqual(run_quietly(translator.hex_to_dec, name, '--tmp', 0), expected, name)
+
+	# Converted text written to a compressed destination reads back the same
+	def test_compressed_destination(self):
+		self.write_file('src.txt', 'Hello')
+		run_quietly(translator.ascii_to_hex, 'src.txt', 'out.txt.bz2', 0)
+		self.assertEqual(bz2.decompress(self.read_file('out.txt.bz2')), '48 65 6C 6C 6F')
+
+	# translate decompresses compressed data, including streams written one after another
+	def test_translate_decompresses(self):
+		out = translator.open_output('data.gz', True)
+		out.write('48 65 6C 6C 6F')
+		out.close()
+		self.assertEqual(translator.translate(self.read_file('data.gz'), 'hex', 'dec'), '72 101 108 108 111')
+		self.assertEqual(translator.translate(bz2.compress('41 ') + bz2.compress('42'), 'hex', 'dec'), '65 66')
+		self.assertRaises(translator.InvalidDataError, translator.translate, bz2.compress('41')[:-4] + 'xxxx', 'hex', 'dec')
+
+class StageTests(unittest.TestCase):
+	# Each stage changes bytes as it should
+	def test_stages(self):
+		for formats, expected in (
+				(('0F', 'hex', 'inv', 'hex'), 'F0'),
+				(('01', 'hex', 'rev'), '80'),
+				(('0102', 'hex', 'swap16'), '02 01'),
+				(('01020304', 'hex', 'swap32'), '04 03 02 01'),
+				(('0F', 'hex', 'xor:FF'), 'F0'),
+				(('81', 'hex', 'rol:1'), '03'),
+				(('03', 'hex', 'ror:1'), '81'),
+				(('hi', 'ascii', 'bin'), '01101000 01101001')):
+			self.assertEqual(translator.translate_chain(*formats), expected, repr(formats))
+
+	# A stage followed by its inverse gives back the data, however it's cut into blocks
+	def test_stage_round_trips(self):
+		rand = random.Random(SEED)
+		data = ' '.join('%02X' % (rand.randrange(256)) for i in range(5000))
+		for stages in (('inv', 'inv'), ('rev', 'rev'), ('swap16', 'swap16'), ('swap64', 'swap64'),
+				('xor:DEADBEEF01', 'xor:DEADBEEF01'), ('rol:3', 'ror:3'), ('rev', 'inv', 'rev', 'inv')):
+			self.assertEqual(translator.translate_chain(data, 'hex', *stages), data, repr(stages))
+		self.assertEqual(translator.translate_chain(translator.translate_chain(data, 'hex', 'bin'), 'bin', 'hex'), data)
+
+	# Unknown stages and formats are errors
+	def test_unknown_stage(self):
+		self.assertRaises(translator.UnsupportedConversionError, translator.translate_chain, '0F', 'hex', 'nope')
+
+class RangeTests(FileTests):
+	# A range of words converts the same as the same words of the whole source, before
+	# and after the source is indexed, and after it changes
+	def test_range_matches_whole(self):
+		rand = random.Random(SEED)
+		words = ['%X' % (rand.randrange(1 << 16)) for i in range(3 * translator.WORD_INDEX_STRIDE)]
+		for name in ('src.txt', 'src.txt.gz'):
+			for change in range(2):
+				out = translator.open_output(name)
+				out.write(' '.join(words) + '\n')
+				out.close()
+				for offset, count in ((0, 1), (5, 10), (translator.WORD_INDEX_STRIDE - 1, 3), (2500, None), (len(words) - 1, 5), (len(words), 2)):
+					options = {'offset': str(offset), 'count': '' if count is None else str(count)}
+					expected = translator.translate(' '.join(words[offset:] if count is None else words[offset:offset + count]), 'hex', 'dec')
+					converted = run_quietly(translator.range_convert, 'hex', 'dec', name, '--tmp', options)
+					self.assertEqual(converted, (expected, False), '%s words %d to %r' % (name, offset, count))
+				words[7] = 'FFFF' # the source changes, so it's indexed again
+
+	# A range can't start before the first word
+	def test_invalid_range(self):
+		self.write_file('src.txt', '01 02')
+		self.assertEqual(run_quietly(translator.range_convert, 'hex', 'dec', 'src.txt', '--tmp', {'offset': '-1'}), (None, False))
+
+class CacheTests(unittest.TestCase):
+	def setUp(self):
+		translator.set_cache(3)
+
+	def tearDown(self):
+		translator.set_cache(0)
+
+	# Results converted again are hits, new ones misses, and the oldest are evicted
+	def test_counters(self):
+		self.assertEqual(translator.translate('41', 'hex', 'dec'), '65')
+		self.assertEqual(translator.translate('41', 'hex', 'dec'), '65')
+		stats = translator.cache_stats()
+		self.assertEqual((stats['hits'], stats['misses'], stats['entries']), (1, 1, 1))
+		for data in ('42', '43', '44'):
+			translator.translate(data, 'hex', 'dec')
+		stats = translator.cache_stats()
+		self.assertEqual((stats['hits'], stats['misses'], stats['evictions'], stats['entries']), (1, 4, 1, 3))
+		translator.translate('41', 'hex', 'dec') # evicted, so converted again
+		self.assertEqual(translator.cache_stats()['misses'], 5)
+
+	# The same data converted another way, or as unicode, isn't the same result
+	def test_keys(self):
+		self.assertEqual(translator.translate('65 66', 'dec', 'hex'), '41 42')
+		self.assertEqual(translator.translate('65 66', 'dec', 'hex', False), '4142')
+		self.assertEqual(translator.translate('65 66', 'ascii', 'hex'), '36 35 20 36 36')
+		self.assertEqual(type(translator.translate(u'65 66', 'dec', 'hex')), type(translator.translate_text(u'65 66', 'dec', 'hex')))
+		self.assertEqual(translator.cache_stats()['hits'], 0)
+
+class DetectionTests(unittest.TestCase):
+	# Only sources that aren't text of any format are hexlified
+	def test_needs_hexlify(self):
+		self.assertFalse(translator.needs_hexlify('DE AD BE EF'))
+		self.assertFalse(translator.needs_hexlify('01000001 01000010'))
+		self.assertTrue(translator.needs_hexlify('\x00\x01\x02\xfe\xffrecord\x00'))
+
+	# Data given directly as hex is converted as hex, or fails as invalid hex
+	def test_direct_hex_is_not_hexlified(self):
+		self.assertEqual(translator.translate('DEADBEEF', 'hex', 'bin'), '11011110101011011011111011101111')
+		for data in ('DEADBEEG', 'hello'):
+			self.assertRaises(translator.InvalidDataError, translator.translate, data, 'hex', 'bin')
+
+class ManifestTests(unittest.TestCase):
+	# Valid jobs are read, and invalid ones each get an error
+	def test_read_manifest(self):
+		lines = [
+			'{"src": "a.txt", "dst": "b.txt", "from": "hex", "to": "bin", "options": {"stream": 64}, "priority": 2}',
+			'{"src": "a.txt", "dst": "-", "from": "hex", "to": "bin"}',
+			'{"src": "-", "dst": "b.txt", "from": "hex", "to": "bin"}',
+			'{"src": "a.txt", "dst": "b.txt", "from": "hex", "to": "bin", "options": {"jobs": 2}}',
+			'[]',
+		]
+		jobs, invalid = translator.read_manifest(StringIO.StringIO('\n'.join(lines)))
+		self.assertEqual([(job['id'], job['src'], job['options'], job['priority']) for job in jobs], [(1, 'a.txt', {'stream': '64'}, 2.0)])
+		self.assertEqual([(result['id'], result['status']) for result in invalid], [(2, 'invalid'), (3, 'invalid'), (4, 'invalid'), (5, 'invalid')])
+
+if __name__ == '__main__':
+	unittest.main()